@@ -0,0 +1,46 @@
+'''
+    Measures the time and memory taken by the title store,
+    run from the repository root with: python -m benchmarks.title_store [count]
+'''
+
+from time import perf_counter
+
+import sys
+import tracemalloc
+
+from iceflix.commands import PartiaMedia
+from iceflix.title_store import TitleStore, TITLE_STORE_BUDGET
+
+
+def benchmark(count : int = 100000, budget : int = TITLE_STORE_BUDGET) -> dict:
+    '''
+        Stores count titles in memory, looks each one up and searches them.
+        Returns the seconds every step took and the bytes taken by the store
+    '''
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        store = TitleStore(PartiaMedia, budget=budget)
+        start = perf_counter()
+        for first in range(0, count, 1000):
+            store.update({f'media_{number}': PartiaMedia(f'media_{number}',
+                name=f'Title {number}', tags=[f'tag_{number % 50}', f'tag_{number % 7}'],
+                provider='FileService') for number in range(first, min(count, first + 1000))})
+        stored = perf_counter()
+        for number in range(count):
+            _ = f'media_{number}' in store
+        looked_up = perf_counter()
+        store.search_tags(['tag_1', 'tag_3'], True)
+        store.search_name('Title 99', False)
+        searched = perf_counter()
+        memory = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    return {'titles': len(store), 'store': stored - start, 'lookup': looked_up - stored,
+        'search': searched - looked_up, 'memory': memory, 'estimated': store.size}
+
+if __name__ == '__main__':
+    report = benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
+    print(f"{report['titles']} titles: store {report['store']:.2f} s, "
+        f"lookup {report['lookup']:.2f} s, search {report['search'] * 1000:.2f} ms, "
+        f"{report['memory'] / 2 ** 20:.1f} MiB ({report['estimated'] / 2 ** 20:.1f} MiB estimated)")
@@ -4,27 +4,65 @@
 
 # pylint: disable=import-error, wrong-import-position, no-member
 
+from collections import deque
 from enum import Enum
-from threading import Event, current_thread, main_thread, Thread
+from contextlib import closing
+from itertools import islice
+from threading import Event, Thread, current_thread, main_thread
 
 from dataclasses import dataclass, field
 from getpass import getpass
 from hashlib import sha256
-from time import sleep, perf_counter_ns
 
 try:
-    from file_uploader import FileUploaderApp
     from connection import ConnectionCheckerApp
+    from directory import ServiceDirectory, ServiceKind
+    from downloads import DownloadManager, DOWNLOAD_WORKERS
+    from enrichment import TileEnricher
+    from hedging import Hedger
+    from mains import KnownMains, MAIN_EXPIRY
+    from media_cache import MediaCache
+    from missing import MissingMedia
+    from policy import CallPolicy, CircuitOpenError, RETRYABLE
+    from replica import CatalogReplica
+    from providers import ProviderRegistry
+    from query_cache import QueryCache, name_query, tags_query
+    from servants import ServantHost
+    from title_store import TitleStore
+    from uploads import (BulkUploader, UploadJournal, UPLOAD_WORKERS, expand_sources,
+        format_results)
+    from transfer import (ChunkSizer, DiskWriter, Downloader, TransferCancelled,
+        TransferStats, WriterStats, DOWNLOAD_WINDOW, TRANSFER_DIGEST, format_size, provider_key,
+        write_manifest)
     import event_listener
     import parsers
 except ImportError:
-    from iceflix.file_uploader import FileUploaderApp
     from iceflix.connection import ConnectionCheckerApp
+    from iceflix.directory import ServiceDirectory, ServiceKind
+    from iceflix.downloads import DownloadManager, DOWNLOAD_WORKERS
+    from iceflix.enrichment import TileEnricher
+    from iceflix.hedging import Hedger
+    from iceflix.mains import KnownMains, MAIN_EXPIRY
+    from iceflix.media_cache import MediaCache
+    from iceflix.missing import MissingMedia
+    from iceflix.policy import CallPolicy, CircuitOpenError, RETRYABLE
+    from iceflix.replica import CatalogReplica
+    from iceflix.providers import ProviderRegistry
+    from iceflix.query_cache import QueryCache, name_query, tags_query
+    from iceflix.servants import ServantHost
+    from iceflix.title_store import TitleStore
+    from iceflix.uploads import (BulkUploader, UploadJournal, UPLOAD_WORKERS, expand_sources,
+        format_results)
+    from iceflix.transfer import (ChunkSizer, DiskWriter, Downloader, TransferCancelled,
+        TransferStats, WriterStats, DOWNLOAD_WINDOW, TRANSFER_DIGEST, format_size, provider_key,
+        write_manifest)
     from iceflix import event_listener
     from iceflix import parsers
 
 import os
 import sys
+import glob
+import json
 import logging
 
 import Ice
@@ -36,6 +74,7 @@ import IceFlix
 
 
 MAX_TRIES = 3
+SHOW_CHUNK = 256
 
 COLOR_SELECTED_TITLE = cmd2.ansi.RgbFg(200,200,200)
 
@@ -48,6 +87,12 @@ class COLORS(Enum):
     ADMIN = cmd2.ansi.RgbFg(255,0,0)
     DISCONNECTED = cmd2.ansi.RgbFg(0,0,0)
 
+SERVICE_GETTERS = {
+    ServiceKind.AUTHENTICATOR: lambda main: main.getAuthenticator(),
+    ServiceKind.CATALOG: lambda main: main.getCatalog(),
+    ServiceKind.FILE_SERVICE: lambda main: main.getFileService(),
+}
+
 class NoMainError(Exception):
     '''
         If no connection with main server this is raised
@@ -67,6 +112,18 @@ class ActiveConnection:
 
     reachable = Event()
     remote : str = '-'
+    providers : ProviderRegistry = None
+    media_cache : MediaCache = None
+    servants : ServantHost = None
+    directory : ServiceDirectory = None
+    known_mains : KnownMains = None
+    policy : CallPolicy = None
+    hedger : Hedger = None
+    enricher : TileEnricher = None
+    titles : TitleStore = None
+    replica : CatalogReplica = None
+    queries : QueryCache = None
+    missing : MissingMedia = None
     _conn_check: ConnectionCheckerApp = None
 
     @property
@@ -74,8 +131,6 @@ class ActiveConnection:
         '''
             Returns a main server proxy
         '''
-        self.main = self._conn_check.servant.get_main()
-        logging.debug('Selected main %s', self._main)
         return self._main
 
     @main.setter
@@ -91,10 +146,11 @@ class ActiveConnection:
             return self.__set_prompt()
         return self.__async_set_prompt()
 
-    def _check_conn(self):
-        while not sleep(10):
-            main = self._conn_check.servant.get_main()
-            self.main = main
+    def _main_changed(self, main):
+        self.directory.main_changed(main)
+        if main is not None:
+            self.known_mains.remember(main)
+        self.main = main
 
     def __set_prompt(self):
         self.terminal.prompt = self.terminal.get_prompt()
@@ -106,23 +162,88 @@ class ActiveConnection:
 
     def __post_init__(self) -> None:
         self.communicator = Ice.initialize(sys.argv)
-        self._conn_check = ConnectionCheckerApp(self.communicator, self)
+        self.servants = ServantHost(self.communicator)
+        self.providers = ProviderRegistry()
+        self.directory = ServiceDirectory()
+        self.policy = CallPolicy.from_properties(self.communicator.getProperties())
+        self.hedger = Hedger.from_properties(self.communicator.getProperties())
+        self.enricher = TileEnricher.from_properties(self.communicator.getProperties())
+        self.known_mains = KnownMains.from_properties(self.communicator.getProperties())
+        self.media_cache = MediaCache.from_properties(self.communicator.getProperties())
+        self.titles = TitleStore.from_properties(self.communicator.getProperties(), PartiaMedia)
+        self.replica = CatalogReplica.from_properties(self.communicator.getProperties(), self.titles)
+        self.queries = QueryCache.from_properties(self.communicator.getProperties())
+        self.missing = MissingMedia.from_properties(self.communicator.getProperties())
+        self._conn_check = ConnectionCheckerApp(self.servants, self)
         self._conn_check.main()
-        Thread(target=self._check_conn, daemon=True).start()
+        self._conn_check.catalog_updates.listeners.append(self.media_cache)
+        self._conn_check.catalog_updates.history = self.replica
+        self._conn_check.catalog_updates.listeners.append(self.queries)
+        self._conn_check.catalog_updates.listeners.append(self.missing)
+        self._conn_check.availability.listeners.append(self.missing)
+        self._conn_check.servant.pool.listeners.append(self._main_changed)
 
     def connect_topic_manager(self, topic_manager) -> None:
         '''
             Connects to topic manager at topic_proxy
         '''
-        self.main = None
         self._conn_check.subscribe_to_topic_manager(topic_manager)
+        self.replica.subscribe()
+        self.main = self._conn_check.servant.get_main()
         self.remote = self._conn_check._topic.ice_getConnection().getEndpoint().getInfo().host
 
+    def connect_known_mains(self) -> int:
+        '''
+            Pings the mains used in previous sessions, the ones answering are used
+            until they stop announcing. Returns the number of mains pinged
+        '''
+        pinged = 0
+        for string in self.known_mains.proxies:
+            try:
+                main = IceFlix.MainPrx.uncheckedCast(self.communicator.stringToProxy(string))
+            except Ice.Exception as error:
+                logging.debug('Ignoring known main %s: %s', string, error)
+                continue
+            self._conn_check.servant.pool.connect(main)
+            pinged += 1
+        return pinged
+
+    def connect_main(self, main) -> None:
+        '''
+            Uses main directly, without listening to its announcements
+        '''
+        self.disconnect_topic_manager()
+        self._conn_check.servant.pool.announce(main, direct=True)
+        try:
+            self.remote = main.ice_getConnection().getEndpoint().getInfo().host
+        except (Ice.Exception, AttributeError):
+            self.remote = 'direct'
+
+    def sync_replica(self) -> None:
+        '''
+            Replays the catalog history into the replica, once per subscription
+            and only if it answers searches
+        '''
+        if not self.replica.needs_replay or self.main is None:
+            return
+        try:
+            self.call(ServiceKind.CATALOG, self.replica.sync, attempts=1)
+        except Exception as error: # pylint: disable=broad-exception-caught
+            logging.warning('Could not replay the catalog deltas: %s', error)
+
+    def media_missing(self, media_id : str) -> None:
+        '''
+            Remembers that media_id does not exist and drops it from the found titles
+        '''
+        self.missing.add(media_id)
+        self.terminal.session.cached_titles.pop(media_id, None)
+
     def disconnect_topic_manager(self) -> None:
         '''
             Disconnects from the connected topic manager
         '''
         self.remote = '-'
+        self.replica.unsubscribe()
         self._conn_check.disconnect()
 
     @staticmethod
@@ -136,37 +257,70 @@ class ActiveConnection:
             return func(self, *args, **kwargs)
         return wrapper
 
+    def _main_candidates(self) -> list:
+        ranked = self._conn_check.servant.pool.ranked()
+        return ranked if ranked else [self.main]
+
+    def _service(self, kind : ServiceKind, obtain):
+        proxy = self.directory.get(kind)
+        if proxy is not None:
+            logging.debug('Using %s %s', kind, proxy)
+            return proxy
+        logging.info('Obtaining a %s from main server...', str(kind).replace('_', ' '))
+        proxy = self.policy.call('main', self._main_candidates, obtain,
+            on_failure=self._conn_check.servant.pool.failed)
+        logging.debug('Got %s proxy %s', kind, proxy)
+        if proxy is not None:
+            self.directory.hand_out(kind, proxy)
+        return proxy
+
+    @needs_main
+    def call(self, kind : ServiceKind, invoke, idempotent : bool = True,
+        attempts : int = None, on_retry = None):
+        '''
+            Returns invoke(service) for a service of kind, retrying on other services
+            and backing off as the retry policy says
+        '''
+        def candidates():
+            proxies = self.directory.candidates(kind)
+            return proxies if proxies else [self._service(kind, SERVICE_GETTERS[kind])]
+        return self.policy.call(str(kind), candidates, invoke, idempotent, attempts,
+            on_retry, self.directory.failed)
+
+    def read(self, kind : ServiceKind, operation : str, *args):
+        '''
+            Idempotent call to operation(*args) on a service of kind, hedged on
+            a second service if HedgedReads is enabled
+        '''
+        def invoke(proxy):
+            backups = [backup for backup in self.directory.candidates(kind)
+                if backup != proxy and self.policy.breaker(backup).available()]
+            return self.hedger.call(proxy, backups, operation, args)
+        return self.call(kind, invoke)
+
     @needs_main
     def get_authenticator(self):
         '''
-            Retrieves an authenticator from the main server
+            Retrieves an announced authenticator or one from the main server
         '''
-        logging.info('Obtaining an authenticator from main server...')
-        authenticator = self.main.getAuthenticator()
-        logging.debug('Got authenticator proxy %s', authenticator)
-        return authenticator
+        return self._service(
+            ServiceKind.AUTHENTICATOR, SERVICE_GETTERS[ServiceKind.AUTHENTICATOR])
 
     @needs_main
     def get_catalog(self):
         '''
-            Retrieves a catalog from the main server
+            Retrieves an announced catalog or one from the main server
         '''
-        logging.info('Obtaining a catalog from main server...')
-        catalog = self.main.getCatalog()
-        logging.debug('Got catalog proxy %s', catalog)
-        return catalog
+        return self._service(ServiceKind.CATALOG, SERVICE_GETTERS[ServiceKind.CATALOG])
 
     @needs_main
     def get_file_service(self):
         '''
-            Retrieves a file service from the main server
+            Retrieves an announced file service or one from the main server
         '''
-        logging.info('Obtaining a file service from main server...')
-        file_service = self.main.getFileService()
-        logging.debug('Got file service proxy %s', file_service)
-        return file_service
+        return self._service(ServiceKind.FILE_SERVICE, SERVICE_GETTERS[ServiceKind.FILE_SERVICE])
 
-@dataclass
+@dataclass(slots=True)
 class PartiaMedia:
     '''
         Represents a media if any of its atributes is known
@@ -176,26 +330,47 @@ class PartiaMedia:
     tags : list[str] = None
 
     media : IceFlix.Media = None
+    provider : str = None
 
     def fetch(self, conn : ActiveConnection):
         '''
             Gets this media from the catalog server, updating all its information
         '''
-        catalog = conn.get_catalog()
-
         session = conn.terminal.session
         if session.is_anon:
             logging.warning("Can't fetch media if the user is anon")
             return None
 
+        if conn.missing.missing(self.id):
+            logging.info('Tile %s is known to be missing', self.id)
+            raise IceFlix.WrongMediaId(self.id)
         logging.info('Fetching tile %s from the catalog', self.id)
-        media = catalog.getTile(self.id, session.token)
+        try:
+            self.update(conn.read(ServiceKind.CATALOG, 'getTile', self.id, session.token))
+        except IceFlix.WrongMediaId:
+            conn.media_missing(self.id)
+            raise
+        if self.id in conn.titles:
+            conn.titles[self.id] = self
+        logging.debug('Got tile: %s', self)
+        return self.media
+
+    def update(self, media : IceFlix.Media):
+        '''
+            Updates all the information of this media from the one given by the catalog
+        '''
         if media.info:
             self.name = media.info.name
             self.tags = media.info.tags
+        if media.provider is not None:
+            self.provider = provider_key(media.provider)
         self.media = media
-        logging.debug('Got tile: %s', self)
-        return self.media
+
+    def to_json(self) -> dict:
+        '''
+            Machine readable representation
+        '''
+        return {'id': self.id, 'name': self.name, 'tags': self.tags, 'provider': self.provider}
 
     def __str__(self) -> str:
         name = f'name: {self.name}' if self.name is not None else None
@@ -240,13 +415,14 @@ class Session:
         self.is_admin = False
         logging.info('%s is now an user', self.user)
 
-    def refresh(self, conn : ActiveConnection):
+    def refresh(self, conn : ActiveConnection, attempts : int = None, on_retry = None):
         '''
             Tries to obtain a new token from the authentication services
         '''
-        auth = conn.get_authenticator()
         logging.info('Trying to get a token from the authentication services...')
-        token = auth.refreshAuthorization(self.user, self.pass_hash)
+        token = conn.call(ServiceKind.AUTHENTICATOR,
+            lambda auth: auth.refreshAuthorization(self.user, self.pass_hash),
+            attempts=attempts, on_retry=on_retry)
         self.token = token
         self.is_anon = self.token is None
         logging.debug("This session is using token: '%s'",
@@ -261,23 +437,35 @@ class Commands:
     @staticmethod
     def stablish_connection_main(conn : ActiveConnection):
         '''
-            Tries to reach a main proxy, if it reaches stablish the connection
+            Tries to reach a main proxy, if it reaches stablish the connection.
+            The mains used in previous sessions are pinged while subscribing to the topics
         '''
-        topic_manager = IceStorm.TopicManagerPrx.checkedCast(
-            conn.communicator.propertyToProxy("IceStorm.TopicManager")
-        )
+        pinged = conn.connect_known_mains()
+        try:
+            topic_manager = IceStorm.TopicManagerPrx.checkedCast(
+                conn.communicator.propertyToProxy("IceStorm.TopicManager")
+            )
+        except Ice.LocalException as error:
+            logging.warning('Could not reach the topic manager: %s', error)
+            topic_manager = None
 
         if not topic_manager:
-            return conn.terminal.perror('IceStorm.TopicManager is invalid')
-
-        logging.debug('Connected to topic manager %s', topic_manager)
+            conn.terminal.perror('IceStorm.TopicManager is invalid')
+            if not pinged:
+                return None
+        else:
+            logging.debug('Connected to topic manager %s', topic_manager)
 
         try:
-            conn.connect_topic_manager(topic_manager)
-            if not conn.reachable.wait(timeout=12):
+            if topic_manager:
+                conn.connect_topic_manager(topic_manager)
+                conn.topic_manager = topic_manager
+            timeout = MAIN_EXPIRY if topic_manager else \
+                conn._conn_check.servant.pool.timeout
+            if not conn.reachable.wait(timeout=timeout):
                 return conn.terminal.perror('No main service available')
             conn.terminal.poutput('Connection stablished')
-            conn.topic_manager = topic_manager
+            conn.sync_replica()
             return conn
         except Ice.ObjectNotExistException as error:
             conn.terminal.perror(f'{error.id.name} is an invalid object')
@@ -287,6 +475,25 @@ class Commands:
             conn.terminal.perror(parse_exception.str)
         return None
 
+    @staticmethod
+    def connect_main(conn : ActiveConnection, proxy : str):
+        '''
+            Connects directly to the main at proxy, without using the topics
+        '''
+        try:
+            main = IceFlix.MainPrx.checkedCast(conn.communicator.stringToProxy(proxy))
+        except (Ice.ProxyParseException, Ice.EndpointParseException) as parse_exception:
+            return conn.terminal.perror(parse_exception.str)
+        except Ice.NoEndpointException:
+            return conn.terminal.perror('Proxy needs an endpoint')
+        except Ice.ObjectNotExistException as error:
+            return conn.terminal.perror(f'{error.id.name} is an invalid object')
+        if main is None:
+            return conn.terminal.perror(f'{proxy} is not a main service')
+        conn.connect_main(main)
+        conn.terminal.poutput('Connection stablished')
+        return conn
+
     @staticmethod
     @ActiveConnection.needs_main
     def login(conn : ActiveConnection):
@@ -298,32 +505,34 @@ class Commands:
         username = conn.terminal.read_input('Username: ')
         password = getpass('Password: ')
         password_hash = sha256(password.encode('utf-8')).hexdigest()
-        session = Session(username, password_hash)
+        session = Session(username, password_hash, cached_titles=conn.titles)
+        def retrying(attempt, delay, _):
+            conn.terminal.pwarning(
+                f"({attempt}) Couldn't connect. Trying again in {delay:.2f} seconds")
         try:
-            for i in range(1, retries + 1):
-                try:
-                    session.refresh(conn)
-                    conn.terminal.session = session
-                    return
-                except IceFlix.TemporaryUnavailable as temporary_error:
-                    if not i == retries:
-                        conn.terminal.pwarning(
-                            f"({i}) Couldn't connect. Trying again in 5 seconds")
-                        sleep(5)
-                    else:
-                        raise IceFlix.TemporaryUnavailable from temporary_error
+            session.refresh(conn, retries, retrying)
+            conn.titles.claim(session.user)
+            conn.terminal.session = session
         except IceFlix.Unauthorized:
             conn.terminal.perror('Wrong username/password combination')
 
     @staticmethod
-    def get_catalog_name(conn : ActiveConnection, name : str, exact : bool):
+    def get_catalog_name(conn : ActiveConnection, name : str, exact : bool,
+        local : bool = False, verify : bool = False):
         '''
-            Tries to get a tile by its name from the catalog services
+            Tries to get a tile by its name from the catalog services,
+            or from the known titles if local
         '''
-        catalog = conn.get_catalog()
-
         logging.info('Fetching tiles %s %s', 'EXACT' if exact else 'NOT EXACT', name)
-        titles = catalog.getTilesByName(name, exact)
+        def remote():
+            return conn.read(ServiceKind.CATALOG, 'getTilesByName', name, exact)
+        if local:
+            titles = conn.titles.search_name(name, exact)
+            if verify:
+                Commands.verify_search(conn, titles, remote,
+                    lambda _id: PartiaMedia(_id, name=name if exact else None))
+        else:
+            titles = conn.queries.get(name_query(name, exact), remote)
         logging.info('Got %d tiles', len(titles))
         if not titles:
             if exact:
@@ -331,19 +540,35 @@ class Commands:
             else:
                 conn.terminal.perror(f'None of the media contains: {name}')
             return
-        pmedia = {_id: PartiaMedia(_id, name=name) for _id in titles}
-        Commands.save_pmedia(conn, pmedia)
-        Commands.show_titles(conn, pmedia)
+        if local:
+            Commands.show_titles(conn, {_id: conn.titles[_id] for _id in titles})
+            return
+        Commands.enrich_titles(conn, titles,
+            lambda _id: PartiaMedia(_id, name=name if exact else None))
 
     @staticmethod
-    def get_catalog_tags(conn : ActiveConnection, tags : list[str], include_all : bool):
+    def get_catalog_tags(conn : ActiveConnection, tags : list[str], include_all : bool,
+        local : bool = False, verify : bool = False):
         '''
-            Tries to get a tile by its tags from the catalog services
+            Tries to get a tile by its tags from the catalog services,
+            or from the known titles if local
         '''
-        catalog = conn.get_catalog()
-
         logging.info('Fetching %s %s', 'INCLUDE ALL' if include_all else 'NOT INCLUDE ALL', tags)
-        titles = catalog.getTilesByTags(tags, include_all, conn.terminal.session.token)
+        session = conn.terminal.session
+        def remote():
+            return conn.read(ServiceKind.CATALOG, 'getTilesByTags',
+                tags, include_all, session.token)
+        if local:
+            titles = conn.titles.search_tags(tags, include_all)
+            if verify:
+                Commands.verify_search(conn, titles, remote,
+                    lambda _id: PartiaMedia(_id, tags=tags if include_all else None))
+        elif conn.replica.fresh:
+            titles = conn.replica.by_tags(session.user, tags, include_all)
+        else:
+            titles = conn.queries.get(tags_query(session.user, tags, include_all), remote)
+            conn.replica.confirm()
+            conn.sync_replica()
         logging.info('Got %d tiles', len(titles))
         if not titles:
             title_tags = ', '.join(tags)
@@ -352,9 +577,100 @@ class Commands:
             else:
                 conn.terminal.perror(f'None of the media contains: {title_tags}')
             return
-        buffer = {id: PartiaMedia(id, tags=tags) for id in titles}
-        Commands.save_pmedia(conn, buffer)
-        Commands.show_titles(conn, buffer)
+        if local:
+            Commands.show_titles(conn, {_id: conn.titles[_id] for _id in titles})
+            return
+        Commands.enrich_titles(conn, titles,
+            lambda _id: PartiaMedia(_id, tags=tags if include_all else None))
+
+    @staticmethod
+    def enrich_titles(conn : ActiveConnection, titles : list[str], build):
+        '''
+            Gets the tile of every title found concurrently, saving and showing each one
+            as it arrives. The titles already fetched are shown as they are known
+        '''
+        cached = conn.terminal.session.cached_titles
+        pending = []
+        for title_id in titles:
+            title = cached.get(title_id)
+            if title is not None and title.provider is not None:
+                conn.terminal.poutput(str(title))
+            elif not conn.missing.missing(title_id):
+                pending.append(title_id)
+        session = conn.terminal.session
+        if not pending:
+            return
+        if session.is_anon:
+            pmedia = {_id: build(_id) for _id in pending}
+            Commands.save_pmedia(conn, pmedia)
+            Commands.show_titles(conn, pmedia)
+            return
+        logging.info('Fetching %d tiles', len(pending))
+        remaining = dict.fromkeys(pending)
+        def fetch(catalog):
+            with closing(conn.enricher.fetch(catalog, list(remaining), session.token)) as answers:
+                for title_id, media, error in answers:
+                    if isinstance(error, RETRYABLE):
+                        raise error
+                    remaining.pop(title_id, None)
+                    Commands.show_tile(conn, build(title_id), media, error)
+        try:
+            conn.call(ServiceKind.CATALOG, fetch)
+        except (*RETRYABLE, CircuitOpenError) as error:
+            conn.terminal.pwarning(f'Could not get {len(remaining)} tiles: {error}')
+            for title_id in remaining:
+                Commands.show_tile(conn, build(title_id), None, None)
+
+    @staticmethod
+    def show_tile(conn : ActiveConnection, title : PartiaMedia, media : IceFlix.Media,
+        error : Exception):
+        '''
+            Saves and shows a title with the tile the catalog answered,
+            unless the catalog said it does not exist
+        '''
+        if isinstance(error, IceFlix.WrongMediaId):
+            logging.info('Tile %s no longer exists', title.id)
+            conn.media_missing(title.id)
+            return
+        if error is not None:
+            logging.warning('Could not get tile %s: %s', title.id, error)
+        elif media is not None:
+            title.update(media)
+        Commands.save_pmedia(conn, {title.id: title})
+        conn.terminal.poutput(str(title))
+
+    @staticmethod
+    def verify_search(conn : ActiveConnection, local : list[str], remote, build) -> Thread:
+        '''
+            Repeats a local search on the catalog in background, saving the titles
+            the local index missed and alerting the user if both answers differ
+        '''
+        def verify():
+            try:
+                titles = remote()
+            except Exception as error: # pylint: disable=broad-exception-caught
+                logging.warning('Could not verify the local search: %s', error)
+                return
+            known = set(local)
+            missing = [_id for _id in titles if _id not in known]
+            extra = len(known.difference(titles))
+            if missing:
+                Commands.save_pmedia(conn, {_id: build(_id) for _id in missing})
+            if missing or extra:
+                conn.terminal.alert(f'The catalog found {len(missing)} titles missing from '
+                    f'the local search and {extra} titles that no longer match')
+        thread = Thread(target=verify, daemon=True, name='search-verifier')
+        thread.start()
+        return thread
+
+    @staticmethod
+    def store_title(conn : ActiveConnection, title : PartiaMedia):
+        '''
+            Saves the changes made to a known title
+        '''
+        cached = conn.terminal.session.cached_titles
+        if title.id in cached:
+            cached[title.id] = title
 
     @staticmethod
     def use_title(conn : ActiveConnection, title_id : str):
@@ -372,10 +688,13 @@ class Commands:
         '''
             Saves a dictionary of media to the user cache
         '''
-        union = set(conn.terminal.session.cached_titles).intersection(media)
-        for title_id in union:
-            updated = media[title_id]
-            cached = conn.terminal.session.cached_titles[title_id]
+        titles = conn.terminal.session.cached_titles
+        for title_id, updated in media.items():
+            if updated.name is not None and updated.tags is not None:
+                continue
+            cached = titles.get(title_id)
+            if cached is None:
+                continue
             updated.name = cached.name if updated.name is None else updated.name
             updated.tags = cached.tags if updated.tags is None else updated.tags
 
@@ -383,30 +702,56 @@ class Commands:
         conn.terminal.session.cached_titles.update(media)
 
     @staticmethod
-    def show_titles(conn : ActiveConnection, titles : dict[str, PartiaMedia]):
+    def show_titles(conn : ActiveConnection, titles : dict[str, PartiaMedia],
+        limit : int = None, offset : int = 0, sort : str = None, as_json : bool = False,
+        paged : bool = False):
         '''
-            Prints all the media in titles
+            Prints the media in titles, from offset and up to limit of them, sorted by sort.
+            The lines are written in chunks as they are rendered, one JSON object per line
+            if as_json, or through the pager if paged
         '''
-        buffer = ''
-        for pmedia in titles.values():
-            buffer += f'{pmedia}\n'
-        if not buffer:
-            conn.terminal.perror('No media to show')
+        if hasattr(titles, 'iter_titles'):
+            media = titles.iter_titles(offset, limit, sort)
+        else:
+            media = titles.values()
+            if sort == 'id':
+                media = sorted(media, key=lambda pmedia: pmedia.id)
+            elif sort == 'name':
+                media = sorted(media, key=lambda pmedia: (pmedia.name is None, pmedia.name or ''))
+            media = islice(media, offset, None if limit is None else offset + limit)
+        render = (lambda pmedia: json.dumps(pmedia.to_json())) if as_json else str
+        if paged:
+            page = '\n'.join(render(pmedia) for pmedia in media)
+            if not page:
+                conn.terminal.perror('No media to show')
+                return
+            conn.terminal.ppaged(page)
             return
-        conn.terminal.poutput(buffer[:-1])
+        shown = 0
+        while True:
+            chunk = [render(pmedia) for pmedia in islice(media, SHOW_CHUNK)]
+            if not chunk:
+                break
+            conn.terminal.poutput('\n'.join(chunk))
+            shown += len(chunk)
+        if not shown:
+            conn.terminal.perror('No media to show')
 
     @staticmethod
     def add_tags(conn : ActiveConnection, tags : list[str]):
         '''
             Add tags to the selected media
         '''
-        catalog = conn.get_catalog()
         title = conn.terminal.session.selected_title
+        token = conn.terminal.session.token
+        conn.call(ServiceKind.CATALOG, lambda catalog: catalog.addTags(title.id, tags, token),
+            idempotent=False)
         if not title.tags:
             title.tags = []
         title.tags.extend(tags)
         title.tags = list(set(title.tags))
-        catalog.addTags(title.id, tags, conn.terminal.session.token)
+        Commands.store_title(conn, title)
+        conn.queries.addTags(title.id, conn.terminal.session.user, tags)
         logging.debug('Added tags to %s: %s', title.id, tags)
 
     @staticmethod
@@ -415,59 +760,167 @@ class Commands:
             Remove tags from the selected media
         '''
         title = conn.terminal.session.selected_title
-        catalog = conn.get_catalog()
+        token = conn.terminal.session.token
+        conn.call(ServiceKind.CATALOG, lambda catalog: catalog.removeTags(title.id, tags, token),
+            idempotent=False)
         if title.tags is not None:
             new_tags = list(set(title.tags).difference(tags))
             title.tags = None if not new_tags else new_tags
-        catalog.removeTags(title.id, tags, conn.terminal.session.token)
+        Commands.store_title(conn, title)
+        conn.queries.removeTags(title.id, conn.terminal.session.user, tags)
         logging.debug('Removed tags from %s: %s', title.id, tags)
 
     @staticmethod
-    def download(conn : ActiveConnection):
+    def transfer(conn : ActiveConnection, title : PartiaMedia, cancel = None, progress = None):
         '''
-            Downloads a media from the media provider
+            Downloads title into a file named as the title, returns the transfer
+            and disk writer statistics and the digest of the file
         '''
-        title = conn.terminal.session.selected_title
         media = title.fetch(conn)
 
         if not media:
-            return
+            return None
 
         if not media.provider:
             conn.terminal.perror("The title selected couldn't be downloaded")
-            return
+            return None
+
+        with conn.terminal.downloads.targets.claim(title.name):
+            return Commands.receive(conn, title, media, cancel, progress)
+
+    @staticmethod
+    def receive(conn : ActiveConnection, title : PartiaMedia, media : IceFlix.Media,
+        cancel = None, progress = None):
+        '''
+            Writes media into the file named as the title, from the media cache or
+            from its providers. The partial file is removed if the transfer fails
+        '''
+        cached = conn.media_cache.restore(title.id, title.name)
+        if cached is not None:
+            stats = TransferStats('cache')
+            stats.bytes = cached.size
+            write_manifest(title.name, TRANSFER_DIGEST, cached.digest)
+            return stats.finish(), WriterStats(), cached.digest
 
         logging.debug('Downloading from: %s', media.provider)
 
         session = conn.terminal.session
-        handler = title.media.provider.openFile(title.id, session.token)
-        with conn.terminal.terminal_lock:
-            conn.terminal.poutput('Starting download...')
-            time_initial = perf_counter_ns()
-            with open(title.name, 'wb') as file:
-                try:
-                    while True:
-                        try:
-                            raw = handler.receive(2048, session.token)
-                            if not raw:
-                                break
-                            logging.debug('%s', raw)
-                            file.write(raw)
-                        except IceFlix.Unauthorized:
-                            logging.info('User token got rejected while downloading, refreshing...')
-                            session.refresh(conn)
-                except IceFlix.Unauthorized as unauthorized_error:
-                    logging.info("Couldn't get a new valid user token, reverting download")
-                    os.remove(title.name)
-                    raise IceFlix.Unauthorized from unauthorized_error
-                else:
-                    time_end = perf_counter_ns()
-                    final_time = (time_end - time_initial) / 10**9
-                    logging.info('Download finished in %.2f seconds', final_time)
-                    conn.terminal.poutput(
-                        f"Finished downloading: '{title.name}' in {final_time:.2f} seconds"
-                        )
-                    handler.close(session.token)
+        properties = conn.communicator.getProperties()
+        downloader = Downloader(
+            media.provider, title.id,
+            lambda: session.token,
+            lambda: session.refresh(conn),
+            window=properties.getPropertyAsIntWithDefault('DownloadWindow', DOWNLOAD_WINDOW),
+            sizer=ChunkSizer.from_properties(properties),
+            cancel=cancel, progress=progress)
+        candidates = {provider_key(media.provider): media.provider}
+        if properties.getPropertyAsIntWithDefault('ProviderRacing', 1) > 0:
+            for provider in conn.providers.candidates(title.id):
+                candidates.setdefault(provider_key(provider), provider)
+        if len(candidates) > 1:
+            downloader.race(list(candidates.values()))
+        else:
+            downloader.open()
+        try:
+            with DiskWriter.from_properties(title.name, properties) as writer:
+                stats = downloader.run(writer)
+        except IceFlix.Unauthorized as unauthorized_error:
+            logging.info("Couldn't get a new valid user token, reverting download")
+            Commands.discard_partial(title.name)
+            raise IceFlix.Unauthorized from unauthorized_error
+        except TransferCancelled:
+            logging.info('Download of %s cancelled', title.id)
+            Commands.discard_partial(title.name)
+            downloader.close()
+            raise
+        except BaseException as error:
+            logging.info('Download of %s failed, reverting it: %s', title.id, error)
+            Commands.discard_partial(title.name)
+            try:
+                downloader.close()
+            except Exception as close_error: # pylint: disable=broad-exception-caught
+                logging.debug('Could not close the file handler: %s', close_error)
+            raise
+        logging.info('Download finished: %s', stats)
+        logging.info('Disk writer: %s', writer.stats)
+        downloader.close()
+        digest = writer.digest
+        if digest is not None:
+            write_manifest(title.name, writer.algorithm, digest)
+        conn.media_cache.store(
+            title.id, title.name, digest if writer.algorithm == TRANSFER_DIGEST else None)
+        return stats, writer.stats, digest
+
+    @staticmethod
+    def discard_partial(path : str):
+        '''
+            Removes the file left by a failed download
+        '''
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def download(conn : ActiveConnection):
+        '''
+            Downloads a media from the media provider
+        '''
+        title = conn.terminal.session.selected_title
+        conn.terminal.poutput('Starting download...')
+        result = Commands.transfer(conn, title)
+        if result is None:
+            return
+        stats, writer_stats, digest = result
+        if stats.mode == 'cache':
+            conn.terminal.poutput(
+                f"Restored '{title.name}' ({format_size(stats.bytes)}) from the local media cache")
+        else:
+            conn.terminal.poutput(
+                f"Finished downloading: '{title.name}' in {stats.elapsed:.2f} seconds"
+                f" ({format_size(stats.throughput)}/s,"
+                f" chunks up to {format_size(stats.largest)},"
+                f" disk backpressure {writer_stats.blocked:.2f} seconds)"
+                )
+        if digest is not None:
+            conn.terminal.poutput(f'Digest: {digest}')
+
+    @staticmethod
+    def queue_downloads(conn : ActiveConnection, title_ids : list[str]):
+        '''
+            Queues the titles to be downloaded in background
+        '''
+        if conn.terminal.session.is_anon:
+            conn.terminal.perror("Can't download media if the user is anon")
+            return
+        cached = conn.terminal.session.cached_titles
+        for title_id in title_ids:
+            title = cached[title_id] if title_id in cached else PartiaMedia(title_id)
+            job = conn.terminal.downloads.submit(
+                title, lambda job: Commands.transfer(conn, job.title, job.cancel, job.advance))
+            conn.terminal.poutput(f'Queued: {job}')
+
+    @staticmethod
+    def show_downloads(conn : ActiveConnection):
+        '''
+            Prints the progress of every download job
+        '''
+        jobs = conn.terminal.downloads.jobs
+        if not jobs:
+            conn.terminal.perror('No downloads queued')
+            return
+        conn.terminal.poutput('\n'.join(str(job) for job in jobs.values()))
+
+    @staticmethod
+    def cancel_downloads(conn : ActiveConnection, job_ids : list[int]):
+        '''
+            Cancels the given download jobs
+        '''
+        for job_id in job_ids:
+            if conn.terminal.downloads.cancel(job_id):
+                conn.terminal.poutput(f'Cancelled download {job_id}')
+            else:
+                conn.terminal.perror(f'Download {job_id} is not pending')
 
     @staticmethod
     @ActiveConnection.needs_main
@@ -480,8 +933,7 @@ class Commands:
         config_admin_pass = conn.communicator.getProperties().getProperty('AdminToken')
         admin_pass = getpass('Admin password: ') if not config_admin_pass else config_admin_pass
         admin_sha256_pass = sha256(admin_pass.encode('utf-8')).hexdigest()
-        auth = conn.get_authenticator()
-        if not auth.isAdmin(admin_sha256_pass):
+        if not conn.call(ServiceKind.AUTHENTICATOR, lambda auth: auth.isAdmin(admin_sha256_pass)):
             conn.terminal.perror('Invalid password')
             return None
         conn.terminal.session.make_admin(admin_sha256_pass)
@@ -492,9 +944,10 @@ class Commands:
         '''
             Adds an user to the authentication services
         '''
-        auth = conn.get_authenticator()
         password_hash = sha256(password.encode('utf-8')).hexdigest()
-        auth.addUser(user, password_hash, conn.terminal.session.admin_pass)
+        admin_pass = conn.terminal.session.admin_pass
+        conn.call(ServiceKind.AUTHENTICATOR,
+            lambda auth: auth.addUser(user, password_hash, admin_pass), idempotent=False)
         logging.debug('User %s with password hash %s created', user, password_hash)
         conn.terminal.poutput(f'Added user {user}')
 
@@ -503,8 +956,9 @@ class Commands:
         '''
             Removes an user from the authentication services
         '''
-        auth = conn.get_authenticator()
-        auth.removeUser(user, conn.terminal.session.admin_pass)
+        admin_pass = conn.terminal.session.admin_pass
+        conn.call(ServiceKind.AUTHENTICATOR,
+            lambda auth: auth.removeUser(user, admin_pass), idempotent=False)
         logging.debug('User %s removed', user)
         conn.terminal.poutput(f'Removed user {user}')
 
@@ -514,9 +968,12 @@ class Commands:
             Renames selected media
         '''
         title = conn.terminal.session.selected_title
-        catalog = conn.get_catalog()
-        catalog.renameTile(title.id, name, conn.terminal.session.admin_pass)
+        admin_pass = conn.terminal.session.admin_pass
+        conn.call(ServiceKind.CATALOG,
+            lambda catalog: catalog.renameTile(title.id, name, admin_pass))
         title.name = name
+        Commands.store_title(conn, title)
+        conn.queries.renameTile(title.id, name)
         logging.debug('Title %s renamed to %s', title.id, name)
         conn.terminal.poutput(f'Title renamed to {name}')
 
@@ -537,39 +994,79 @@ class Commands:
 
         logging.info('Removing tile %s', title.id)
 
-        media.provider.removeFile(title.id, conn.terminal.session.admin_pass)
-        conn.terminal.session.cached_titles.pop(title.id)
+        try:
+            conn.policy.call(str(ServiceKind.FILE_SERVICE), lambda: [media.provider],
+                lambda provider: provider.removeFile(title.id, conn.terminal.session.admin_pass),
+                idempotent=False, on_failure=conn.directory.failed)
+        except IceFlix.WrongMediaId:
+            conn.media_missing(title.id)
+            raise
+        conn.providers.forget_media(title.id)
+        conn.media_cache.invalidate(title.id)
+        conn.queries.forget_media(title.id)
+        conn.media_missing(title.id)
         conn.terminal.session.selected_title = None
         logging.debug('Removed tile %s from %s',  title.id, media.provider)
         conn.terminal.poutput(f'Removed {title.name}')
 
     @staticmethod
-    def upload(conn : ActiveConnection, file : str):
-        '''
-            Upload a given file to the catalog
-        '''
-        with Ice.initialize() as uploader_comm:
-            conn.terminal.poutput(f'Uploading file: {file}...')
-            file_service = conn.get_file_service()
-            file_uploader = FileUploaderApp(file, uploader_comm)
-            file_uploader.main()
-            cast = file_uploader.cast
-            new_file_id = file_service.uploadFile(cast, conn.terminal.session.admin_pass)
-            if new_file_id is None:
-                conn.terminal.perror('No ID was assigned by the file service')
-                return
-            Commands.save_pmedia(conn, {new_file_id : PartiaMedia(new_file_id)})
-            conn.terminal.poutput(f'Upload finished.\nThis file has the ID {new_file_id}')
+    def upload(conn : ActiveConnection, files : list[str], recursive : bool = False,
+        workers : int = None, force : bool = False):
+        '''
+            Upload the given files, directories or glob patterns to the catalog
+        '''
+        paths = expand_sources(files, recursive)
+        if not paths:
+            conn.terminal.perror('No files to upload')
+            return
+        properties = conn.communicator.getProperties()
+        if workers is None:
+            workers = properties.getPropertyAsIntWithDefault('UploadWorkers', UPLOAD_WORKERS)
+        workers = max(1, min(workers, len(paths)))
+        workers = min(workers, conn.servants.threads)
+        uploader = BulkUploader(
+            conn.servants, None, conn.terminal.session.admin_pass, workers,
+            max_chunk=ChunkSizer.from_properties(properties).maximum,
+            algorithm=properties.getPropertyWithDefault('TransferDigest', TRANSFER_DIGEST),
+            journal=UploadJournal.from_properties(properties),
+            call=lambda invoke: conn.call(ServiceKind.FILE_SERVICE, invoke, idempotent=False))
+        conn.terminal.poutput(f'Uploading {len(paths)} files with {workers} uploaders...')
+        results = []
+        for result in uploader.run(paths, force):
+            results.append(result)
+            if result.media_id is not None:
+                Commands.save_pmedia(conn, {result.media_id : PartiaMedia(result.media_id)})
+            logging.info('Upload of %s %s', result.path, result.status)
+        if len(results) == 1 and not results[0].skipped:
+            result = results[0]
+            if result.error is not None:
+                raise result.error
+            conn.terminal.poutput(f'Upload finished.\nThis file has the ID {result.media_id}')
+            if result.digest is not None:
+                conn.terminal.poutput(f'Digest: {result.digest}')
+            return
+        results.sort(key=lambda result: paths.index(result.path))
+        conn.terminal.poutput(format_results(results, os.path.commonpath(paths)
+            if len(paths) > 1 else os.path.dirname(paths[0])))
+        failed = sum(1 for result in results if result.error is not None)
+        if failed:
+            conn.terminal.perror(f'{failed} of {len(results)} uploads failed')
 
 class CliHandler(cmd2.Cmd):
     '''Handles user input via an interactive command line'''
 
     session : Session
     active_conn : ActiveConnection
+    downloads : DownloadManager
 
     def __init__(self) -> None:
+        self._alerts = deque()
         self.active_conn = ActiveConnection(self)
-        self.session = Session()
+        self.session = Session(cached_titles=self.active_conn.titles)
+        self.downloads = DownloadManager(
+            self.active_conn.communicator.getProperties().getPropertyAsIntWithDefault(
+                'DownloadWorkers', DOWNLOAD_WORKERS),
+            self.download_finished)
         shortcuts = dict(cmd2.DEFAULT_SHORTCUTS)
 
         shortcuts.update({'sudo': 'admin'})
@@ -631,11 +1128,15 @@ use the command 'admin' to obtain them''')
         '''
         return self.read_input(f'{prompt} [Yy/Nn]: ').lower() == "y"
 
+    @cmd2.with_argparser(parsers.reconnect_parser)
     @cmd2.with_category("Utility")
-    def do_reconnect(self, _):
+    def do_reconnect(self, args):
         '''
-            Reconnect to the topic manager service
+            Reconnect to the topic manager service, or directly to the main at --proxy
         '''
+        if args.proxy:
+            Commands.connect_main(self.active_conn, args.proxy)
+            return
         Commands.stablish_connection_main(self.active_conn)
 
     @cmd2.with_category("Utility")
@@ -651,7 +1152,7 @@ use the command 'admin' to obtain them''')
         '''
             Disconnects from the current user and allows to authenticate again
         '''
-        self.session = Session()
+        self.session = Session(cached_titles=self.active_conn.titles)
         try:
             with self.terminal_lock:
                 if self.get_user_consent('Wanna log in?'):
@@ -691,20 +1192,23 @@ use the command 'admin' to obtain them''')
         '''
             Retrieves titles by name, can be exact or not
         '''
-        Commands.get_catalog_name(self.active_conn, args.name, args.exact)
+        Commands.get_catalog_name(
+            self.active_conn, args.name, args.exact, args.local, args.verify)
 
     @need_creds
     def search_tags(self, args):
         '''
             Retrieves titles by tags, can include all or not
         '''
-        Commands.get_catalog_tags(self.active_conn, args.tags, args.include)
+        Commands.get_catalog_tags(
+            self.active_conn, args.tags, args.include, args.local, args.verify)
 
-    def show_catalog(self, _):
+    def show_catalog(self, args):
         '''
             Shows currently cached titles
         '''
-        Commands.show_titles(self.active_conn, self.session.cached_titles)
+        Commands.show_titles(self.active_conn, self.session.cached_titles,
+            args.limit, args.offset, args.sort, args.json, args.page)
 
     parsers.cat_get_base.set_defaults(func=get_catalog)
     parsers.cat_show.set_defaults(func=show_catalog)
@@ -822,10 +1326,13 @@ use the command 'admin' to obtain them''')
         Commands.remove_tags(self.active_conn, args.tags)
 
     @need_creds
-    def selected_download(self, _):
+    def selected_download(self, args):
         '''
             Downloads the media
         '''
+        if args.background:
+            Commands.queue_downloads(self.active_conn, [self.session.selected_title.id])
+            return
         Commands.download(self.active_conn)
 
     @need_admin
@@ -843,15 +1350,100 @@ use the command 'admin' to obtain them''')
     parsers.add_tags.set_defaults(action_func=tags_add)
     parsers.remove_tags.set_defaults(action_func=tags_remove)
 
+    @cmd2.with_argparser(parsers.downloads_parser_base)
+    @cmd2.with_category("Title management")
+    def do_downloads(self, args):
+        '''
+            Background downloads related set of commands
+        '''
+        func = getattr(args, 'func', None)
+        if not func:
+            return Commands.show_downloads(self.active_conn)
+        return func(self, args)
+
+    @need_creds
+    def downloads_add(self, args):
+        '''
+            Queues titles to be downloaded in background
+        '''
+        Commands.queue_downloads(self.active_conn, args.ids)
+
+    def downloads_list(self, _):
+        '''
+            Shows the progress of the queued downloads
+        '''
+        Commands.show_downloads(self.active_conn)
+
+    def downloads_cancel(self, args):
+        '''
+            Cancels queued or running downloads
+        '''
+        Commands.cancel_downloads(self.active_conn, args.jobs)
+
+    def downloads_wait(self, _):
+        '''
+            Blocks until every queued download finishes
+        '''
+        try:
+            self.downloads.wait()
+        except KeyboardInterrupt:
+            self.poutput('')
+        Commands.show_downloads(self.active_conn)
+
+    def downloads_clear(self, _):
+        '''
+            Forgets the finished downloads
+        '''
+        self.downloads.clear()
+
+    parsers.downloads_add.set_defaults(func=downloads_add)
+    parsers.downloads_list.set_defaults(func=downloads_list)
+    parsers.downloads_cancel.set_defaults(func=downloads_cancel)
+    parsers.downloads_wait.set_defaults(func=downloads_wait)
+    parsers.downloads_clear.set_defaults(func=downloads_clear)
+
+    def download_finished(self, job):
+        '''
+            Notifies the user when a background download ends
+        '''
+        logging.info('Download %d finished: %s', job.id, job.state)
+        self.alert(str(job))
+
+    def alert(self, message : str):
+        '''
+            Prints message from a background thread above the prompt, or after the
+            running command if the terminal is busy
+        '''
+        self._alerts.append(message)
+        if self.terminal_lock.acquire(blocking=False):
+            try:
+                self.flush_alerts(self.async_alert)
+            except RuntimeError:
+                pass
+            finally:
+                self.terminal_lock.release()
+
+    def flush_alerts(self, show):
+        '''
+            Shows the pending alerts with show(message)
+        '''
+        while self._alerts:
+            show(self._alerts[0])
+            self._alerts.popleft()
+
     def shutdown(self):
         '''
             Destroys the active communicator if it exists
         '''
+        self.downloads.shutdown()
         if self.active_conn._conn_check is not None:
+            self.active_conn._conn_check.destroy()
             try:
                 self.active_conn.disconnect_topic_manager()
             except Ice.ConnectionRefusedException:
                 pass
+        self.active_conn.titles.close()
+        self.active_conn.media_cache.close()
         if self.active_conn.communicator is not None:
             self.active_conn.communicator.destroy()
 
@@ -860,12 +1452,12 @@ use the command 'admin' to obtain them''')
     @need_admin
     def do_upload(self, args):
         '''
-            Uploads a file to a file provider
+            Uploads files, directories (with --recursive) or glob patterns to a file provider
         '''
-        if not os.path.isfile(args.file):
+        if not any(os.path.exists(file) or glob.has_magic(file) for file in args.files):
             self.perror("Input file doesn't exists")
             return
-        Commands.upload(self.active_conn, args.file)
+        Commands.upload(self.active_conn, args.files, args.recursive, args.jobs, args.force)
 
     @cmd2.with_argparser(parsers.analyzer_parser)
     @cmd2.with_category("Utility")
@@ -887,7 +1479,8 @@ use the command 'admin' to obtain them''')
         self.poutput(f'Listening topics: {stopics}')
         self.pwarning('\nctrl+c to stop\n')
         self.poutput('-------------- Listening for events -------------')
-        with event_listener.EventListenerApp(self.active_conn.topic_manager) as listener:
+        with event_listener.EventListenerApp(
+            self.active_conn.servants, self.active_conn.topic_manager) as listener:
             for topic in topics:
                 listener.subscribe(topic)
             listener.waitForShutdown()
@@ -915,6 +1508,7 @@ use the command 'admin' to obtain them''')
         return cmd2.ansi.style(f'{raw_text}', fg=color.value)
 
     def postcmd(self, stop, _):
+        self.flush_alerts(self.poutput)
         self.prompt = self.get_prompt()
         return stop
 
@@ -930,11 +1524,16 @@ use the command 'admin' to obtain them''')
         except NoMainError:
             self.perror('No connection with the main server')
         except Ice.ConnectionRefusedException:
+            self.active_conn.directory.invalidate()
             self.perror('The service refused the connection')
         except Ice.ConnectionLostException:
+            self.active_conn.directory.invalidate()
             self.perror('Connection lost')
         except Ice.ConnectTimeoutException:
+            self.active_conn.directory.invalidate()
             self.perror('Connection timeout')
+        except CircuitOpenError as circuit_open:
+            self.perror(f'{circuit_open}, try again later')
         except cmd2.exceptions.Cmd2ArgparseError as parser_error:
             raise parser_error
         except Exception as exception:
@@ -9,8 +9,6 @@
 
 import os
 import logging
-import random
-import datetime
 
 import Ice
 import IceStorm
@@ -18,37 +16,38 @@ import IceStorm
 Ice.loadSlice(os.path.join(os.path.dirname(__file__), "iceflix.ice"))
 import IceFlix
 
+try:
+    from directory import ServiceKind
+    from mains import MainPool
+    from providers import FileAvailabilityServant
+    from service_types import ServiceTypeCache
+    from updates import CatalogUpdatesServant
+except ImportError:
+    from iceflix.directory import ServiceKind
+    from iceflix.mains import MainPool
+    from iceflix.providers import FileAvailabilityServant
+    from iceflix.service_types import ServiceTypeCache
+    from iceflix.updates import CatalogUpdatesServant
+
+SERVICE_KINDS = {kind.value for kind in ServiceKind}
 
 class ConnectionCheckerServant(IceFlix.Announcement):
     '''
         Receives announces from all IceFlix services and
-        checks whenever no announce from a valid main has been received for 10 seconds and
-        disconnects it
+        keeps the announced mains in a pool ranked by their health
     '''
 
-    def __init__(self, conn_ref) -> None:
+    def __init__(self, conn_ref, pool : MainPool = None) -> None:
         super().__init__()
         self._conn_ref = conn_ref
-        self.mains = {}
+        self.pool = pool if pool is not None else MainPool()
+        self.types = ServiceTypeCache()
 
     def get_main(self):
         '''
-            Get a random unexpired and reachable main
+            Get the healthiest unexpired main, without any remote call
         '''
-        if not self.mains:
-            return None
-        main = random.choice(list(self.mains))
-        expire_date = self.mains[main]
-        delta = datetime.datetime.now() - expire_date
-        refused = False
-        try:
-            main.ice_ping()
-        except Ice.ConnectionRefusedException:
-            refused = True
-        if delta > datetime.timedelta(seconds=12) or refused:
-            self.mains.pop(main)
-            return self.get_main()
-        return main
+        return self.pool.best
 
     def announce(self, service: object, serviceId: str, _=None):
         '''
@@ -56,17 +55,22 @@ class ConnectionCheckerServant(IceFlix.Announcement):
         '''
         if service is None:
             return logging.debug('Received service None from %s', serviceId)
-        if isinstance(service, IceFlix.Main):
-            main = service
-        else:
-            try:
-                main = IceFlix.MainPrx.checkedCast(service)
-            except Exception as exception:
-                return logging.debug('Exception checking proxy %s: %s', service, exception)
-        if main is None:
+        try:
+            resolved = self.types.resolve(service, serviceId)
+        except Exception as exception:
+            logging.debug('Exception checking proxy %s: %s', service, exception)
+            self.types.invalidate(serviceId)
             return logging.info('Ignored announce from %s', serviceId)
-        self.mains[main] = datetime.datetime.now()
-        self._conn_ref.main = main
+        if resolved.type_id in SERVICE_KINDS:
+            kind = ServiceKind(resolved.type_id)
+            self._conn_ref.directory.announce(kind, serviceId, resolved.proxy)
+            if kind == ServiceKind.FILE_SERVICE:
+                self._conn_ref.providers.add_service(serviceId, resolved.proxy)
+            return logging.debug('Saved %s %s', kind, serviceId)
+        if resolved.type_id != IceFlix.MainPrx.ice_staticId():
+            return logging.debug('Ignored announce from %s %s', resolved.type_id, serviceId)
+        main = resolved.proxy
+        self.pool.announce(main)
         return logging.info('Saved main %s', main)
 
     def _timedout(self):
@@ -75,26 +79,37 @@ class ConnectionCheckerServant(IceFlix.Announcement):
         logging.debug('Connection to %s timedout', self._conn_ref.main)
         self._conn_ref.main = None
 
-class ConnectionCheckerApp(Ice.Application):
+class ConnectionCheckerApp:
     '''
         Service for subscribing to a specific topic_manager and get all the announces
     '''
-    def __init__(self, comm, conn_ref):
-        super().__init__()
-        self.comm = comm
-        self.servant = ConnectionCheckerServant(conn_ref)
+    def __init__(self, host, conn_ref):
+        self.host = host
+        self.servant = ConnectionCheckerServant(
+            conn_ref, MainPool.from_properties(host.communicator.getProperties()))
+        self.availability = FileAvailabilityServant(conn_ref.providers)
+        self.catalog_updates = CatalogUpdatesServant()
         self.proxy = None
-        self.adapter = None
         self._topic = None
+        self._proxies = {}
+        self._topics = {}
 
-    def main(self, _=None, configFile=None, initData=None):
-        return super().main(['Connection Checker'], configFile, initData)
+    def main(self):
+        '''
+            Starts the connection checker
+        '''
+        return self.run(None)
 
     def run(self, _):
-        self.adapter = self.comm.createObjectAdapterWithEndpoints('Announcements', 'tcp')
-        self.adapter.activate()
-
-        self.proxy = self.adapter.addWithUUID(self.servant)
+        '''
+            Adds the servants to the shared object adapter
+        '''
+        self.proxy = self.host.add(self.servant)
+        self._proxies = {
+            'FileAvailabilityAnnounce': self.host.add(self.availability),
+            'CatalogUpdates': self.host.add(self.catalog_updates)
+        }
+        self.servant.pool.start()
         logging.debug("'%s' connection checker created", self.proxy)
 
         return 0
@@ -103,8 +118,13 @@ class ConnectionCheckerApp(Ice.Application):
         '''
             Subscribes to topic manager at topic_manager_str_prx
         '''
+        self._unsubscribe()
+        self._topic = self._subscribe(topic_manager, 'Announcements', self.proxy)
+        for topic_name, proxy in self._proxies.items():
+            self._topics[topic_name] = self._subscribe(topic_manager, topic_name, proxy)
 
-        topic_name = "Announcements"
+    @staticmethod
+    def _subscribe(topic_manager, topic_name, proxy):
         try:
             topic = topic_manager.create(topic_name)
             logging.debug('Topic %s created', topic_name)
@@ -112,22 +132,31 @@ class ConnectionCheckerApp(Ice.Application):
             topic = topic_manager.retrieve(topic_name)
             logging.debug('Topic %s retrieved', topic_name)
 
-        self._unsubscribe()
-        self._topic = topic
-
         qos = {}
-        self._topic.subscribeAndGetPublisher(qos, self.proxy)
-        logging.debug('Subscribed to %s', self._topic)
+        topic.subscribeAndGetPublisher(qos, proxy)
+        logging.debug('Subscribed to %s', topic)
+        return topic
 
     def _unsubscribe(self):
         if self._topic is not None:
             self._topic.unsubscribe(self.proxy)
             logging.debug('Unsubscribed from %s', self._topic)
+        for topic_name, topic in self._topics.items():
+            topic.unsubscribe(self._proxies[topic_name])
+            logging.debug('Unsubscribed from %s', topic)
+        self._topics = {}
 
     def disconnect(self):
         '''
             Disconnects from current topic manager
         '''
         self._unsubscribe()
+        self.servant.pool.clear()
         self.servant._conn_ref.main = None
         logging.info('Connection checker disconnected')
+
+    def destroy(self):
+        '''
+            Stops probing the mains
+        '''
+        self.servant.pool.stop()
@@ -0,0 +1,121 @@
+'''
+    Directory of the services announced through the Announcements topic
+'''
+
+# pylint: disable=import-error, wrong-import-position, no-member
+
+from collections import OrderedDict
+from enum import Enum
+from threading import Lock
+from time import monotonic
+
+import os
+import logging
+
+import Ice
+
+Ice.loadSlice(os.path.join(os.path.dirname(__file__), "iceflix.ice"))
+import IceFlix
+
+try:
+    from mains import ExpiryHeap, MAIN_EXPIRY
+except ImportError:
+    from iceflix.mains import ExpiryHeap, MAIN_EXPIRY
+
+
+class ServiceKind(str, Enum):
+    '''
+        Services the client talks to directly
+    '''
+    AUTHENTICATOR = IceFlix.AuthenticatorPrx.ice_staticId()
+    CATALOG = IceFlix.MediaCatalogPrx.ice_staticId()
+    FILE_SERVICE = IceFlix.FileServicePrx.ice_staticId()
+
+    def __str__(self) -> str:
+        return self.name.lower()
+
+class ServiceDirectory:
+    '''
+        Live announced services keyed by kind and service id, plus the proxies
+        handed out by the main, which are only valid while the main does not change
+    '''
+    def __init__(self, expiry : float = MAIN_EXPIRY) -> None:
+        self.expiry = expiry
+        self.services = {kind: OrderedDict() for kind in ServiceKind}
+        self.handed = {}
+        self._expiries = ExpiryHeap()
+        self._lock = Lock()
+
+    def announce(self, kind : ServiceKind, service_id : str, proxy):
+        '''
+            Adds or refreshes an announced service
+        '''
+        with self._lock:
+            services = self.services[kind]
+            services[service_id] = proxy
+            services.move_to_end(service_id)
+            self._expiries.touch((kind, service_id), monotonic() + self.expiry)
+
+    def hand_out(self, kind : ServiceKind, proxy):
+        '''
+            Caches a proxy handed out by the main
+        '''
+        with self._lock:
+            self.handed[kind] = proxy
+
+    def get(self, kind : ServiceKind):
+        '''
+            The most recently announced live service of kind or the one handed out
+            by the main, None if none is known
+        '''
+        with self._lock:
+            self._evict()
+            services = self.services[kind]
+            if services:
+                return next(reversed(services.values()))
+            return self.handed.get(kind)
+
+    def candidates(self, kind : ServiceKind) -> list:
+        '''
+            Every live announced service of kind, the most recent first, followed by
+            the one handed out by the main
+        '''
+        with self._lock:
+            self._evict()
+            proxies = list(reversed(self.services[kind].values()))
+            handed = self.handed.get(kind)
+            if handed is not None and handed not in proxies:
+                proxies.append(handed)
+            return proxies
+
+    def _evict(self):
+        for kind, service_id in self._expiries.pop_expired(monotonic()):
+            logging.debug('%s %s expired', kind, service_id)
+            self.services[kind].pop(service_id, None)
+
+    def failed(self, proxy):
+        '''
+            Forgets a proxy after a failed call
+        '''
+        with self._lock:
+            for kind, services in self.services.items():
+                for service_id in [service_id for service_id, known in services.items()
+                    if known == proxy]:
+                    logging.debug('Forgetting failed %s %s', kind, service_id)
+                    services.pop(service_id)
+                    self._expiries.discard((kind, service_id))
+            for kind in [kind for kind, known in self.handed.items() if known == proxy]:
+                self.handed.pop(kind)
+
+    def main_changed(self, _=None):
+        '''
+            Drops the proxies handed out by the previous main
+        '''
+        with self._lock:
+            self.handed = {}
+
+    def invalidate(self):
+        '''
+            Drops the proxies handed out by the main after a communication error
+        '''
+        self.main_changed()
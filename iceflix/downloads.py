@@ -0,0 +1,208 @@
+'''
+    Background download queue
+'''
+
+# pylint: disable=import-error, wrong-import-position
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from enum import Enum
+from threading import Event, Lock
+from time import perf_counter_ns
+
+import os
+import logging
+
+try:
+    from transfer import TransferCancelled, format_size
+except ImportError:
+    from iceflix.transfer import TransferCancelled, format_size
+
+
+DOWNLOAD_WORKERS = 2
+
+class JobState(str, Enum):
+    '''
+        Lifecycle of a download job
+    '''
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __str__(self) -> str:
+        return self.value
+
+class TargetBusyError(Exception):
+    '''
+        Another download is writing the same file
+    '''
+    def __init__(self, path : str) -> None:
+        super().__init__(f'{path} is already being downloaded')
+
+class TargetClaims:
+    '''
+        Files being written by the downloads, so two of them never write the same one
+    '''
+    def __init__(self) -> None:
+        self.paths = set()
+        self._lock = Lock()
+
+    @contextmanager
+    def claim(self, path : str):
+        '''
+            Holds path while the block runs, raises TargetBusyError if it is held
+        '''
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self.paths:
+                raise TargetBusyError(path)
+            self.paths.add(path)
+        try:
+            yield path
+        finally:
+            with self._lock:
+                self.paths.discard(path)
+
+class DownloadJob:
+    '''
+        A title queued for download
+    '''
+    def __init__(self, job_id : int, title, target) -> None:
+        self.id = job_id
+        self.title = title
+        self.target = target
+        self.state = JobState.QUEUED
+        self.bytes = 0
+        self.error = None
+        self.cancel = Event()
+        self._start = None
+        self._end = None
+
+    @property
+    def finished(self) -> bool:
+        '''
+            True if the job will not transfer anything else
+        '''
+        return self.state in (JobState.DONE, JobState.FAILED, JobState.CANCELLED)
+
+    @property
+    def elapsed(self) -> float:
+        '''
+            Seconds the job has been running
+        '''
+        if self._start is None:
+            return 0.0
+        end = self._end if self._end is not None else perf_counter_ns()
+        return (end - self._start) / 10**9
+
+    def begin(self):
+        '''
+            Marks the job as running
+        '''
+        self.state = JobState.RUNNING
+        self._start = perf_counter_ns()
+
+    def end(self, state : JobState):
+        '''
+            Marks the job as finished with state
+        '''
+        self.state = state
+        self._end = perf_counter_ns()
+
+    def advance(self, size : int):
+        '''
+            Accounts size more bytes downloaded
+        '''
+        self.bytes += size
+
+    def __str__(self) -> str:
+        name = self.title.name if self.title.name is not None else self.title.id
+        elapsed = self.elapsed
+        rate = f', {format_size(self.bytes / elapsed)}/s' if elapsed > 0 else ''
+        error = f' ({self.error})' if self.error is not None else ''
+        return f'{self.id}. [{self.state}] {name}: {format_size(self.bytes)}{rate}{error}'
+
+class DownloadManager:
+    '''
+        Runs the queued downloads on a pool of worker threads. A title is only queued
+        once until its job finishes, and the targets claim the files they write
+    '''
+    def __init__(self, workers : int = DOWNLOAD_WORKERS, notify = None) -> None:
+        self.workers = max(1, workers)
+        self.notify = notify
+        self.jobs = {}
+        self.targets = TargetClaims()
+        self._futures = {}
+        self._next_id = 1
+        self._lock = Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='download')
+
+    def submit(self, title, target) -> DownloadJob:
+        '''
+            Queues target(job) to download title, returns the unfinished job of title
+            if it is already queued
+        '''
+        with self._lock:
+            for job in self.jobs.values():
+                if job.title.id == title.id and not job.finished:
+                    logging.info('Download of %s is already job %d', title.id, job.id)
+                    return job
+            job = DownloadJob(self._next_id, title, target)
+            self.jobs[job.id] = job
+            self._next_id += 1
+        self._futures[job.id] = self._pool.submit(self._run, job)
+        logging.info('Queued download %d for %s', job.id, title.id)
+        return job
+
+    def cancel(self, job_id : int) -> bool:
+        '''
+            Cancels a job, returns False if it doesn't exist or already finished
+        '''
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel.set()
+        if job.state == JobState.QUEUED:
+            job.state = JobState.CANCELLED
+        return True
+
+    def wait(self, timeout : float = None) -> bool:
+        '''
+            Waits until every queued job finishes, returns False on timeout
+        '''
+        _, not_done = wait(list(self._futures.values()), timeout=timeout)
+        return not not_done
+
+    def clear(self):
+        '''
+            Forgets every finished job
+        '''
+        with self._lock:
+            self.jobs = {job_id: job for job_id, job in self.jobs.items() if not job.finished}
+            self._futures = {job_id: self._futures[job_id] for job_id in self.jobs}
+
+    def shutdown(self):
+        '''
+            Cancels every pending job and waits for the workers
+        '''
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        self._pool.shutdown(wait=True)
+
+    def _run(self, job : DownloadJob):
+        if job.cancel.is_set():
+            return
+        job.begin()
+        try:
+            job.target(job)
+            job.end(JobState.DONE)
+        except TransferCancelled:
+            job.end(JobState.CANCELLED)
+        except Exception as error: # pylint: disable=broad-exception-caught
+            logging.debug('Download %d failed: %s', job.id, error)
+            job.error = str(error) if str(error) else error.__class__.__name__
+            job.end(JobState.FAILED)
+        if self.notify is not None:
+            self.notify(job)
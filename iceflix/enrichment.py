@@ -0,0 +1,75 @@
+'''
+    Fetches the tiles of the search results concurrently, so they can be shown as they arrive
+'''
+
+# pylint: disable=import-error, wrong-import-position
+
+from itertools import islice
+from queue import Queue
+
+import logging
+
+try:
+    from hedging import CALL_DEADLINE
+except ImportError:
+    from iceflix.hedging import CALL_DEADLINE
+
+
+ENRICH_CONCURRENCY = 16
+
+class TileEnricher:
+    '''
+        Calls getTile for many media ids with at most concurrency requests in flight
+    '''
+    def __init__(self, concurrency : int = ENRICH_CONCURRENCY,
+        deadline : float = CALL_DEADLINE) -> None:
+        self.concurrency = max(1, concurrency)
+        self.deadline = deadline
+
+    @staticmethod
+    def from_properties(properties) -> 'TileEnricher':
+        '''
+            Builds an enricher using the EnrichConcurrency and CallDeadline (seconds) properties
+        '''
+        return TileEnricher(
+            properties.getPropertyAsIntWithDefault('EnrichConcurrency', ENRICH_CONCURRENCY),
+            float(properties.getPropertyWithDefault('CallDeadline', str(CALL_DEADLINE))))
+
+    def fetch(self, catalog, media_ids : list[str], token : str):
+        '''
+            Yields (media id, media, error) for every media id as the answers arrive.
+            The requests still in flight are cancelled if the generator is closed
+        '''
+        if not hasattr(catalog, 'getTileAsync'):
+            for media_id in media_ids:
+                try:
+                    yield media_id, catalog.getTile(media_id, token), None
+                except Exception as error: # pylint: disable=broad-exception-caught
+                    yield media_id, None, error
+            return
+        if self.deadline > 0:
+            catalog = catalog.ice_invocationTimeout(int(self.deadline * 1000))
+        answers = Queue()
+        pending = iter(media_ids)
+        in_flight = set()
+        def send(media_id):
+            future = catalog.getTileAsync(media_id, token)
+            in_flight.add(future)
+            future.add_done_callback(lambda future: answers.put((media_id, future)))
+        try:
+            for media_id in islice(pending, self.concurrency):
+                send(media_id)
+            while in_flight:
+                media_id, future = answers.get()
+                in_flight.discard(future)
+                for next_id in islice(pending, 1):
+                    send(next_id)
+                error = future.exception()
+                if error is not None:
+                    logging.debug('Could not get tile %s: %s', media_id, error)
+                    yield media_id, None, error
+                else:
+                    yield media_id, future.result(), None
+        finally:
+            for future in in_flight:
+                future.cancel()
@@ -135,29 +135,24 @@ class EventListener(
         '''
         event.msg = f'announce {mediaIds}'
 
-class EventListenerApp(Ice.Application):
+class EventListenerApp:
     '''
         Initialize a new Event listener
     '''
-    def __init__(self, topic_manager):
-        super().__init__()
-        self.comm = Ice.initialize()
+    def __init__(self, host, topic_manager):
+        self.host = host
         self.servant = EventListener()
         self.proxy = None
-        self.adapter = None
         self.topic_manager = topic_manager
         self.__lock = Lock()
 
         self.topics = {str(topic): None for topic in AvailableTopic}
 
-    def main(self, _=None, configFile=None, initData=None):
-        return super().main(['Event Listener'], configFile, initData)
-
     def run(self, _):
-        self.adapter = self.comm.createObjectAdapterWithEndpoints('Announcements', 'tcp')
-        self.adapter.activate()
-
-        self.proxy = self.adapter.addWithUUID(self.servant)
+        '''
+            Adds the event listener to the shared object adapter
+        '''
+        self.proxy = self.host.add(self.servant)
 
         self.__lock.acquire(blocking=False)
         return 0
@@ -168,7 +163,7 @@ class EventListenerApp(Ice.Application):
 
     def __exit__(self, *args):
         self.shutdown()
-        self.comm.destroy()
+        self.host.remove(self.proxy)
 
     def subscribe(self, available_topic: AvailableTopic):
         '''
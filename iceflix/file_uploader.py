@@ -5,52 +5,166 @@
 # pylint: disable=import-error, wrong-import-position, consider-using-with
 
 import os
+import mmap
 import logging
 
+from queue import Queue, Empty, Full
+from threading import Event, Thread
+
 import Ice
 
 Ice.loadSlice(os.path.join(os.path.dirname(__file__), "iceflix.ice"))
 import IceFlix
 
+try:
+    from transfer import StreamHasher, TransferStats
+except ImportError:
+    from iceflix.transfer import StreamHasher, TransferStats
+
+
+READ_AHEAD_CHUNK = 64 * 1024
+READ_AHEAD_BUFFERS = 2
+
+class MappedSource:
+    '''Serves slices of a memory mapped file without copying them'''
+    def __init__(self, file_pointer) -> None:
+        self._map = mmap.mmap(file_pointer.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self._offset = 0
+
+    def read(self, size):
+        '''Returns a view of the next size bytes'''
+        raw = self._view[self._offset:self._offset + size]
+        self._offset += len(raw)
+        return raw
+
+    def close(self):
+        '''Unmaps the file'''
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            logging.debug('A chunk is still referenced, the map is released with it')
+
+class ReadAheadSource:
+    '''Reads the next chunks from a dedicated thread while the current one is being sent'''
+    def __init__(self, file_pointer, chunk_size=READ_AHEAD_CHUNK, buffers=READ_AHEAD_BUFFERS):
+        self._file = file_pointer
+        self._chunk_size = chunk_size
+        self._queue = Queue(maxsize=buffers)
+        self._pending = memoryview(b'')
+        self._eof = False
+        self._stop = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            raw = self._file.read(self._chunk_size)
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(raw, timeout=0.1)
+                    break
+                except Full:
+                    continue
+            if not raw:
+                return
+
+    def read(self, size):
+        '''Returns the next size bytes, following reads prefetch chunks of that size'''
+        self._chunk_size = size
+        pending = self._pending
+        while len(pending) < size and not self._eof:
+            raw = self._queue.get()
+            if not raw:
+                self._eof = True
+            elif not pending:
+                pending = memoryview(raw)
+            else:
+                pending = memoryview(bytes(pending) + raw)
+        raw, self._pending = pending[:size], pending[size:]
+        return raw
+
+    def close(self):
+        '''Stops the read ahead thread'''
+        self._stop.set()
+        try:
+            while True:
+                self._queue.get_nowait()
+        except Empty:
+            pass
+        self._thread.join(timeout=1)
+
+def open_source(file_pointer, chunk_size=READ_AHEAD_CHUNK):
+    '''Memory maps file_pointer if possible, else reads it ahead from a thread'''
+    try:
+        return MappedSource(file_pointer)
+    except (ValueError, OSError) as error:
+        logging.debug('Reading ahead, the file can not be mapped: %s', error)
+        return ReadAheadSource(file_pointer, chunk_size)
 
 class FileUploader(IceFlix.FileUploader):
     '''File uploader Ice servant'''
-    def __init__(self, file) -> None:
+    def __init__(self, file, max_chunk=None, algorithm=None) -> None:
         super().__init__()
         self.file_pointer = open(file, 'rb')
+        self.max_chunk = max_chunk
+        self.hasher = StreamHasher(algorithm) if algorithm else None
+        self.stats = TransferStats('upload')
+        self.source = open_source(
+            self.file_pointer, min(READ_AHEAD_CHUNK, max_chunk or READ_AHEAD_CHUNK))
         logging.info('Sending file: %s', file)
 
+    @property
+    def digest(self):
+        '''Digest of every byte served, None if hashing is disabled'''
+        return self.hasher.hexdigest() if self.hasher is not None else None
+
     def receive(self, size, _):
-        '''Gets size bytes from the file and returns them'''
-        raw = self.file_pointer.read(size)
-        logging.debug('%s', raw)
+        '''Gets up to size bytes (never more than max_chunk) from the file and returns them'''
+        if self.max_chunk is not None:
+            size = min(size, self.max_chunk)
+        raw = self.source.read(size)
+        logging.debug('Sending %d bytes', len(raw))
+        self.stats.add(raw)
+        if self.hasher is not None:
+            self.hasher.update(raw)
+        return raw
 
     def close(self, _):
         '''Closes the file and shutdowns the uploader'''
         if self.file_pointer.closed:
             return
+        if self.hasher is not None:
+            self.hasher.hexdigest()
+        self.source.close()
         self.file_pointer.close()
+        self.stats.finish()
         logging.info('Close received')
 
-class FileUploaderApp(Ice.Application):
+class FileUploaderApp:
     '''Manages the file transfer'''
-    def __init__(self, file, comm):
-        super().__init__()
-        self.comm = comm
-        self.servant = FileUploader(file)
+    def __init__(self, file, host, max_chunk=None, algorithm=None):
+        self.host = host
+        self.servant = FileUploader(file, max_chunk, algorithm)
         self.proxy = None
-        self.adapter = None
         self.cast = None
 
-    def main(self, _=None, configFile=None, initData=None):
-        return super().main(['File Uploader'], configFile, initData)
+    def main(self):
+        '''Adds the uploader to the shared object adapter'''
+        return self.run(None)
 
     def run(self, _):
-        self.adapter = self.comm.createObjectAdapterWithEndpoints('FileUploader', 'tcp')
-        self.adapter.activate()
-
-        self.proxy = self.adapter.addWithUUID(self.servant)
+        '''Adds the uploader to the shared object adapter'''
+        self.proxy = self.host.add(self.servant)
 
-        self.cast = IceFlix.FileUploaderPrx.checkedCast(self.proxy)
+        self.cast = IceFlix.FileUploaderPrx.uncheckedCast(self.proxy)
 
         return 0
+
+    def destroy(self):
+        '''Closes the file and removes the uploader from the adapter'''
+        self.servant.close(None)
+        if self.proxy is not None:
+            self.host.remove(self.proxy)
+            self.proxy = self.cast = None
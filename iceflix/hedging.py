@@ -0,0 +1,167 @@
+'''
+    Hedged reads: a second request is sent to another service when the first one
+    takes longer than usual, the slower one is cancelled
+'''
+
+# pylint: disable=import-error, wrong-import-position, no-member
+
+from collections import deque
+from threading import Condition, Lock
+from time import monotonic
+
+import logging
+
+import Ice
+
+
+HEDGE_PERCENTILE = 95
+HEDGE_DELAY = 0.1
+HEDGE_MIN_SAMPLES = 10
+LATENCY_SAMPLES = 100
+CALL_DEADLINE = 5.0
+
+class LatencyTracker:
+    '''
+        Latencies of the latest calls of every operation
+    '''
+    def __init__(self, samples : int = LATENCY_SAMPLES) -> None:
+        self.samples = samples
+        self.latencies = {}
+        self._lock = Lock()
+
+    def record(self, operation : str, latency : float):
+        '''
+            Accounts a call to operation answered in latency seconds
+        '''
+        with self._lock:
+            self.latencies.setdefault(operation, deque(maxlen=self.samples)).append(latency)
+
+    def percentile(self, operation : str, percentile : float) -> float:
+        '''
+            The latency percentile of operation, None if there are too few samples
+        '''
+        with self._lock:
+            latencies = sorted(self.latencies.get(operation, ()))
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+        return latencies[index]
+
+class HedgedCall:
+    '''
+        The state shared by the requests of a hedged read
+    '''
+    def __init__(self) -> None:
+        self.result = None
+        self.errors = []
+        self.user_error = None
+        self.winner = None
+        self.pending = 0
+        self.done = Condition()
+
+    def settled(self) -> bool:
+        '''
+            True if a request answered, every request failed or the service raised
+            a user exception, which any other service would raise too
+        '''
+        return self.winner is not None or not self.pending or self.user_error is not None
+
+    def finished(self, future, start : float, tracker : LatencyTracker, operation : str):
+        '''
+            Done callback of every request
+        '''
+        try:
+            result = future.result()
+        except Exception as error: # pylint: disable=broad-exception-caught
+            with self.done:
+                self.pending -= 1
+                self.errors.append(error)
+                if isinstance(error, Ice.UserException) and self.user_error is None:
+                    self.user_error = error
+                self.done.notify_all()
+            return
+        tracker.record(operation, monotonic() - start)
+        with self.done:
+            self.pending -= 1
+            if self.winner is None:
+                self.winner = future
+                self.result = result
+            self.done.notify_all()
+
+class Hedger:
+    '''
+        Sends reads with a deadline, hedging them on a backup service if enabled
+    '''
+    def __init__(self, enabled : bool = False, percentile : float = HEDGE_PERCENTILE,
+        deadline : float = CALL_DEADLINE) -> None:
+        self.enabled = enabled
+        self.percentile = percentile
+        self.deadline = deadline
+        self.tracker = LatencyTracker()
+        self.hedged = 0
+        self.won = 0
+        self._lock = Lock()
+
+    @staticmethod
+    def from_properties(properties) -> 'Hedger':
+        '''
+            Builds a hedger using the HedgedReads, HedgePercentile and CallDeadline
+            (seconds) properties
+        '''
+        return Hedger(
+            properties.getPropertyAsIntWithDefault('HedgedReads', 0) > 0,
+            float(properties.getPropertyWithDefault('HedgePercentile', str(HEDGE_PERCENTILE))),
+            float(properties.getPropertyWithDefault('CallDeadline', str(CALL_DEADLINE))))
+
+    def delay(self, operation : str) -> float:
+        '''
+            Seconds to wait for the first answer before sending the backup request
+        '''
+        delay = self.tracker.percentile(operation, self.percentile)
+        return delay if delay is not None else HEDGE_DELAY
+
+    def _timed(self, proxy):
+        if self.deadline > 0 and hasattr(proxy, 'ice_invocationTimeout'):
+            return proxy.ice_invocationTimeout(int(self.deadline * 1000))
+        return proxy
+
+    def call(self, primary, backups : list, operation : str, args : tuple):
+        '''
+            Returns operation(*args) from primary, or from the first backup if primary
+            is still pending when the delay runs out. User exceptions are raised as
+            soon as any service raises them
+        '''
+        if not self.enabled or not backups or not hasattr(primary, f'{operation}Async'):
+            start = monotonic()
+            result = getattr(self._timed(primary), operation)(*args)
+            self.tracker.record(operation, monotonic() - start)
+            return result
+        call = HedgedCall()
+        futures = [self._send(call, primary, operation, args)]
+        with call.done:
+            call.done.wait_for(call.settled, self.delay(operation))
+            if not call.settled():
+                backup = backups[0]
+                logging.debug('Hedging %s on %s', operation, backup)
+                with self._lock:
+                    self.hedged += 1
+                futures.append(self._send(call, backup, operation, args))
+                call.done.wait_for(call.settled)
+        for future in futures:
+            if future is not call.winner and not future.done():
+                future.cancel()
+        if call.winner is None:
+            raise call.user_error if call.user_error is not None else call.errors[0]
+        if call.winner is not futures[0]:
+            with self._lock:
+                self.won += 1
+        return call.result
+
+    def _send(self, call : HedgedCall, proxy, operation : str, args : tuple):
+        start = monotonic()
+        with call.done:
+            call.pending += 1
+        future = getattr(self._timed(proxy), f'{operation}Async')(*args)
+        future.add_done_callback(
+            lambda future: call.finished(future, start, self.tracker, operation))
+        return future
@@ -0,0 +1,392 @@
+'''
+    Pool of the announced main services, probed in background and ranked by health
+'''
+
+# pylint: disable=import-error, wrong-import-position, no-member
+
+from threading import Condition, Event, Lock, Thread, TIMEOUT_MAX
+from time import monotonic, perf_counter
+
+import os
+import json
+import heapq
+import logging
+
+import Ice
+
+
+MAIN_EXPIRY = 12
+MAIN_PROBE_INTERVAL = 2.0
+MAIN_PROBE_TIMEOUT = 2.0
+LATENCY_WEIGHT = 0.3
+FAILURE_WEIGHT = 0.5
+FAILURE_LIMIT = 0.5
+
+class MainHealth:
+    '''
+        Health of an announced main: EWMA of the ping latency and of the failures
+    '''
+    def __init__(self, proxy, direct : bool = False) -> None:
+        self.proxy = proxy
+        self.direct = direct
+        self.latency = None
+        self.failure = 0.0
+        self.seen = monotonic()
+        self.probing = False
+
+    @property
+    def healthy(self) -> bool:
+        '''
+            True if most of the recent probes succeeded
+        '''
+        return self.failure < FAILURE_LIMIT
+
+    def succeeded(self, latency : float):
+        '''
+            Accounts a ping answered in latency seconds
+        '''
+        self.latency = latency if self.latency is None \
+            else LATENCY_WEIGHT * latency + (1 - LATENCY_WEIGHT) * self.latency
+        self.failure = (1 - FAILURE_WEIGHT) * self.failure
+
+    def failed(self, refused : bool = False):
+        '''
+            Accounts a failed ping, a refused connection makes the main unhealthy at once
+        '''
+        self.failure = 1.0 if refused else \
+            FAILURE_WEIGHT + (1 - FAILURE_WEIGHT) * self.failure
+
+    def rank(self) -> tuple:
+        '''
+            Sort key, lower is better
+        '''
+        return (self.latency is None, self.latency or 0.0, self.failure)
+
+    def __str__(self) -> str:
+        latency = f'{self.latency * 1000:.1f} ms' if self.latency is not None else '-'
+        return f'{self.proxy} (latency {latency}, failure {self.failure:.2f})'
+
+class ExpiryHeap:
+    '''
+        Deadlines on the monotonic clock, refreshing a key leaves its old deadline
+        in the heap to be skipped when it is popped
+    '''
+    def __init__(self) -> None:
+        self.deadlines = {}
+        self._heap = []
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+    def touch(self, key, deadline : float):
+        '''
+            Sets the deadline of key
+        '''
+        self.deadlines[key] = deadline
+        self._counter += 1
+        heapq.heappush(self._heap, (deadline, self._counter, key))
+        if len(self._heap) > 2 * len(self.deadlines) + 16:
+            self._compact()
+
+    def discard(self, key):
+        '''
+            Forgets key
+        '''
+        self.deadlines.pop(key, None)
+
+    def clear(self):
+        '''
+            Forgets every key
+        '''
+        self.deadlines = {}
+        self._heap = []
+
+    def next_deadline(self) -> float:
+        '''
+            Earliest deadline, None if the heap is empty
+        '''
+        self._skip_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now : float) -> list:
+        '''
+            Removes and returns the keys whose deadline is before now
+        '''
+        expired = []
+        while self.next_deadline() is not None and self._heap[0][0] <= now:
+            _, _, key = heapq.heappop(self._heap)
+            self.deadlines.pop(key)
+            expired.append(key)
+        return expired
+
+    def _skip_stale(self):
+        while self._heap and self.deadlines.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self.deadlines.get(entry[2]) == entry[0]]
+        heapq.heapify(self._heap)
+
+class MainPool:
+    '''
+        Keeps the health of every announced main and the best one ready to be used
+    '''
+    def __init__(self, expiry : float = MAIN_EXPIRY, interval : float = MAIN_PROBE_INTERVAL,
+        timeout : float = MAIN_PROBE_TIMEOUT) -> None:
+        self.expiry = expiry
+        self.interval = interval
+        self.timeout = timeout
+        self.entries = {}
+        self.best = None
+        self.listeners = []
+        self._expiries = ExpiryHeap()
+        self._lock = Lock()
+        self._wake = Condition(self._lock)
+        self._stop = Event()
+        self._threads = []
+
+    @staticmethod
+    def from_properties(properties) -> 'MainPool':
+        '''
+            Builds a pool using the MainProbeInterval and MainProbeTimeout properties (seconds)
+        '''
+        return MainPool(
+            interval=float(properties.getPropertyWithDefault(
+                'MainProbeInterval', str(MAIN_PROBE_INTERVAL))),
+            timeout=float(properties.getPropertyWithDefault(
+                'MainProbeTimeout', str(MAIN_PROBE_TIMEOUT))))
+
+    def announce(self, proxy, direct : bool = False):
+        '''
+            Adds or refreshes an announced main, direct mains never expire
+        '''
+        with self._lock:
+            health = self.entries.get(proxy)
+            new = health is None
+            if new:
+                health = self.entries[proxy] = MainHealth(proxy, direct)
+                health.probing = True
+                logging.debug('New main %s', proxy)
+            health.seen = monotonic()
+            if not health.direct:
+                self._expiries.touch(proxy, health.seen + self.expiry)
+                if new:
+                    self._wake.notify()
+            changed = self._rank()
+        self._notify(changed)
+        if new:
+            self._probe(health)
+
+    def connect(self, proxy):
+        '''
+            Adds proxy to the pool as soon as it answers a ping
+        '''
+        def answered(future):
+            error = future.exception()
+            if error is not None:
+                return logging.debug('Main %s did not answer: %s', proxy, error)
+            return self.announce(proxy)
+        try:
+            proxy.ice_invocationTimeout(int(self.timeout * 1000)).ice_pingAsync() \
+                .add_done_callback(answered)
+        except Ice.Exception as error:
+            logging.debug('Main %s can not be pinged: %s', proxy, error)
+
+    def ranked(self) -> list:
+        '''
+            Healthy mains, the best first
+        '''
+        with self._lock:
+            healthy = [health for health in self.entries.values() if health.healthy]
+        return [health.proxy for health in sorted(healthy, key=MainHealth.rank)]
+
+    def failed(self, proxy):
+        '''
+            Accounts a failed call to a main
+        '''
+        with self._lock:
+            health = self.entries.get(proxy)
+            if health is None:
+                return
+            health.failed()
+            changed = self._rank()
+        self._notify(changed)
+
+    def forget(self, proxy):
+        '''
+            Removes a main from the pool
+        '''
+        with self._lock:
+            self.entries.pop(proxy, None)
+            self._expiries.discard(proxy)
+            changed = self._rank()
+        self._notify(changed)
+
+    def clear(self):
+        '''
+            Removes every main
+        '''
+        with self._lock:
+            self.entries = {}
+            self._expiries.clear()
+            changed = self._rank()
+        self._notify(changed)
+
+    def _evict(self) -> int:
+        expired = self._expiries.pop_expired(monotonic())
+        for proxy in expired:
+            logging.debug('Main %s expired', proxy)
+            self.entries.pop(proxy, None)
+        return len(expired)
+
+    def _rank(self) -> bool:
+        self._evict()
+        best = self.best
+        healthy = [health for health in self.entries.values() if health.healthy]
+        self.best = min(healthy, key=MainHealth.rank).proxy if healthy else None
+        return self.best is not best
+
+    def _notify(self, changed : bool):
+        if not changed:
+            return
+        best = self.best
+        if best is None:
+            logging.info('No reachable main')
+        else:
+            logging.info('Using main %s', best)
+        for listener in self.listeners:
+            try:
+                listener(best)
+            except Exception as exception: # pylint: disable=broad-exception-caught
+                logging.warning('Error notifying main change: %s', exception)
+
+    def _record(self, health : MainHealth, start : float, error : Exception = None):
+        with self._lock:
+            health.probing = False
+            if error is None:
+                health.succeeded(perf_counter() - start)
+            else:
+                logging.debug('Ping to main %s failed: %s', health.proxy, error)
+                health.failed(isinstance(error, Ice.ConnectionRefusedException))
+            changed = self._rank()
+        self._notify(changed)
+
+    def probe(self):
+        '''
+            Pings every main without waiting for the answers
+        '''
+        with self._lock:
+            changed = self._rank()
+            pending = [health for health in self.entries.values() if not health.probing]
+            for health in pending:
+                health.probing = True
+        self._notify(changed)
+        for health in pending:
+            self._probe(health)
+
+    def _probe(self, health : MainHealth):
+        start = perf_counter()
+        proxy = health.proxy
+        if not hasattr(proxy, 'ice_pingAsync'):
+            try:
+                proxy.ice_ping()
+            except Exception as error: # pylint: disable=broad-exception-caught
+                return self._record(health, start, error)
+            return self._record(health, start)
+        try:
+            future = proxy.ice_invocationTimeout(int(self.timeout * 1000)).ice_pingAsync()
+        except Exception as error: # pylint: disable=broad-exception-caught
+            return self._record(health, start, error)
+        future.add_done_callback(
+            lambda future: self._record(health, start, future.exception()))
+        return None
+
+    def start(self):
+        '''
+            Starts probing the mains and evicting the expired ones in background
+        '''
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads = [
+            Thread(target=self._run, daemon=True, name='main-prober'),
+            Thread(target=self._sweep, daemon=True, name='main-sweeper')]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.probe()
+
+    def _sweep(self):
+        while not self._stop.is_set():
+            with self._lock:
+                deadline = self._expiries.next_deadline()
+                timeout = None if deadline is None else deadline - monotonic()
+                if timeout is None or timeout > 0:
+                    self._wake.wait(min(timeout, TIMEOUT_MAX) if timeout is not None else None)
+                changed = self._rank() if self._evict() else False
+            self._notify(changed)
+
+    def stop(self):
+        '''
+            Stops the background threads
+        '''
+        self._stop.set()
+        with self._lock:
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=self.interval)
+        self._threads = []
+
+KNOWN_MAINS_LIMIT = 8
+
+class KnownMains:
+    '''
+        Mains used in previous sessions, most recent first
+    '''
+    def __init__(self, path : str = None, limit : int = KNOWN_MAINS_LIMIT) -> None:
+        self.path = path
+        self.limit = limit
+        self.proxies = []
+        if self.path:
+            self._load()
+
+    @staticmethod
+    def from_properties(properties) -> 'KnownMains':
+        '''
+            Builds the list stored at KnownMains, disabled if the property is empty
+        '''
+        path = properties.getProperty('KnownMains')
+        return KnownMains(os.path.expanduser(path) if path else None)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as known:
+                self.proxies = [str(proxy) for proxy in json.load(known)][:self.limit]
+        except (OSError, ValueError, TypeError):
+            self.proxies = []
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as known:
+            json.dump(self.proxies, known)
+        os.replace(temporary, self.path)
+
+    def remember(self, proxy):
+        '''
+            Moves proxy to the front of the list
+        '''
+        if not self.path or isinstance(proxy, Ice.Object):
+            return
+        string = str(proxy)
+        if self.proxies and self.proxies[0] == string:
+            return
+        self.proxies = [string] + [known for known in self.proxies if known != string]
+        del self.proxies[self.limit:]
+        try:
+            self._save()
+        except OSError as error:
+            logging.warning('Could not save the known mains: %s', error)
@@ -0,0 +1,247 @@
+'''
+    Local content addressed cache of the downloaded media
+'''
+
+# pylint: disable=import-error, wrong-import-position
+
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from time import time
+from uuid import uuid4
+
+import os
+import json
+import logging
+
+try:
+    from updates import CatalogListener
+except ImportError:
+    from iceflix.updates import CatalogListener
+
+
+MEDIA_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.iceflix', 'media')
+INDEX_FILE = 'index.json'
+HASH_BLOCK = 1024 * 1024
+
+def copy_file(source : str, target : str, expected : str = None) -> str:
+    '''
+        Copies source to target through a temporary file, returns the SHA-256 of the copy.
+        Leaves target untouched and returns None if the copy does not match expected
+    '''
+    digest = sha256()
+    temporary = f'{target}.tmp'
+    try:
+        with open(source, 'rb') as original, open(temporary, 'wb') as copy:
+            for block in iter(lambda: original.read(HASH_BLOCK), b''):
+                digest.update(block)
+                copy.write(block)
+        if expected is not None and digest.hexdigest() != expected:
+            os.remove(temporary)
+            return None
+        os.replace(temporary, target)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return digest.hexdigest()
+
+class CacheEntry:
+    '''
+        A cached media
+    '''
+    def __init__(self, digest : str, size : int, used : float = None) -> None:
+        self.digest = digest
+        self.size = size
+        self.used = used if used is not None else time()
+
+    def to_json(self) -> dict:
+        '''
+            Representation stored in the index file
+        '''
+        return {'digest': self.digest, 'size': self.size, 'used': self.used}
+
+class MediaCache(CatalogListener):
+    '''
+        Keeps copies of the downloaded media keyed by media id and content hash,
+        evicting the least recently used ones above max_size bytes. A download whose
+        hash is already known is hard linked into the cache instead of copied, so it
+        takes no extra reads nor space; media without a known hash are copied.
+        The user always gets a restored copy of its own, checked against the hash,
+        and a cached copy changed through its link is dropped when it is restored.
+        The recency of the hits is only written to the index on the next change or close
+    '''
+    def __init__(self, directory : str = MEDIA_CACHE_DIR, max_size : int = 0) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self._refs = {}
+        self._dirty = False
+        self._lock = Lock()
+        if self.enabled:
+            self._load()
+
+    @staticmethod
+    def from_properties(properties) -> 'MediaCache':
+        '''
+            Builds a cache using the MediaCache* properties, disabled if MediaCacheSize is 0
+        '''
+        directory = properties.getPropertyWithDefault('MediaCacheDir', MEDIA_CACHE_DIR)
+        return MediaCache(
+            os.path.expanduser(directory),
+            properties.getPropertyAsIntWithDefault('MediaCacheSize', 0))
+
+    @property
+    def enabled(self) -> bool:
+        '''
+            True if the cache can store anything
+        '''
+        return self.max_size > 0
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _blob_path(self, digest : str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as index:
+                stored = json.load(index)
+        except (OSError, ValueError):
+            stored = {}
+        for media_id, data in sorted(stored.items(), key=lambda item: item[1]['used']):
+            if os.path.isfile(self._blob_path(data['digest'])):
+                self._add(media_id, CacheEntry(data['digest'], data['size'], data['used']))
+        logging.info('Media cache with %d entries loaded from %s', len(self.entries), self.directory)
+
+    def _save(self):
+        temporary = f'{self._index_path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as index:
+            json.dump({media_id: entry.to_json() for media_id, entry in self.entries.items()}, index)
+        os.replace(temporary, self._index_path)
+        self._dirty = False
+
+    def _add(self, media_id : str, entry : CacheEntry):
+        self.entries[media_id] = entry
+        if entry.digest not in self._refs:
+            self.size += entry.size
+        self._refs[entry.digest] = self._refs.get(entry.digest, 0) + 1
+
+    def lookup(self, media_id : str) -> CacheEntry:
+        '''
+            The entry of media_id if it is cached, marking it as recently used
+        '''
+        with self._lock:
+            entry = self.entries.get(media_id)
+            if entry is None:
+                return None
+            if not os.path.isfile(self._blob_path(entry.digest)):
+                self._drop(media_id)
+                return None
+            entry.used = time()
+            self.entries.move_to_end(media_id)
+            self._dirty = True
+            return entry
+
+    def restore(self, media_id : str, target : str) -> CacheEntry:
+        '''
+            Places the cached copy of media_id at target, returns None if it's not cached
+        '''
+        if not self.enabled:
+            return None
+        entry = self.lookup(media_id)
+        if entry is None:
+            return None
+        try:
+            copied = copy_file(self._blob_path(entry.digest), target, entry.digest)
+        except OSError as error:
+            logging.warning('Could not restore %s from the media cache: %s', media_id, error)
+            copied = None
+        if copied is None:
+            logging.warning('Dropping the corrupted cached copy of %s', media_id)
+            self.invalidate(media_id)
+            return None
+        logging.info('Restored %s from the media cache', media_id)
+        return entry
+
+    def store(self, media_id : str, path : str, digest : str = None) -> CacheEntry:
+        '''
+            Adds the file at path as the content of media_id
+        '''
+        if not self.enabled:
+            return None
+        size = os.path.getsize(path)
+        if size > self.max_size:
+            return None
+        if digest is None or not os.path.isfile(self._blob_path(digest)):
+            staged = os.path.join(self.directory, f'{uuid4().hex}.incoming')
+            digest = self._stage(path, staged, digest)
+            os.makedirs(os.path.dirname(self._blob_path(digest)), exist_ok=True)
+            os.replace(staged, self._blob_path(digest))
+        with self._lock:
+            self._drop(media_id)
+            entry = CacheEntry(digest, size)
+            self._add(media_id, entry)
+            self._evict()
+            self._save()
+        logging.debug('Cached %s as %s', media_id, digest)
+        return entry
+
+    @staticmethod
+    def _stage(path : str, staged : str, digest : str = None) -> str:
+        if digest is not None:
+            try:
+                os.link(path, staged)
+                return digest
+            except OSError as error:
+                logging.debug('Could not link %s into the media cache: %s', path, error)
+        copied = copy_file(path, staged)
+        if digest is not None and copied != digest:
+            logging.warning('%s changed while it was cached', path)
+        return copied
+
+    def invalidate(self, media_id : str):
+        '''
+            Forgets the cached copy of media_id
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._drop(media_id):
+                self._save()
+                logging.debug('Invalidated cached media %s', media_id)
+
+    def media_changed(self, media_id : str):
+        self.invalidate(media_id)
+
+    def close(self):
+        '''
+            Writes the recency of the latest hits to the index
+        '''
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _drop(self, media_id : str) -> bool:
+        entry = self.entries.pop(media_id, None)
+        if entry is None:
+            return False
+        self._refs[entry.digest] -= 1
+        if not self._refs[entry.digest]:
+            self._refs.pop(entry.digest)
+            self.size -= entry.size
+            try:
+                os.remove(self._blob_path(entry.digest))
+            except OSError:
+                pass
+        return True
+
+    def _evict(self):
+        while self.size > self.max_size and self.entries:
+            media_id = next(iter(self.entries))
+            logging.debug('Evicting %s from the media cache', media_id)
+            self._drop(media_id)
@@ -0,0 +1,84 @@
+'''
+    Remembers for a while the media ids the catalog reported as missing
+'''
+
+# pylint: disable=import-error, wrong-import-position
+
+from threading import Lock
+from time import monotonic
+
+import logging
+
+try:
+    from mains import ExpiryHeap
+    from updates import CatalogListener
+except ImportError:
+    from iceflix.mains import ExpiryHeap
+    from iceflix.updates import CatalogListener
+
+
+MISSING_MEDIA_TTL = 30.0
+
+class MissingMedia(CatalogListener):
+    '''
+        Media ids that raised WrongMediaId in the last ttl seconds, forgotten as soon as
+        a CatalogUpdates or FileAvailabilityAnnounce event mentions them
+    '''
+    def __init__(self, ttl : float = MISSING_MEDIA_TTL) -> None:
+        self.ttl = ttl
+        self.hits = 0
+        self._expiries = ExpiryHeap()
+        self._lock = Lock()
+
+    @staticmethod
+    def from_properties(properties) -> 'MissingMedia':
+        '''
+            Builds a negative cache using the MissingMediaTTL property (seconds),
+            disabled if it is 0
+        '''
+        return MissingMedia(
+            float(properties.getPropertyWithDefault('MissingMediaTTL', str(MISSING_MEDIA_TTL))))
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expiries.pop_expired(monotonic())
+            return len(self._expiries)
+
+    def add(self, media_id : str):
+        '''
+            Remembers that media_id does not exist
+        '''
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._expiries.touch(media_id, monotonic() + self.ttl)
+        logging.debug('Media %s is missing', media_id)
+
+    def missing(self, media_id : str) -> bool:
+        '''
+            True if media_id was reported missing less than ttl seconds ago
+        '''
+        with self._lock:
+            self._expiries.pop_expired(monotonic())
+            missing = media_id in self._expiries.deadlines
+            if missing:
+                self.hits += 1
+            return missing
+
+    def discard(self, media_id : str):
+        '''
+            Forgets that media_id was missing
+        '''
+        with self._lock:
+            self._expiries.discard(media_id)
+
+    def media_changed(self, media_id : str):
+        self.discard(media_id)
+
+    def announce_files(self, media_ids : list[str], _service_id : str = None):
+        '''
+            A file service announced that it holds media_ids
+        '''
+        with self._lock:
+            for media_id in media_ids:
+                self._expiries.discard(media_id)
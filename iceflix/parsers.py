@@ -3,6 +3,7 @@
 '''
 
 import sys
+import argparse
 import cmd2
 
 try:
@@ -11,6 +12,15 @@ except ImportError:
     from iceflix.event_listener import AvailableTopic
 
 
+def non_negative(value : str) -> int:
+    '''
+        Parses a count that can't be negative
+    '''
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f'{value} is negative')
+    return number
+
 reconnect_parser = cmd2.Cmd2ArgumentParser()
 reconnect_parser.add_argument('-p', '--proxy', type=str, default=None)
 
@@ -22,15 +32,24 @@ cat_get_sub = cat_get_base.add_subparsers(title='types', help='Search type')
 cat_name = cat_get_sub.add_parser('name')
 cat_name.add_argument('name', type=str, default=None)
 cat_name.add_argument('--exact', required='-name' in sys.argv, action='store_true')
+cat_name.add_argument('--local', action='store_true')
+cat_name.add_argument('--verify', action='store_true')
 
 cat_tags = cat_get_sub.add_parser('tags')
 cat_tags.add_argument('tags', nargs='+')
 cat_tags.add_argument('--include', action='store_true')
+cat_tags.add_argument('--local', action='store_true')
+cat_tags.add_argument('--verify', action='store_true')
 
 cat_use = cat_sub.add_parser('use')
 cat_use.add_argument('id', type=str)
 
 cat_show = cat_sub.add_parser('show')
+cat_show.add_argument('-l', '--limit', type=non_negative, default=None)
+cat_show.add_argument('-o', '--offset', type=non_negative, default=0)
+cat_show.add_argument('-s', '--sort', choices=['id', 'name'], default=None)
+cat_show.add_argument('--json', action='store_true')
+cat_show.add_argument('-p', '--page', action='store_true')
 
 selected_parser_base = cmd2.Cmd2ArgumentParser()
 selected_parser_sub = selected_parser_base.add_subparsers(title='subcommands')
@@ -45,6 +64,7 @@ remove_tags = tags_parser_sub.add_parser('remove')
 remove_tags.add_argument('tags', nargs='+')
 
 download_parser = selected_parser_sub.add_parser('download')
+download_parser.add_argument('-b', '--background', action='store_true')
 
 rename_parser = selected_parser_sub.add_parser('rename')
 rename_parser.add_argument('name', type=str)
@@ -66,7 +86,25 @@ users_remove = users_parser_sub.add_parser('remove')
 users_remove.add_argument('user', type=str)
 
 upload_parser = cmd2.Cmd2ArgumentParser()
-upload_parser.add_argument('file', type=str)
+upload_parser.add_argument('files', nargs='+')
+upload_parser.add_argument('-r', '--recursive', action='store_true')
+upload_parser.add_argument('-j', '--jobs', type=int, default=None)
+upload_parser.add_argument('-f', '--force', action='store_true')
+
+downloads_parser_base = cmd2.Cmd2ArgumentParser()
+downloads_parser_sub = downloads_parser_base.add_subparsers(title='actions')
+
+downloads_add = downloads_parser_sub.add_parser('add')
+downloads_add.add_argument('ids', nargs='+')
+
+downloads_list = downloads_parser_sub.add_parser('list')
+
+downloads_cancel = downloads_parser_sub.add_parser('cancel')
+downloads_cancel.add_argument('jobs', nargs='+', type=int)
+
+downloads_wait = downloads_parser_sub.add_parser('wait')
+
+downloads_clear = downloads_parser_sub.add_parser('clear')
 
 analyzer_parser = cmd2.Cmd2ArgumentParser()
 analyzer_parser.add_argument('-topics', nargs='+', choices=list(AvailableTopic))
@@ -0,0 +1,270 @@
+'''
+    Retry, failover and circuit breaking policy for the remote calls
+'''
+
+# pylint: disable=import-error, wrong-import-position, no-member
+
+from collections import Counter, deque
+from threading import Lock
+from time import monotonic, sleep
+
+import os
+import random
+import logging
+
+import Ice
+
+Ice.loadSlice(os.path.join(os.path.dirname(__file__), "iceflix.ice"))
+import IceFlix
+
+try:
+    from transfer import provider_key
+except ImportError:
+    from iceflix.transfer import provider_key
+
+
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.25
+RETRY_BACKOFF_MAX = 4.0
+BREAKER_FAILURES = 3
+BREAKER_RESET = 5.0
+RECENT_DECISIONS = 100
+
+COMMUNICATION_ERRORS = (
+    Ice.ConnectionRefusedException, Ice.ConnectTimeoutException, Ice.ConnectionLostException,
+    Ice.TimeoutException, Ice.ObjectNotExistException)
+# The request never reached the service, so retrying can't execute it twice
+NOT_DELIVERED = (
+    Ice.ConnectionRefusedException, Ice.ConnectTimeoutException, IceFlix.TemporaryUnavailable)
+RETRYABLE = COMMUNICATION_ERRORS + (IceFlix.TemporaryUnavailable,)
+
+class CircuitOpenError(Exception):
+    '''
+        Every known service of a kind has its circuit open
+    '''
+    def __init__(self, name : str) -> None:
+        super().__init__(f'No {name} service is reachable')
+
+class CircuitBreaker:
+    '''
+        Opens after consecutive communication failures. Once reset seconds have passed
+        it is half-open and lets a single trial call through, which closes or opens it
+        again. A trial call that never reports back is given up after reset seconds
+    '''
+    def __init__(self, failures : int = BREAKER_FAILURES, reset : float = BREAKER_RESET) -> None:
+        self.threshold = failures
+        self.reset = reset
+        self.failures = 0
+        self.opened = None
+        self.trial = None
+        self._lock = Lock()
+
+    def _state(self, now : float) -> str:
+        if self.opened is None:
+            return 'closed'
+        return 'half-open' if now - self.opened >= self.reset else 'open'
+
+    def _trying(self, now : float) -> bool:
+        return self.trial is not None and now - self.trial < self.reset
+
+    @property
+    def state(self) -> str:
+        '''
+            closed, open or half-open
+        '''
+        with self._lock:
+            return self._state(monotonic())
+
+    def available(self) -> bool:
+        '''
+            True if a call could be sent, without taking the trial call
+        '''
+        now = monotonic()
+        with self._lock:
+            state = self._state(now)
+            return state == 'closed' or (state == 'half-open' and not self._trying(now))
+
+    def allow(self) -> bool:
+        '''
+            True if a call may be sent, taking the trial call if the circuit is half-open
+        '''
+        now = monotonic()
+        with self._lock:
+            state = self._state(now)
+            if state == 'closed':
+                return True
+            if state == 'open' or self._trying(now):
+                return False
+            self.trial = now
+            return True
+
+    def success(self):
+        '''
+            Accounts a call the service answered, closing the circuit
+        '''
+        with self._lock:
+            self.failures = 0
+            self.opened = None
+            self.trial = None
+
+    def failure(self):
+        '''
+            Accounts a communication failure
+        '''
+        with self._lock:
+            self.failures += 1
+            self.trial = None
+            if self.failures >= self.threshold:
+                self.opened = monotonic()
+
+    def release(self):
+        '''
+            Ends a call that says nothing about the service being reachable
+        '''
+        with self._lock:
+            self.trial = None
+
+class RetryDecision:
+    '''
+        What the policy did after a failed call
+    '''
+    def __init__(self, name : str, attempt : int, service : str, error : Exception,
+        action : str, delay : float = 0.0) -> None:
+        self.name = name
+        self.attempt = attempt
+        self.service = service
+        self.error = error
+        self.action = action
+        self.delay = delay
+
+    def __str__(self) -> str:
+        error = type(self.error).__name__ if self.error is not None else '-'
+        return (f'{self.name} attempt {self.attempt} on {self.service}: {error} -> '
+            f'{self.action} ({self.delay:.2f} s)')
+
+class PolicyMetrics:
+    '''
+        Counters of every retry decision and the most recent ones
+    '''
+    def __init__(self) -> None:
+        self.counts = Counter()
+        self.recent = deque(maxlen=RECENT_DECISIONS)
+        self._lock = Lock()
+
+    def record(self, decision : RetryDecision):
+        '''
+            Accounts a decision
+        '''
+        with self._lock:
+            self.counts[decision.action] += 1
+            self.recent.append(decision)
+        logging.debug('Retry policy: %s', decision)
+
+class CallPolicy:
+    '''
+        Calls a service retrying the failures on other candidates, with exponential
+        backoff and full jitter when no other candidate is left
+    '''
+    def __init__(self, attempts : int = RETRY_ATTEMPTS, backoff : float = RETRY_BACKOFF,
+        backoff_max : float = RETRY_BACKOFF_MAX, failures : int = BREAKER_FAILURES,
+        reset : float = BREAKER_RESET) -> None:
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.failures = failures
+        self.reset = reset
+        self.breakers = {}
+        self.metrics = PolicyMetrics()
+        self._lock = Lock()
+
+    @staticmethod
+    def from_properties(properties) -> 'CallPolicy':
+        '''
+            Builds a policy using the RetryAttempts, RetryBackoff, RetryBackoffMax,
+            BreakerFailures and BreakerReset properties (times in seconds)
+        '''
+        return CallPolicy(
+            properties.getPropertyAsIntWithDefault('RetryAttempts', RETRY_ATTEMPTS),
+            float(properties.getPropertyWithDefault('RetryBackoff', str(RETRY_BACKOFF))),
+            float(properties.getPropertyWithDefault('RetryBackoffMax', str(RETRY_BACKOFF_MAX))),
+            properties.getPropertyAsIntWithDefault('BreakerFailures', BREAKER_FAILURES),
+            float(properties.getPropertyWithDefault('BreakerReset', str(BREAKER_RESET))))
+
+    def breaker(self, proxy) -> CircuitBreaker:
+        '''
+            Circuit breaker of the service behind proxy
+        '''
+        key = provider_key(proxy)
+        with self._lock:
+            if key not in self.breakers:
+                self.breakers[key] = CircuitBreaker(self.failures, self.reset)
+            return self.breakers[key]
+
+    def delay(self, attempt : int) -> float:
+        '''
+            Seconds to wait before retrying the same service after attempt failures
+        '''
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1)))
+
+    def _choose(self, proxies : list, tried : set, take : bool = True):
+        available = [proxy for proxy in proxies
+            if proxy is not None and self.breaker(proxy).available()]
+        available.sort(key=lambda proxy: provider_key(proxy) in tried)
+        for proxy in available:
+            if not take or self.breaker(proxy).allow():
+                return proxy
+        return None
+
+    def call(self, name : str, candidates, invoke, idempotent : bool = True,
+        attempts : int = None, on_retry = None, on_failure = None):
+        '''
+            Returns invoke(proxy) for the first candidates() proxy that answers.
+            Non idempotent calls are only retried if the request was never delivered
+        '''
+        attempts = max(1, attempts if attempts is not None else self.attempts)
+        tried = set()
+        error = None
+        for attempt in range(1, attempts + 1):
+            proxy = self._choose(candidates(), tried)
+            if proxy is None:
+                self.metrics.record(RetryDecision(name, attempt, '-', error, 'circuit-open'))
+                if error is not None:
+                    raise error
+                raise CircuitOpenError(name)
+            try:
+                result = invoke(proxy)
+            except RETRYABLE as failure:
+                error = failure
+                self._failed(proxy, failure, on_failure)
+            except Ice.UserException:
+                self.breaker(proxy).success()
+                raise
+            except BaseException:
+                self.breaker(proxy).release()
+                raise
+            else:
+                self.breaker(proxy).success()
+                return result
+            key = provider_key(proxy)
+            tried.add(key)
+            if attempt == attempts or (not idempotent and not isinstance(error, NOT_DELIVERED)):
+                self.metrics.record(RetryDecision(name, attempt, key, error, 'give-up'))
+                raise error
+            failover = self._choose(candidates(), tried, take=False)
+            if failover is not None and provider_key(failover) not in tried:
+                self.metrics.record(RetryDecision(name, attempt, key, error, 'failover'))
+                continue
+            delay = self.delay(attempt)
+            self.metrics.record(RetryDecision(name, attempt, key, error, 'retry', delay))
+            if on_retry is not None:
+                on_retry(attempt, delay, error)
+            sleep(delay)
+        raise error
+
+    def _failed(self, proxy, error : Exception, on_failure):
+        if not isinstance(error, COMMUNICATION_ERRORS):
+            self.breaker(proxy).release()
+            return
+        self.breaker(proxy).failure()
+        if on_failure is not None:
+            on_failure(proxy)
@@ -0,0 +1,88 @@
+'''
+    Keeps track of which file services hold each media
+'''
+
+# pylint: disable=import-error, wrong-import-position, no-member, invalid-name
+
+import os
+import logging
+
+from threading import Lock
+
+import Ice
+
+Ice.loadSlice(os.path.join(os.path.dirname(__file__), "iceflix.ice"))
+import IceFlix
+
+
+class ProviderRegistry:
+    '''
+        Maps every media id to the file services that announced it
+    '''
+    def __init__(self) -> None:
+        self.services = {}
+        self.media = {}
+        self._lock = Lock()
+
+    def add_service(self, service_id : str, proxy):
+        '''
+            Saves the proxy of an announced file service
+        '''
+        with self._lock:
+            self.services[service_id] = proxy
+        logging.debug('File service %s at %s', service_id, proxy)
+
+    def announce_files(self, media_ids : list[str], service_id : str):
+        '''
+            Records that service_id holds every media in media_ids
+        '''
+        with self._lock:
+            for media_id in media_ids:
+                self.media.setdefault(media_id, set()).add(service_id)
+        logging.debug('%s holds %d media', service_id, len(media_ids))
+
+    def forget_media(self, media_id : str):
+        '''
+            Removes every provider of media_id
+        '''
+        with self._lock:
+            self.media.pop(media_id, None)
+
+    def forget_service(self, service_id : str):
+        '''
+            Removes a file service and every media it announced
+        '''
+        with self._lock:
+            self.services.pop(service_id, None)
+            for holders in self.media.values():
+                holders.discard(service_id)
+
+    def candidates(self, media_id : str) -> list:
+        '''
+            Proxies of the known file services holding media_id
+        '''
+        with self._lock:
+            holders = self.media.get(media_id, ())
+            return [self.services[service_id] for service_id in holders
+                if service_id in self.services]
+
+class FileAvailabilityServant(IceFlix.FileAvailabilityAnnounce):
+    '''
+        Receives the FileAvailabilityAnnounce events and feeds the registry
+        and every listener with an announce_files method
+    '''
+    def __init__(self, registry : ProviderRegistry) -> None:
+        super().__init__()
+        self.registry = registry
+        self.listeners = []
+
+    def announceFiles(self, mediaIds : list[str], serviceId : str, _=None):
+        '''
+            announceFiles callback for IceFlix.FileAvailabilityAnnounce
+        '''
+        self.registry.announce_files(mediaIds, serviceId)
+        for listener in self.listeners:
+            try:
+                listener.announce_files(mediaIds, serviceId)
+            except Exception as exception: # pylint: disable=broad-exception-caught
+                logging.warning('Error handling announceFiles: %s', exception)
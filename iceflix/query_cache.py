@@ -0,0 +1,147 @@
+'''
+    Memoized catalog searches, invalidated by the CatalogUpdates events
+'''
+
+# pylint: disable=import-error, wrong-import-position
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+from time import monotonic
+
+import logging
+
+try:
+    from updates import CatalogListener
+except ImportError:
+    from iceflix.updates import CatalogListener
+
+
+QUERY_CACHE_TTL = 30.0
+
+def name_query(name : str, exact : bool) -> tuple:
+    '''
+        Key of a search by name, the name is kept as given since the catalog
+        decides how it is matched
+    '''
+    return ('name', name, exact)
+
+def tags_query(user : str, tags : list[str], include_all : bool) -> tuple:
+    '''
+        Key of a search by the tags of user
+    '''
+    return ('tags', user, tuple(sorted(set(tags))), include_all)
+
+class QueryCache(CatalogListener):
+    '''
+        Results of the latest searches for ttl seconds, evicting the least recently used
+        above size entries. Identical searches made while one is in flight wait for its
+        result instead of asking the catalog again
+    '''
+    def __init__(self, size : int = 0, ttl : float = QUERY_CACHE_TTL) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._lock = Lock()
+
+    @staticmethod
+    def from_properties(properties) -> 'QueryCache':
+        '''
+            Builds a cache using the QueryCacheSize and QueryCacheTTL (seconds) properties,
+            disabled if the size is 0
+        '''
+        return QueryCache(
+            properties.getPropertyAsIntWithDefault('QueryCacheSize', 0),
+            float(properties.getPropertyWithDefault('QueryCacheTTL', str(QUERY_CACHE_TTL))))
+
+    @property
+    def enabled(self) -> bool:
+        '''
+            True if the cache can store anything
+        '''
+        return self.size > 0
+
+    def get(self, query : tuple, search) -> list[str]:
+        '''
+            Cached result of query, calling search() if it is not cached
+        '''
+        if not self.enabled:
+            return search()
+        with self._lock:
+            entry = self.entries.get(query)
+            if entry is not None and monotonic() < entry[0]:
+                self.entries.move_to_end(query)
+                self.hits += 1
+                return list(entry[1])
+            future = self.in_flight.get(query)
+            leader = future is None
+            if leader:
+                self.misses += 1
+                future = self.in_flight[query] = Future()
+            generation = self._generation
+        if not leader:
+            return list(future.result())
+        try:
+            result = search()
+        except BaseException as error:
+            with self._lock:
+                self.in_flight.pop(query, None)
+            future.set_exception(error)
+            raise
+        with self._lock:
+            self.in_flight.pop(query, None)
+            if generation == self._generation:
+                self.entries[query] = (monotonic() + self.ttl, tuple(result))
+                self.entries.move_to_end(query)
+                while len(self.entries) > self.size:
+                    self.entries.popitem(last=False)
+        future.set_result(result)
+        return list(result)
+
+    def _invalidate(self, depends):
+        with self._lock:
+            self._generation += 1
+            for query in [query for query, (_, result) in self.entries.items()
+                if depends(query, result)]:
+                logging.debug('Query %s invalidated', query)
+                del self.entries[query]
+
+    def forget_media(self, media_id : str):
+        '''
+            Forgets the results including a removed media
+        '''
+        self._invalidate(lambda _, result: media_id in result)
+
+    def clear(self):
+        '''
+            Forgets every result
+        '''
+        with self._lock:
+            self._generation += 1
+            self.entries = OrderedDict()
+
+    def renameTile(self, media_id : str, name : str):
+        def depends(query, result):
+            if query[0] != 'name':
+                return False
+            _, text, exact = query
+            return media_id in result or \
+                (text == name if exact else text.lower() in name.lower())
+        self._invalidate(depends)
+
+    def _tags_changed(self, media_id : str, user : str, tags : list[str]):
+        tags = set(tags)
+        def depends(query, result):
+            return query[0] == 'tags' and query[1] == user \
+                and (media_id in result or not tags.isdisjoint(query[2]))
+        self._invalidate(depends)
+
+    def addTags(self, media_id : str, user : str, tags : list[str]):
+        self._tags_changed(media_id, user, tags)
+
+    def removeTags(self, media_id : str, user : str, tags : list[str]):
+        self._tags_changed(media_id, user, tags)
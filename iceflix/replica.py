@@ -0,0 +1,187 @@
+'''
+    Local replica of the catalog names and tags, kept up to date by the CatalogUpdates events
+'''
+
+# pylint: disable=import-error, wrong-import-position, invalid-name
+
+from threading import Lock
+from time import monotonic
+
+import logging
+
+
+REPLAY_SETTLE = 1.0
+
+class CatalogReplica:
+    '''
+        Names and per user tags of the media seen in the catalog deltas. The
+        CatalogUpdatesServant asks it which events are news, so the deltas already
+        known, and the ones replayed for this client, are not forwarded to the caches.
+        The history is replayed with getAllDeltas once per subscription to the topics.
+        Tag searches are answered locally while subscribed, once the replayed deltas
+        stopped arriving for settle seconds, and for staleness seconds after the replay
+        or the last remote tag search. The deltas only carry renamed media, so name
+        searches are never answered locally.
+        The titles already found are updated too, so they never need to be fetched
+        again after a change
+    '''
+    def __init__(self, titles = None, staleness : float = 0,
+        settle : float = REPLAY_SETTLE) -> None:
+        self.titles = titles if titles is not None else {}
+        self.staleness = staleness
+        self.settle = settle
+        self.names = {}
+        self.tags = {}
+        self.subscribed = False
+        self.requested = False
+        self.answered = None
+        self.synced = None
+        self.last_event = None
+        self._lock = Lock()
+
+    @staticmethod
+    def from_properties(properties, titles = None) -> 'CatalogReplica':
+        '''
+            Builds a replica answering searches for CatalogReplicaStaleness seconds after
+            the replay or a remote search, never answering them if it is 0
+        '''
+        return CatalogReplica(titles,
+            float(properties.getPropertyWithDefault('CatalogReplicaStaleness', '0')))
+
+    @property
+    def enabled(self) -> bool:
+        '''
+            True if the replica may answer searches
+        '''
+        return self.staleness > 0
+
+    @property
+    def applied(self) -> bool:
+        '''
+            True if the replay was answered and its deltas stopped arriving
+        '''
+        if self.answered is None:
+            return False
+        return monotonic() - max(self.answered, self.last_event or 0) >= self.settle
+
+    @property
+    def needs_replay(self) -> bool:
+        '''
+            True if the history has not been asked for since subscribing
+        '''
+        return self.enabled and self.subscribed and not self.requested
+
+    @property
+    def fresh(self) -> bool:
+        '''
+            True if the replica can answer the tag searches
+        '''
+        return self.enabled and self.subscribed and self.applied \
+            and monotonic() - self.synced < self.staleness
+
+    def subscribe(self):
+        '''
+            The client subscribed to the CatalogUpdates topic, the history has to be replayed
+        '''
+        self.subscribed = True
+        self.requested = False
+        self.answered = None
+
+    def unsubscribe(self):
+        '''
+            The client no longer receives the CatalogUpdates events
+        '''
+        self.subscribed = False
+        self.requested = False
+        self.answered = None
+
+    def sync(self, catalog):
+        '''
+            Asks catalog to replay its history, the replayed deltas are applied as
+            they arrive through the topic
+        '''
+        logging.debug('Replaying the deltas of %s', catalog)
+        self.requested = True
+        if not hasattr(catalog, 'getAllDeltasAsync'):
+            try:
+                catalog.getAllDeltas()
+            except Exception:
+                self.requested = False
+                raise
+            self.answered = self.synced = monotonic()
+            return
+        catalog.getAllDeltasAsync().add_done_callback(self._synced)
+
+    def _synced(self, future):
+        error = future.exception()
+        if error is not None:
+            logging.warning('Could not replay the catalog deltas: %s', error)
+            self.requested = False
+            return
+        self.answered = self.synced = monotonic()
+
+    def confirm(self):
+        '''
+            A remote tag search was answered, the replica is trusted staleness seconds more
+        '''
+        if self.applied:
+            self.synced = monotonic()
+
+    def by_tags(self, user : str, tags : list[str], include_all : bool) -> list[str]:
+        '''
+            Ids of the media tagged by user with all the tags, or any of them if not include_all
+        '''
+        tags = set(tags)
+        with self._lock:
+            tagged = self.tags.get(user, {})
+            if include_all:
+                return [media_id for media_id, media_tags in tagged.items() if tags <= media_tags]
+            return [media_id for media_id, media_tags in tagged.items() if tags & media_tags]
+
+    def apply(self, operation : str, *args) -> bool:
+        '''
+            Applies a CatalogUpdates event, True if it is news to be forwarded to the
+            listeners: it changed something and it is not part of the replay
+        '''
+        replaying = self.requested and not self.applied
+        with self._lock:
+            self.last_event = monotonic()
+            changed = getattr(self, f'_{operation}')(*args)
+        self._update_titles(operation, *args)
+        return changed and not replaying
+
+    def _renameTile(self, media_id : str, name : str) -> bool:
+        changed = self.names.get(media_id) != name
+        self.names[media_id] = name
+        return changed
+
+    def _addTags(self, media_id : str, user : str, tags : list[str]) -> bool:
+        known = self.tags.setdefault(user, {}).get(media_id)
+        changed = known is None or not known.issuperset(tags)
+        self.tags[user].setdefault(media_id, set()).update(tags)
+        return changed
+
+    def _removeTags(self, media_id : str, user : str, tags : list[str]) -> bool:
+        known = self.tags.setdefault(user, {}).get(media_id)
+        changed = known is None or not known.isdisjoint(tags)
+        self.tags[user].setdefault(media_id, set()).difference_update(tags)
+        return changed
+
+    def _update_titles(self, operation : str, media_id : str, *args):
+        title = self.titles.get(media_id)
+        if title is None:
+            return
+        name, tags = title.name, title.tags
+        if operation == 'renameTile':
+            title.name = args[0]
+        else:
+            user, changed = args
+            if user != getattr(self.titles, 'owner', user):
+                return
+            known = list(tags) if tags is not None else []
+            if operation == 'addTags':
+                title.tags = known + [tag for tag in changed if tag not in known]
+            else:
+                title.tags = [tag for tag in known if tag not in changed]
+        if (title.name, title.tags) != (name, tags):
+            self.titles[media_id] = title
@@ -0,0 +1,84 @@
+'''
+    Single object adapter hosting every servant of the client
+'''
+
+# pylint: disable=import-error, wrong-import-position, no-member
+
+from threading import Lock
+
+import logging
+
+import Ice
+
+
+ADAPTER_NAME = 'IceFlixClient'
+ADAPTER_ENDPOINTS = 'tcp'
+SERVANT_THREADS = 8
+
+class ServantHost:
+    '''
+        Owns the object adapter of the client, servants are added and removed by identity
+    '''
+    def __init__(self, communicator, name : str = ADAPTER_NAME) -> None:
+        self.communicator = communicator
+        self.name = name
+        self._adapter = None
+        self._lock = Lock()
+
+    @property
+    def adapter(self):
+        '''
+            The adapter, created and activated the first time it is needed
+        '''
+        with self._lock:
+            if self._adapter is None:
+                self._adapter = self._create()
+            return self._adapter
+
+    def _create(self):
+        properties = self.communicator.getProperties()
+        if not properties.getProperty(f'{self.name}.ThreadPool.Size'):
+            properties.setProperty(f'{self.name}.ThreadPool.Size', '1')
+        if not properties.getProperty(f'{self.name}.ThreadPool.SizeMax'):
+            properties.setProperty(f'{self.name}.ThreadPool.SizeMax', str(SERVANT_THREADS))
+        endpoints = properties.getPropertyWithDefault(f'{self.name}.Endpoints', ADAPTER_ENDPOINTS)
+        adapter = self.communicator.createObjectAdapterWithEndpoints(self.name, endpoints)
+        adapter.activate()
+        logging.debug('Object adapter %s listening at %s', self.name, endpoints)
+        return adapter
+
+    @property
+    def threads(self) -> int:
+        '''
+            Maximum number of requests dispatched at once
+        '''
+        return self.communicator.getProperties().getPropertyAsIntWithDefault(
+            f'{self.name}.ThreadPool.SizeMax', SERVANT_THREADS)
+
+    def add(self, servant, identity : Ice.Identity = None):
+        '''
+            Adds servant with identity, or with an UUID if no identity is given,
+            returning its proxy
+        '''
+        if identity is None:
+            identity = Ice.stringToIdentity(Ice.generateUUID())
+        proxy = self.adapter.add(servant, identity)
+        logging.debug('Servant %s added', Ice.identityToString(identity))
+        return proxy
+
+    def remove(self, proxy_or_identity):
+        '''
+            Removes the servant of a proxy or identity, returns the removed servant
+        '''
+        identity = proxy_or_identity
+        if not isinstance(identity, Ice.Identity):
+            identity = proxy_or_identity.ice_getIdentity()
+        with self._lock:
+            if self._adapter is None:
+                return None
+        try:
+            servant = self._adapter.remove(identity)
+        except Ice.NotRegisteredException:
+            return None
+        logging.debug('Servant %s removed', Ice.identityToString(identity))
+        return servant
@@ -0,0 +1,95 @@
+'''
+    Remembers the type of every announced service so it is resolved only once
+'''
+
+# pylint: disable=import-error, wrong-import-position, no-member
+
+from collections import OrderedDict
+from threading import Lock
+
+import os
+import logging
+
+import Ice
+
+Ice.loadSlice(os.path.join(os.path.dirname(__file__), "iceflix.ice"))
+import IceFlix
+
+
+SERVICE_PROXIES = {
+    IceFlix.MainPrx.ice_staticId(): IceFlix.MainPrx,
+    IceFlix.AuthenticatorPrx.ice_staticId(): IceFlix.AuthenticatorPrx,
+    IceFlix.MediaCatalogPrx.ice_staticId(): IceFlix.MediaCatalogPrx,
+    IceFlix.FileServicePrx.ice_staticId(): IceFlix.FileServicePrx,
+}
+
+MAX_SERVICES = 256
+
+class ResolvedService:
+    '''
+        Type and typed proxy of an announced service
+    '''
+    def __init__(self, service, identity, type_id : str) -> None:
+        self.key = str(service)
+        self.identity = identity
+        self.type_id = type_id
+        proxy_class = SERVICE_PROXIES.get(type_id)
+        if proxy_class is None or isinstance(service, Ice.Object):
+            self.proxy = service
+        else:
+            self.proxy = proxy_class.uncheckedCast(service)
+
+class ServiceTypeCache:
+    '''
+        Maps every service id to the resolved type of its last proxy, valid until
+        the proxy changes or the service is invalidated. A service announced under
+        a new proxy replaces its entry, and only the max_services most recently
+        resolved services are kept
+    '''
+    def __init__(self, max_services : int = MAX_SERVICES) -> None:
+        self.max_services = max_services
+        self.services = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def _identity(service):
+        if isinstance(service, Ice.Object):
+            return id(service)
+        return Ice.identityToString(service.ice_getIdentity())
+
+    @staticmethod
+    def _type_id(service) -> str:
+        type_id = service.ice_id()
+        if type_id in SERVICE_PROXIES:
+            return type_id
+        for known in SERVICE_PROXIES:
+            if service.ice_isA(known):
+                return known
+        return type_id
+
+    def resolve(self, service, service_id : str) -> ResolvedService:
+        '''
+            Resolved type of service, asks the service only if it is not cached
+        '''
+        identity = self._identity(service)
+        with self._lock:
+            resolved = self.services.get(service_id)
+            if resolved is not None and resolved.identity == identity \
+                and resolved.key == str(service):
+                self.services.move_to_end(service_id)
+                return resolved
+        resolved = ResolvedService(service, identity, self._type_id(service))
+        logging.debug('Service %s is a %s', service_id, resolved.type_id)
+        with self._lock:
+            self.services[service_id] = resolved
+            self.services.move_to_end(service_id)
+            while len(self.services) > self.max_services:
+                self.services.popitem(last=False)
+        return resolved
+
+    def invalidate(self, service_id : str):
+        '''
+            Forgets every type resolved for service_id
+        '''
+        with self._lock:
+            self.services.pop(service_id, None)
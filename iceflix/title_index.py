@@ -0,0 +1,115 @@
+'''
+    In memory indexes of the known titles, answering name and tag searches without the catalog
+'''
+
+# pylint: disable=import-error, wrong-import-position
+
+from threading import Lock
+
+
+GRAM_SIZE = 3
+
+def grams(text : str) -> set[str]:
+    '''
+        Every GRAM_SIZE characters long substring of text
+    '''
+    return {text[start:start + GRAM_SIZE] for start in range(len(text) - GRAM_SIZE + 1)}
+
+class TitleIndex:
+    '''
+        Inverted indexes from every tag and name trigram to the ids of the titles
+        having them. A name search intersects the ids of the trigrams of the
+        searched text and checks the few candidates left.
+        The tags can be any hashable key, such as the numbers of a TagTable. The
+        names and tags given are referenced, not copied, to unlink them on removal
+    '''
+    def __init__(self) -> None:
+        self.names = {}
+        self.tags = {}
+        self.by_gram = {}
+        self.by_tag = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @staticmethod
+    def _link(index : dict, key : str, media_id : str):
+        index.setdefault(key, set()).add(media_id)
+
+    @staticmethod
+    def _unlink(index : dict, key : str, media_id : str):
+        ids = index.get(key)
+        if ids is None:
+            return
+        ids.discard(media_id)
+        if not ids:
+            del index[key]
+
+    def add(self, media_id : str, name : str = None, tags = None):
+        '''
+            Indexes a title, replacing what was indexed for media_id
+        '''
+        with self._lock:
+            self._remove(media_id)
+            if name is not None:
+                self.names[media_id] = name
+                for gram in grams(name.lower()):
+                    self._link(self.by_gram, gram, media_id)
+            if tags:
+                self.tags[media_id] = tags
+                for tag in tags:
+                    self._link(self.by_tag, tag, media_id)
+
+    def remove(self, media_id : str):
+        '''
+            Forgets a title
+        '''
+        with self._lock:
+            self._remove(media_id)
+
+    def _remove(self, media_id : str):
+        name = self.names.pop(media_id, None)
+        if name is not None:
+            for gram in grams(name.lower()):
+                self._unlink(self.by_gram, gram, media_id)
+        for tag in self.tags.pop(media_id, ()):
+            self._unlink(self.by_tag, tag, media_id)
+
+    def clear(self):
+        '''
+            Forgets every title
+        '''
+        with self._lock:
+            self.names = {}
+            self.tags = {}
+            self.by_gram = {}
+            self.by_tag = {}
+
+    def by_name(self, name : str, exact : bool) -> list[str]:
+        '''
+            Ids of the titles named name, or containing it if not exact
+        '''
+        lower = name.lower()
+        with self._lock:
+            if len(lower) < GRAM_SIZE:
+                candidates = self.names
+            else:
+                postings = sorted((self.by_gram.get(gram, set()) for gram in grams(lower)), key=len)
+                candidates = set.intersection(*postings)
+            if exact:
+                return sorted(media_id for media_id in candidates if self.names[media_id] == name)
+            return sorted(media_id for media_id in candidates
+                if lower in self.names[media_id].lower())
+
+    def by_tags(self, tags : list, include_all : bool) -> list[str]:
+        '''
+            Ids of the titles having every tag, or any of them if not include_all
+        '''
+        with self._lock:
+            postings = [self.by_tag.get(tag, set()) for tag in set(tags)]
+            if not postings:
+                return []
+            if include_all:
+                return sorted(set.intersection(*sorted(postings, key=len)))
+            return sorted(set.union(*postings))
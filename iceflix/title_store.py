@@ -0,0 +1,364 @@
+'''
+    Persistent store of the titles found on the catalog, so they survive restarts
+'''
+
+# pylint: disable=import-error, wrong-import-position
+
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from itertools import islice
+from threading import Lock
+from time import time
+
+import os
+import sys
+import json
+import sqlite3
+import logging
+
+try:
+    from mains import ExpiryHeap
+    from title_index import TitleIndex
+except ImportError:
+    from iceflix.mains import ExpiryHeap
+    from iceflix.title_index import TitleIndex
+
+TITLE_STORE_TTL = 24 * 60 * 60
+TITLE_STORE_BUDGET = 128 * 1024 * 1024
+# Dict slots, LRU links, expiry and index postings of a title, plus the postings of every character
+ENTRY_OVERHEAD = 416
+NAME_CHAR_OVERHEAD = 32
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS titles (
+        id TEXT PRIMARY KEY,
+        name TEXT,
+        tags TEXT,
+        provider TEXT,
+        fetched REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+'''
+
+class TagTable:
+    '''
+        Numbers every tag once, so a title keeps its tags as an array of small integers
+    '''
+    def __init__(self) -> None:
+        self.ids = {}
+        self.tags = []
+
+    def encode(self, tags : list[str]) -> array:
+        '''
+            Numbers of tags, in the same order and without repetitions
+        '''
+        if tags is None:
+            return None
+        numbers = array('I')
+        for tag in dict.fromkeys(tags):
+            number = self.ids.get(tag)
+            if number is None:
+                tag = sys.intern(tag)
+                number = self.ids[tag] = len(self.tags)
+                self.tags.append(tag)
+            numbers.append(number)
+        return numbers
+
+    def find(self, tags : list[str]) -> list[int]:
+        '''
+            Numbers of tags, None for the ones never numbered
+        '''
+        return [self.ids.get(tag) for tag in tags]
+
+    def decode(self, numbers : array) -> list[str]:
+        '''
+            Tags numbered as numbers
+        '''
+        if numbers is None:
+            return None
+        return [self.tags[number] for number in numbers]
+
+class TitleRecord:
+    '''
+        A stored title
+    '''
+    __slots__ = ('name', 'tags', 'provider', 'fetched')
+
+    def __init__(self, name : str, tags : array, provider : str, fetched : float) -> None:
+        self.name = name
+        self.tags = tags
+        self.provider = sys.intern(provider) if provider is not None else None
+        self.fetched = fetched
+
+    def footprint(self, media_id : str) -> int:
+        '''
+            Estimated bytes taken by this title and its index entries
+        '''
+        size = ENTRY_OVERHEAD + sys.getsizeof(self) + sys.getsizeof(media_id)
+        if self.name is not None:
+            size += sys.getsizeof(self.name) + NAME_CHAR_OVERHEAD * len(self.name)
+        if self.tags is not None:
+            size += sys.getsizeof(self.tags)
+        return size
+
+class TitleStore(MutableMapping):
+    '''
+        Titles keyed by media id, stored in a SQLite database at path and loaded on
+        first use. Titles older than ttl seconds are stale and dropped when looked up.
+        Without a path the titles are only kept in memory.
+        At most budget bytes of titles are kept in memory, evicting the least recently
+        used ones. An evicted title is still found by its id if it is stored on disk,
+        but it is not listed nor searched locally until it is used again.
+        The deadlines of the titles in memory are kept in an ExpiryHeap, so listing
+        and searching only drop the titles that went stale since the last time.
+        The tags are per user, so the titles found by another user are dropped on login.
+        Every title in memory is kept in a TitleIndex, keyed by the tag numbers,
+        to be searched locally
+    '''
+    def __init__(self, record, path : str = None, ttl : float = TITLE_STORE_TTL,
+        budget : int = TITLE_STORE_BUDGET) -> None:
+        self.record = record
+        self.path = path
+        self.ttl = ttl
+        self.budget = budget
+        self.titles = OrderedDict()
+        self.size = 0
+        self.tags = TagTable()
+        self.owner = None
+        self.index = TitleIndex()
+        self._expiries = ExpiryHeap()
+        self._loaded = path is None
+        self._db = None
+        self._lock = Lock()
+
+    @staticmethod
+    def from_properties(properties, record) -> 'TitleStore':
+        '''
+            Builds the store at TitleStore with a TitleStoreTTL (seconds) staleness and
+            a TitleStoreBudget (bytes) memory budget, only in memory if the path is empty
+        '''
+        path = properties.getProperty('TitleStore')
+        return TitleStore(record, os.path.expanduser(path) if path else None,
+            float(properties.getPropertyWithDefault('TitleStoreTTL', str(TITLE_STORE_TTL))),
+            properties.getPropertyAsIntWithDefault('TitleStoreBudget', TITLE_STORE_BUDGET))
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        '''
+            Connection to the database, opened and purged of stale titles on first use
+        '''
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            with self._db:
+                self._db.executescript(SCHEMA)
+                self._db.execute('DELETE FROM titles WHERE fetched < ?', (time() - self.ttl,))
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'owner'").fetchone()
+            self.owner = row[0] if row is not None else None
+        return self._db
+
+    def _stale(self, fetched : float) -> bool:
+        return fetched < time() - self.ttl
+
+    def _title(self, media_id : str, record : TitleRecord):
+        return self.record(media_id, name=record.name, tags=self.tags.decode(record.tags),
+            provider=record.provider)
+
+    def _put(self, media_id : str, record : TitleRecord):
+        old = self.titles.pop(media_id, None)
+        if old is not None:
+            self.size -= old.footprint(media_id)
+        self.titles[media_id] = record
+        self.size += record.footprint(media_id)
+        self.index.add(media_id, record.name, record.tags)
+        self._expiries.touch(media_id, record.fetched + self.ttl)
+        while self.size > self.budget and len(self.titles) > 1:
+            evicted, evicted_record = self.titles.popitem(last=False)
+            self.size -= evicted_record.footprint(evicted)
+            self.index.remove(evicted)
+            self._expiries.discard(evicted)
+
+    def _build(self, row : tuple) -> TitleRecord:
+        media_id, name, tags, provider, fetched = row
+        tags = self.tags.encode(json.loads(tags) if tags is not None else None)
+        record = TitleRecord(name, tags, provider, fetched)
+        self._put(media_id, record)
+        return record
+
+    def _lookup(self, media_id : str) -> TitleRecord:
+        record = self.titles.get(media_id)
+        if record is not None:
+            self.titles.move_to_end(media_id)
+        elif self.path is not None:
+            row = self.db.execute(
+                'SELECT id, name, tags, provider, fetched FROM titles WHERE id = ?',
+                (media_id,)).fetchone()
+            record = self._build(row) if row is not None else None
+        if record is not None and self._stale(record.fetched):
+            logging.debug('Title %s is stale', media_id)
+            self._forget(media_id)
+            return None
+        return record
+
+    def _load(self):
+        if self._loaded:
+            return
+        rows = self.db.execute('SELECT id, name, tags, provider, fetched FROM titles '
+            'WHERE fetched >= ? ORDER BY fetched', (time() - self.ttl,)).fetchall()
+        for row in rows:
+            if row[0] not in self.titles:
+                self._build(row)
+        self._loaded = True
+        logging.debug('Loaded %d titles from %s', len(rows), self.path)
+
+    def _forget(self, media_id : str):
+        record = self.titles.pop(media_id, None)
+        if record is not None:
+            self.size -= record.footprint(media_id)
+        self.index.remove(media_id)
+        self._expiries.discard(media_id)
+        if self.path is not None:
+            with self.db:
+                self.db.execute('DELETE FROM titles WHERE id = ?', (media_id,))
+
+    def _evict(self):
+        self._load()
+        for media_id in self._expiries.pop_expired(time()):
+            self._forget(media_id)
+
+    def __getitem__(self, media_id : str):
+        with self._lock:
+            record = self._lookup(media_id)
+            if record is None:
+                raise KeyError(media_id)
+            return self._title(media_id, record)
+
+    def __contains__(self, media_id) -> bool:
+        with self._lock:
+            return self._lookup(media_id) is not None
+
+    def __setitem__(self, media_id : str, title):
+        self.update({media_id: title})
+
+    def __delitem__(self, media_id : str):
+        with self._lock:
+            if self._lookup(media_id) is None:
+                raise KeyError(media_id)
+            self._forget(media_id)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict()
+            return len(self.titles)
+
+    def keys(self) -> list:
+        with self._lock:
+            self._evict()
+            return list(self.titles)
+
+    def values(self) -> list:
+        return [title for _, title in self.items()]
+
+    def items(self) -> list:
+        with self._lock:
+            self._evict()
+            return [(media_id, self._title(media_id, record))
+                for media_id, record in self.titles.items()]
+
+    def iter_titles(self, offset : int = 0, limit : int = None, sort : str = None):
+        '''
+            Yields the titles in memory from offset and up to limit of them, sorted by
+            'id' or 'name'. Only the ids are copied under the lock, every title is built
+            when it is consumed
+        '''
+        with self._lock:
+            self._evict()
+            if sort == 'name':
+                ids = [media_id for media_id, _ in sorted(self.titles.items(),
+                    key=lambda item: (item[1].name is None, item[1].name or ''))]
+            elif sort == 'id':
+                ids = sorted(self.titles)
+            else:
+                ids = list(self.titles)
+        for media_id in islice(ids, offset, None if limit is None else offset + limit):
+            with self._lock:
+                record = self.titles.get(media_id)
+                title = self._title(media_id, record) if record is not None else None
+            if title is not None:
+                yield title
+
+    def search_name(self, name : str, exact : bool) -> list[str]:
+        '''
+            Ids of the stored titles named name, or containing it if not exact
+        '''
+        with self._lock:
+            self._evict()
+        return self.index.by_name(name, exact)
+
+    def search_tags(self, tags : list[str], include_all : bool) -> list[str]:
+        '''
+            Ids of the stored titles having every tag, or any of them if not include_all
+        '''
+        with self._lock:
+            self._evict()
+            numbers = self.tags.find(tags)
+        if include_all and None in numbers:
+            return []
+        return self.index.by_tags([number for number in numbers if number is not None],
+            include_all)
+
+    def update(self, titles = (), /, **kwargs): # pylint: disable=arguments-differ
+        '''
+            Adds or refreshes titles in a single transaction
+        '''
+        titles = dict(titles, **kwargs)
+        now = time()
+        with self._lock:
+            for media_id, title in titles.items():
+                self._put(media_id, TitleRecord(title.name, self.tags.encode(title.tags),
+                    getattr(title, 'provider', None), now))
+            if self.path is None:
+                return
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO titles VALUES (?, ?, ?, ?, ?)', [
+                    (media_id, title.name, json.dumps(list(title.tags))
+                        if title.tags is not None else None,
+                        getattr(title, 'provider', None), now)
+                    for media_id, title in titles.items()])
+
+    def claim(self, user : str):
+        '''
+            Drops every title if they were found by a different user than user
+        '''
+        with self._lock:
+            db = self.db if self.path is not None else None
+            if self.owner == user:
+                return
+            logging.debug('Dropping the titles found by %s', self.owner)
+            self.owner = user
+            self.titles = OrderedDict()
+            self.size = 0
+            self.index.clear()
+            self._expiries.clear()
+            self._loaded = True
+            if db is None:
+                return
+            with db:
+                db.execute('DELETE FROM titles')
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('owner', ?)", (user,))
+
+    def close(self):
+        '''
+            Closes the database
+        '''
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
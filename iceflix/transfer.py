@@ -0,0 +1,678 @@
+'''
+    Download engine used to pull media from a file service
+'''
+
+# pylint: disable=import-error, wrong-import-position, no-member
+
+import os
+import hashlib
+import logging
+
+from collections import deque
+from queue import Queue, Full
+from threading import Event, Lock, Thread
+from time import perf_counter_ns
+
+import Ice
+
+Ice.loadSlice(os.path.join(os.path.dirname(__file__), "iceflix.ice"))
+import IceFlix
+
+
+CHUNK_SIZE = 2048
+CHUNK_SIZE_MAX = 1024 * 1024
+MESSAGE_OVERHEAD = 1024
+MESSAGE_SIZE_MAX = 1024
+DOWNLOAD_WINDOW = 1
+WRITE_QUEUE_SIZE = 64
+WRITE_COALESCE = 1024 * 1024
+TRANSFER_DIGEST = 'sha256'
+
+SIZE_UNITS = ['B', 'KiB', 'MiB', 'GiB', 'TiB']
+
+def format_size(size : float) -> str:
+    '''
+        Human readable representation of a number of bytes
+    '''
+    for unit in SIZE_UNITS[:-1]:
+        if abs(size) < 1024:
+            return f'{size:.2f} {unit}'
+        size /= 1024
+    return f'{size:.2f} {SIZE_UNITS[-1]}'
+
+def provider_key(provider) -> str:
+    '''
+        Identifies a file service proxy (or servant) across downloads
+    '''
+    if hasattr(provider, 'ice_getIdentity'):
+        return Ice.identityToString(provider.ice_getIdentity())
+    return str(id(provider))
+
+class OutOfOrderError(Exception):
+    '''
+        Raised when a handler serves concurrent receive calls out of order
+    '''
+    def __init__(self) -> None:
+        super().__init__('The file handler answered concurrent requests out of order')
+
+class TransferCancelled(Exception):
+    '''
+        Raised when a transfer is cancelled before it finishes
+    '''
+    def __init__(self) -> None:
+        super().__init__('The transfer was cancelled')
+
+class TransferStats:
+    '''
+        Summary of a finished transfer
+    '''
+    def __init__(self, mode : str) -> None:
+        self.mode = mode
+        self.bytes = 0
+        self.calls = 0
+        self.largest = 0
+        self._start = perf_counter_ns()
+        self._end = None
+
+    def add(self, raw : bytes):
+        '''
+            Accounts a chunk received from the handler
+        '''
+        self.calls += 1
+        self.bytes += len(raw)
+        self.largest = max(self.largest, len(raw))
+
+    def finish(self):
+        '''
+            Stops the transfer clock
+        '''
+        self._end = perf_counter_ns()
+        return self
+
+    @property
+    def elapsed(self) -> float:
+        '''
+            Seconds spent in the transfer
+        '''
+        end = self._end if self._end is not None else perf_counter_ns()
+        return (end - self._start) / 10**9
+
+    @property
+    def throughput(self) -> float:
+        '''
+            Achieved bytes per second
+        '''
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (f'{format_size(self.bytes)} in {self.elapsed:.2f} seconds '
+            f'({format_size(self.throughput)}/s, {self.mode}, '
+            f'chunks up to {format_size(self.largest)})')
+
+class ChunkSizer:
+    '''
+        Chooses the size of each chunk, growing it while the latency of
+        the calls stays flat and backing off when it rises or when
+        a message exceeds Ice.MessageSizeMax
+    '''
+    def __init__(self, initial : int = CHUNK_SIZE, minimum : int = CHUNK_SIZE,
+            maximum : int = CHUNK_SIZE_MAX, samples : int = 4, tolerance : float = 1.5) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.size = min(max(initial, self.minimum), self.maximum)
+        self.samples = max(1, samples)
+        self.tolerance = tolerance
+        self._baseline = None
+        self._latencies = []
+        self._lock = Lock()
+
+    @staticmethod
+    def from_properties(properties) -> 'ChunkSizer':
+        '''
+            Builds a sizer using the ChunkSize* properties, never exceeding Ice.MessageSizeMax
+        '''
+        maximum = properties.getPropertyAsIntWithDefault('ChunkSizeMax', CHUNK_SIZE_MAX)
+        message_size_max = properties.getPropertyAsIntWithDefault(
+            'Ice.MessageSizeMax', MESSAGE_SIZE_MAX) * 1024
+        if message_size_max > 0:
+            maximum = min(maximum, message_size_max - MESSAGE_OVERHEAD)
+        return ChunkSizer(
+            properties.getPropertyAsIntWithDefault('ChunkSizeInitial', CHUNK_SIZE),
+            properties.getPropertyAsIntWithDefault('ChunkSizeMin', CHUNK_SIZE),
+            maximum)
+
+    def record(self, size : int, seconds : float):
+        '''
+            Accounts the latency of a call that requested size bytes
+        '''
+        with self._lock:
+            if size != self.size:
+                return
+            self._latencies.append(seconds)
+            if len(self._latencies) < self.samples:
+                return
+            latency = sorted(self._latencies)[len(self._latencies) // 2]
+            self._latencies.clear()
+            if self._baseline is None or latency < self._baseline:
+                self._baseline = latency
+            if latency <= self._baseline * self.tolerance:
+                self._resize(self.size * 2)
+            elif latency > self._baseline * self.tolerance * 2:
+                self._resize(self.size // 2)
+
+    def oversized(self):
+        '''
+            The last chunk exceeded the message size limit, lowers the maximum
+        '''
+        with self._lock:
+            self.maximum = max(self.minimum, self.size // 2)
+            self._resize(self.maximum)
+            logging.info('Chunk size limited to %d bytes', self.maximum)
+
+    def _resize(self, size : int):
+        size = min(max(size, self.minimum), self.maximum)
+        if size != self.size:
+            logging.debug('Chunk size %d -> %d', self.size, size)
+            self.size = size
+            self._latencies.clear()
+
+class ProviderProbe:
+    '''
+        Opens a file on a provider and asks for its first chunk
+    '''
+    def __init__(self, provider, media_id : str, token : str, size : int, results : Queue) -> None:
+        self.provider = provider
+        self.media_id = media_id
+        self.token = token
+        self.size = size
+        self.handler = None
+        self.first = None
+        self.error = None
+        self.latency = None
+        self.discarded = False
+        self._results = results
+        self._start = None
+        self._lock = Lock()
+
+    def start(self):
+        '''
+            Starts the probe without blocking
+        '''
+        self._start = perf_counter_ns()
+        if hasattr(self.provider, 'openFileAsync'):
+            self.provider.openFileAsync(self.media_id, self.token).add_done_callback(self._opened)
+        else:
+            Thread(target=self._blocking, daemon=True).start()
+
+    def _blocking(self):
+        try:
+            self.handler = self.provider.openFile(self.media_id, self.token)
+            self._done(self.handler.receive(self.size, self.token))
+        except Exception as error: # pylint: disable=broad-exception-caught
+            self._failed(error)
+
+    def _opened(self, future):
+        try:
+            self.handler = future.result()
+            self.handler.receiveAsync(self.size, self.token).add_done_callback(self._received)
+        except Exception as error: # pylint: disable=broad-exception-caught
+            self._failed(error)
+
+    def _received(self, future):
+        try:
+            self._done(future.result())
+        except Exception as error: # pylint: disable=broad-exception-caught
+            self._failed(error)
+
+    def _done(self, raw : bytes):
+        self.latency = (perf_counter_ns() - self._start) / 10**9
+        with self._lock:
+            self.first = raw
+            if self.discarded:
+                self._close()
+        self._results.put(self)
+
+    def _failed(self, error : Exception):
+        with self._lock:
+            self.error = error
+            self._close()
+        self._results.put(self)
+
+    def discard(self):
+        '''
+            The probe lost the race, its handler gets closed as soon as it exists
+        '''
+        with self._lock:
+            self.discarded = True
+            if self.first is not None:
+                self._close()
+
+    def _close(self):
+        if self.handler is None:
+            return
+        try:
+            if hasattr(self.handler, 'closeAsync'):
+                self.handler.closeAsync(self.token)
+            else:
+                self.handler.close(self.token)
+        except Ice.Exception as error:
+            logging.debug('Error closing a discarded handler: %s', error)
+
+def race_providers(providers : list, media_id : str, token : str, size : int) -> ProviderProbe:
+    '''
+        Probes every provider with a first receive and returns the fastest one.
+        The handlers of every other probe are closed, including the ones that
+        failed after opening. Raises the last error if every provider fails, and
+        WrongMediaId if there are no providers
+    '''
+    results = Queue()
+    probes = [ProviderProbe(provider, media_id, token, size, results) for provider in providers]
+    winner = None
+    error = None
+    try:
+        for probe in probes:
+            probe.start()
+        for _ in probes:
+            probe = results.get()
+            if probe.error is None:
+                winner = probe
+                break
+            logging.debug('Provider %s failed the probe: %s', probe.provider, probe.error)
+            error = probe.error
+    finally:
+        for probe in probes:
+            if probe is not winner:
+                probe.discard()
+    if winner is None:
+        raise error if error is not None else IceFlix.WrongMediaId(media_id)
+    logging.info('Provider %s won the race in %.3f seconds', winner.provider, winner.latency)
+    return winner
+
+class Downloader:
+    '''
+        Pulls a media from a file service keeping up to window receive calls in flight.
+        FileHandler.receive has no offset, so chunks are written in the order the
+        requests were issued. Only a short or empty chunk out of order is detected,
+        two full chunks swapped by a provider serving the calls concurrently corrupt
+        the media, so the window is 1 unless the providers are known to serve the
+        calls of a handler in order. Providers caught breaking the order are
+        downloaded serially
+    '''
+
+    serial_providers = set()
+
+    def __init__(self, provider, media_id : str, token, refresh,
+            window : int = DOWNLOAD_WINDOW, sizer : ChunkSizer = None,
+            cancel : Event = None, progress = None) -> None:
+        self.provider = provider
+        self.media_id = media_id
+        self.token = token
+        self.refresh = refresh
+        self.window = max(1, window)
+        self.sizer = sizer if sizer is not None else ChunkSizer()
+        self.cancel = cancel if cancel is not None else Event()
+        self.progress = progress
+        self.handler = None
+        self.first = None
+
+    def open(self):
+        '''
+            Opens a new file handler on the provider
+        '''
+        self.handler = self.provider.openFile(self.media_id, self.token())
+        return self.handler
+
+    def race(self, providers : list):
+        '''
+            Opens the file on the fastest of providers, keeping its first chunk
+        '''
+        probe = race_providers(providers, self.media_id, self.token(), self.sizer.size)
+        self.provider = probe.provider
+        self.handler = probe.handler
+        self.first = probe.first
+        return probe
+
+    def close(self):
+        '''
+            Closes the current file handler
+        '''
+        if self.handler is not None:
+            self.handler.close(self.token())
+            self.handler = None
+
+    @property
+    def pipelined(self) -> bool:
+        '''
+            True if the handler can be used with several requests in flight
+        '''
+        return self.window > 1 \
+            and hasattr(self.handler, 'receiveAsync') \
+            and provider_key(self.provider) not in Downloader.serial_providers
+
+    def run(self, file) -> TransferStats:
+        '''
+            Writes the whole media into file, returns the transfer statistics
+        '''
+        if self.handler is None:
+            self.open()
+        while True:
+            try:
+                return self._transfer(file)
+            except Ice.MemoryLimitException:
+                logging.warning('Chunk exceeded Ice.MessageSizeMax, restarting the download')
+                self.sizer.oversized()
+                self._restart(file)
+
+    def _transfer(self, file) -> TransferStats:
+        if self.pipelined:
+            stats = TransferStats(f'pipelined x{self.window}')
+            self._write_first(file, stats)
+            try:
+                self._pipelined(file, stats)
+                return stats.finish()
+            except (OutOfOrderError, Ice.UnknownException, Ice.OperationNotExistException) as error:
+                logging.warning('Falling back to a serial download: %s', error)
+                Downloader.serial_providers.add(provider_key(self.provider))
+                self._restart(file)
+        stats = TransferStats('serial')
+        self._write_first(file, stats)
+        self._serial(file, stats)
+        return stats.finish()
+
+    def _write_first(self, file, stats : TransferStats):
+        first, self.first = self.first, None
+        if first:
+            self._write(file, stats, first)
+
+    def _restart(self, file):
+        try:
+            self.close()
+        except Ice.Exception as error:
+            logging.debug('Error closing the discarded handler: %s', error)
+        file.seek(0)
+        file.truncate()
+        self.first = None
+        self.open()
+
+    def _serial(self, file, stats : TransferStats):
+        while True:
+            self._check_cancel()
+            size = self.sizer.size
+            start = perf_counter_ns()
+            try:
+                raw = self.handler.receive(size, self.token())
+            except IceFlix.Unauthorized:
+                logging.info('User token got rejected while downloading, refreshing...')
+                self.refresh()
+                continue
+            self.sizer.record(size, (perf_counter_ns() - start) / 10**9)
+            if not raw:
+                return
+            self._write(file, stats, raw)
+
+    def _request(self):
+        size = self.sizer.size
+        start = perf_counter_ns()
+        future = self.handler.receiveAsync(size, self.token())
+        future.add_done_callback(
+            lambda _: self.sizer.record(size, (perf_counter_ns() - start) / 10**9))
+        return size, future
+
+    def _pipelined(self, file, stats : TransferStats):
+        pending = deque()
+        ended = False
+        short = False
+        while not ended or pending:
+            self._check_cancel()
+            while not ended and len(pending) < self.window:
+                pending.append(self._request())
+            size, future = pending.popleft()
+            try:
+                raw = future.result()
+            except IceFlix.Unauthorized:
+                logging.info('User token got rejected while downloading, refreshing...')
+                self._drain(pending, file, stats)
+                self.refresh()
+                continue
+            if raw and (ended or short):
+                raise OutOfOrderError()
+            if not raw:
+                ended = True
+                continue
+            short = len(raw) < size
+            self._write(file, stats, raw)
+
+    def _check_cancel(self):
+        if self.cancel.is_set():
+            raise TransferCancelled()
+
+    def _write(self, file, stats : TransferStats, raw : bytes):
+        file.write(raw)
+        stats.add(raw)
+        if self.progress is not None:
+            self.progress(len(raw))
+
+    def _drain(self, pending : deque, file, stats : TransferStats):
+        '''
+            Waits for the requests issued with a rejected token,
+            the handler did not advance for the rejected ones
+        '''
+        while pending:
+            _, future = pending.popleft()
+            try:
+                raw = future.result()
+            except IceFlix.Unauthorized:
+                continue
+            if raw:
+                self._write(file, stats, raw)
+
+class WriterStats:
+    '''
+        Backpressure statistics of a disk writer
+    '''
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.writes = 0
+        self.stalls = 0
+        self.blocked = 0.0
+        self.idle = 0.0
+
+    def __str__(self) -> str:
+        return (f'{self.writes} writes, network blocked {self.blocked:.2f} seconds '
+            f'in {self.stalls} stalls, disk idle {self.idle:.2f} seconds')
+
+def new_digest(algorithm : str):
+    '''
+        Hash object for algorithm, None if algorithm is empty
+    '''
+    return hashlib.new(algorithm) if algorithm else None
+
+def write_manifest(path : str, algorithm : str, digest : str) -> str:
+    '''
+        Writes the digest of the file at path into a sidecar manifest
+        readable by sha256sum/b2sum, returns the manifest path
+    '''
+    manifest = f'{path}.{algorithm}'
+    with open(manifest, 'w', encoding='utf-8') as file:
+        file.write(f'{digest}  {os.path.basename(path)}\n')
+    return manifest
+
+class StreamHasher:
+    '''
+        Updates a digest from a dedicated thread, so hashing
+        doesn't slow down the thread serving the transfer
+    '''
+    def __init__(self, algorithm : str = TRANSFER_DIGEST) -> None:
+        self.algorithm = algorithm
+        self._digest = new_digest(algorithm)
+        self._result = None
+        self._queue = Queue()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def update(self, raw : bytes):
+        '''
+            Queues raw to be hashed, views must stay valid until hexdigest returns
+        '''
+        self._queue.put(raw)
+
+    def hexdigest(self) -> str:
+        '''
+            Waits for the queued data and returns the digest
+        '''
+        if self._result is None:
+            self._queue.put(None)
+            self._thread.join()
+            self._result = self._digest.hexdigest()
+        return self._result
+
+    def _run(self):
+        for raw in iter(self._queue.get, None):
+            self._digest.update(raw)
+
+class DiskWriter:
+    '''
+        File-like sink that writes the chunks from a dedicated thread.
+        The bounded queue gives backpressure to the network when the disk is slow
+        and the writer coalesces queued chunks into bigger writes, hashing them on the way
+    '''
+    def __init__(self, path : str, queue_size : int = WRITE_QUEUE_SIZE,
+            coalesce : int = WRITE_COALESCE, preallocate : int = 0,
+            algorithm : str = TRANSFER_DIGEST) -> None:
+        self.path = path
+        self.coalesce = max(1, coalesce)
+        self.algorithm = algorithm
+        self.stats = WriterStats()
+        self._digest = new_digest(algorithm)
+        if os.path.lexists(path):
+            # Never truncate in place, the old file may be hardlinked from the media cache
+            os.remove(path)
+        self._file = open(path, 'wb')
+        self._preallocated = self._preallocate(preallocate) if preallocate > 0 else 0
+        self._queue = Queue(maxsize=max(1, queue_size))
+        self._error = None
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def from_properties(path : str, properties) -> 'DiskWriter':
+        '''
+            Builds a writer using the Write* and DownloadPreallocate properties
+        '''
+        return DiskWriter(
+            path,
+            properties.getPropertyAsIntWithDefault('WriteQueueSize', WRITE_QUEUE_SIZE),
+            properties.getPropertyAsIntWithDefault('WriteCoalesce', WRITE_COALESCE),
+            properties.getPropertyAsIntWithDefault('DownloadPreallocate', 0),
+            properties.getPropertyWithDefault('TransferDigest', TRANSFER_DIGEST))
+
+    @property
+    def digest(self) -> str:
+        '''
+            Hex digest of everything written, None until the writer is closed
+        '''
+        if self._digest is None or not self._file.closed:
+            return None
+        return self._digest.hexdigest()
+
+    def _preallocate(self, size : int) -> int:
+        try:
+            os.posix_fallocate(self._file.fileno(), 0, size)
+        except (AttributeError, OSError):
+            self._file.truncate(size)
+        logging.debug('Preallocated %d bytes for %s', size, self.path)
+        return size
+
+    def write(self, raw : bytes):
+        '''
+            Queues raw to be written, blocks while the queue is full
+        '''
+        self._check()
+        try:
+            self._queue.put_nowait(raw)
+        except Full:
+            start = perf_counter_ns()
+            self._queue.put(raw)
+            self.stats.stalls += 1
+            self.stats.blocked += (perf_counter_ns() - start) / 10**9
+
+    def flush(self):
+        '''
+            Waits until every queued chunk is on the file
+        '''
+        self._queue.join()
+        self._check()
+        self._file.flush()
+
+    def seek(self, offset : int):
+        '''
+            Moves the file position once the queued chunks are written,
+            rewinding to the start restarts the digest
+        '''
+        self.flush()
+        if self._digest is not None:
+            self._digest = new_digest(self.algorithm) if offset == 0 else None
+        return self._file.seek(offset)
+
+    def truncate(self, size : int = None):
+        '''
+            Truncates the file once the queued chunks are written
+        '''
+        self.flush()
+        return self._file.truncate(size)
+
+    def close(self):
+        '''
+            Writes the remaining chunks and closes the file
+        '''
+        if self._file.closed:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            if self._preallocated and self._error is None:
+                self._file.truncate(self._file.tell())
+        finally:
+            self._file.close()
+        self._check()
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def _take(self):
+        start = perf_counter_ns()
+        item = self._queue.get()
+        self.stats.idle += (perf_counter_ns() - start) / 10**9
+        return item
+
+    def _run(self):
+        running = True
+        while running:
+            chunks = [self._take()]
+            size = len(chunks[0]) if chunks[0] is not None else 0
+            while chunks[-1] is not None and size < self.coalesce and not self._queue.empty():
+                chunks.append(self._queue.get_nowait())
+                size += len(chunks[-1]) if chunks[-1] is not None else 0
+            if chunks[-1] is None:
+                running = False
+                chunks.pop()
+            if chunks and self._error is None:
+                try:
+                    data = b''.join(chunks)
+                    self._file.write(data)
+                    if self._digest is not None:
+                        self._digest.update(data)
+                    self.stats.writes += 1
+                    self.stats.bytes += size
+                except OSError as error:
+                    self._error = error
+            for _ in range(len(chunks) + (0 if running else 1)):
+                self._queue.task_done()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,83 @@
+'''
+    Forwards the CatalogUpdates events to the parts of the client that cache catalog data
+'''
+
+# pylint: disable=import-error, wrong-import-position, no-member, invalid-name
+
+import os
+import logging
+
+import Ice
+
+Ice.loadSlice(os.path.join(os.path.dirname(__file__), "iceflix.ice"))
+import IceFlix
+
+
+class CatalogListener:
+    '''
+        Base class for the objects interested in CatalogUpdates events,
+        by default every event is reported as a change of the media
+    '''
+    def media_changed(self, media_id : str):
+        '''
+            Called for every event about media_id
+        '''
+
+    def renameTile(self, media_id : str, name : str): # pylint: disable=unused-argument
+        '''
+            A media was renamed
+        '''
+        self.media_changed(media_id)
+
+    def addTags(self, media_id : str, user : str, tags : list[str]): # pylint: disable=unused-argument
+        '''
+            An user added tags to a media
+        '''
+        self.media_changed(media_id)
+
+    def removeTags(self, media_id : str, user : str, tags : list[str]): # pylint: disable=unused-argument
+        '''
+            An user removed tags from a media
+        '''
+        self.media_changed(media_id)
+
+class CatalogUpdatesServant(IceFlix.CatalogUpdate):
+    '''
+        Receives the CatalogUpdates events and forwards them to every listener.
+        If there is a history, only the events it reports as news are forwarded
+    '''
+    def __init__(self) -> None:
+        super().__init__()
+        self.listeners = []
+        self.history = None
+
+    def _notify(self, operation : str, *args):
+        if self.history is not None and not self.history.apply(operation, *args):
+            logging.debug('Not forwarding %s%s, it is known or replayed', operation, args)
+            return
+        for listener in self.listeners:
+            try:
+                getattr(listener, operation)(*args)
+            except Exception as exception: # pylint: disable=broad-exception-caught
+                logging.warning('Error handling %s%s: %s', operation, args, exception)
+
+    def renameTile(self, mediaId : str, newName : str, serviceId : str, _=None):
+        '''
+            renameTile callback for IceFlix.CatalogUpdate
+        '''
+        logging.debug('%s renamed %s to %s', serviceId, mediaId, newName)
+        self._notify('renameTile', mediaId, newName)
+
+    def addTags(self, mediaId : str, user : str, tags : list[str], serviceId : str, _=None):
+        '''
+            addTags callback for IceFlix.CatalogUpdate
+        '''
+        logging.debug('%s added tags %s to %s for %s', serviceId, tags, mediaId, user)
+        self._notify('addTags', mediaId, user, tags)
+
+    def removeTags(self, mediaId : str, user : str, tags : list[str], serviceId : str, _=None):
+        '''
+            removeTags callback for IceFlix.CatalogUpdate
+        '''
+        logging.debug('%s removed tags %s from %s for %s', serviceId, tags, mediaId, user)
+        self._notify('removeTags', mediaId, user, tags)
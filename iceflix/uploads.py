@@ -0,0 +1,194 @@
+'''
+    Bulk upload of many files through a single object adapter
+'''
+
+# pylint: disable=import-error, wrong-import-position
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+
+import os
+import glob
+import json
+import logging
+
+try:
+    from file_uploader import FileUploaderApp
+    from transfer import format_size
+except ImportError:
+    from iceflix.file_uploader import FileUploaderApp
+    from iceflix.transfer import format_size
+
+
+UPLOAD_WORKERS = 4
+
+def expand_sources(patterns : list[str], recursive : bool = False) -> list[str]:
+    '''
+        Files matched by patterns, walking the directories if recursive
+    '''
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=recursive)) if glob.has_magic(pattern) \
+            else [pattern]
+        for match in matches:
+            if os.path.isfile(match):
+                files.append(match)
+            elif os.path.isdir(match) and recursive:
+                for root, directories, names in os.walk(match):
+                    directories.sort()
+                    files.extend(os.path.join(root, name) for name in sorted(names))
+            else:
+                logging.warning('Skipping %s, not a file', match)
+    return list(dict.fromkeys(os.path.abspath(file) for file in files))
+
+class UploadJournal:
+    '''
+        Remembers the files already uploaded, keyed by path, size and modification time
+    '''
+    def __init__(self, path : str = None) -> None:
+        self.path = path
+        self.entries = {}
+        self._lock = Lock()
+        if self.path:
+            self._load()
+
+    @staticmethod
+    def from_properties(properties) -> 'UploadJournal':
+        '''
+            Builds the journal at UploadJournal, disabled if the property is empty
+        '''
+        path = properties.getProperty('UploadJournal')
+        return UploadJournal(os.path.expanduser(path) if path else None)
+
+    @staticmethod
+    def _signature(path : str) -> list:
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as journal:
+                self.entries = json.load(journal)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as journal:
+            json.dump(self.entries, journal)
+        os.replace(temporary, self.path)
+
+    def uploaded(self, path : str) -> dict:
+        '''
+            The recorded upload of path if the file has not changed since
+        '''
+        with self._lock:
+            entry = self.entries.get(path)
+        if entry is None or entry['signature'] != self._signature(path):
+            return None
+        return entry
+
+    def record(self, path : str, media_id : str, digest : str = None):
+        '''
+            Records that path was uploaded as media_id
+        '''
+        if not self.path:
+            return
+        with self._lock:
+            self.entries[path] = {
+                'id': media_id, 'digest': digest, 'signature': self._signature(path)}
+            self._save()
+
+class UploadResult:
+    '''
+        Outcome of the upload of a file
+    '''
+    def __init__(self, path : str) -> None:
+        self.path = path
+        self.media_id = None
+        self.stats = None
+        self.digest = None
+        self.error = None
+        self.skipped = False
+
+    @property
+    def status(self) -> str:
+        '''
+            Short description of the outcome
+        '''
+        if self.skipped:
+            return 'skipped'
+        return 'failed' if self.error is not None else 'done'
+
+class BulkUploader:
+    '''
+        Uploads files concurrently, serving every uploader from the same adapter.
+        The uploads are sent to file_service, or through call(invoke) if given
+    '''
+    def __init__(self, host, file_service, token : str, workers : int = UPLOAD_WORKERS,
+        max_chunk : int = None, algorithm : str = None, journal : UploadJournal = None,
+        call = None):
+        self.host = host
+        self.file_service = file_service
+        self.call = call if call is not None else lambda invoke: invoke(self.file_service)
+        self.token = token
+        self.workers = max(1, workers)
+        self.max_chunk = max_chunk
+        self.algorithm = algorithm
+        self.journal = journal if journal is not None else UploadJournal()
+
+    def upload(self, path : str, force : bool = False) -> UploadResult:
+        '''
+            Uploads a single file unless the journal says it is already uploaded
+        '''
+        result = UploadResult(path)
+        entry = None if force else self.journal.uploaded(path)
+        if entry is not None:
+            result.skipped = True
+            result.media_id = entry['id']
+            result.digest = entry['digest']
+            return result
+        uploader = FileUploaderApp(path, self.host, self.max_chunk, self.algorithm)
+        uploader.run(None)
+        try:
+            result.media_id = self.call(
+                lambda file_service: file_service.uploadFile(uploader.cast, self.token))
+        except Exception as error: # pylint: disable=broad-exception-caught
+            logging.warning('Upload of %s failed: %s', path, error)
+            result.error = error
+        finally:
+            uploader.destroy()
+        result.stats = uploader.servant.stats
+        result.digest = uploader.servant.digest
+        if result.error is None and result.media_id is None:
+            result.error = ValueError('No ID was assigned by the file service')
+        if result.error is None:
+            self.journal.record(path, result.media_id, result.digest)
+        return result
+
+    def run(self, paths : list[str], force : bool = False):
+        '''
+            Uploads every path, yielding the results as they finish
+        '''
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='upload') as executor:
+            futures = [executor.submit(self.upload, path, force) for path in paths]
+            for future in as_completed(futures):
+                yield future.result()
+
+def format_results(results : list[UploadResult], root : str = None) -> str:
+    '''
+        Table with the ID and throughput of every upload
+    '''
+    rows = [('File', 'ID', 'Status', 'Size', 'Speed')]
+    for result in results:
+        name = os.path.relpath(result.path, root) if root else result.path
+        size = speed = '-'
+        if result.stats is not None and result.error is None:
+            size = format_size(result.stats.bytes)
+            speed = f'{format_size(result.stats.throughput)}/s'
+        rows.append((name, result.media_id or '-', result.status, size, speed))
+    widths = [max(len(str(row[column])) for row in rows) for column in range(len(rows[0]))]
+    return '\n'.join(
+        '  '.join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip()
+        for row in rows)
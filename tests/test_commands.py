@@ -1,16 +1,45 @@
-from tests import Main, Authenticator, Catalog, FileService
+from tests import Main, Authenticator, Catalog, FileService, FileHandler
 import iceflix.commands
+import iceflix.directory
+import iceflix.downloads
+import iceflix.mains
+import iceflix.media_cache
+import iceflix.uploads
 
+import io
 import os
+import json
+import socket
+import time
+import tempfile
+import threading
 
 import unittest   # The test framework
 import Ice
-import datetime
 
 Ice.loadSlice(os.path.join(os.path.dirname(__file__), "../iceflix/iceflix.ice"))
 import IceFlix
 
 
+class BrokenFileHandler(FileHandler):
+    def receive(self, size, current=None):
+        if len(self.buffer) < 4096:
+            raise RuntimeError('Broken provider')
+        return super().receive(size, current)
+
+class BrokenFileService(FileService):
+    def openFile(self, mediaId, userToken, current=None):
+        return BrokenFileHandler()
+
+class DeadCatalog(Catalog):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    def getTile(self, mediaId, userToken, current=None):
+        self.calls += 1
+        raise Ice.ConnectionRefusedException()
+
 class TestCliActive(unittest.TestCase):
     def setUp(self) -> None:
         self.main = Main()
@@ -18,8 +47,8 @@ class TestCliActive(unittest.TestCase):
         self.main.catalog = Catalog()
         self.main.fileService = FileService()
         self.cmd = iceflix.commands.CliHandler()
+        self.cmd.active_conn._conn_check.servant.pool.expiry = float('inf')
         self.cmd.active_conn._conn_check.servant.announce(self.main, 'test')
-        self.cmd.active_conn._conn_check.servant.mains[self.main] = datetime.datetime(9999, 12, 30)
 
     def test_reconnect(self):
         self.cmd.do_reconnect('')
@@ -115,6 +144,230 @@ class TestCliActive(unittest.TestCase):
         self.cmd.do_exit('')
         self.assertTrue(self.cmd.do_exit(''))
 
+    def test_downloads(self):
+        self.cmd.do_downloads('')
+        self.cmd.do_downloads('add tile_1')
+        self.assertFalse(self.cmd.downloads.jobs)
+        self.cmd.session.is_anon = False
+        self.cmd.do_downloads('add tile_1 tile_5')
+        self.cmd.do_downloads('wait')
+        jobs = self.cmd.downloads.jobs
+        self.assertEqual(jobs[1].state, iceflix.downloads.JobState.DONE)
+        self.assertEqual(jobs[1].bytes, 4096)
+        self.assertEqual(jobs[2].state, iceflix.downloads.JobState.FAILED)
+        self.cmd.do_downloads('list')
+        self.cmd.do_downloads('cancel 1 3')
+        self.cmd.do_downloads('clear')
+        self.assertFalse(self.cmd.downloads.jobs)
+
+    def test_download_guards(self):
+        with tempfile.TemporaryDirectory() as directory:
+            target = os.path.join(directory, 'broken')
+            title = iceflix.commands.PartiaMedia('tile_1', target)
+            with self.assertRaises(RuntimeError):
+                iceflix.commands.Commands.receive(self.cmd.active_conn, title,
+                    IceFlix.Media('tile_1', BrokenFileService(), None))
+            self.assertFalse(os.path.exists(target))
+            with self.cmd.downloads.targets.claim(target):
+                with self.assertRaises(iceflix.downloads.TargetBusyError):
+                    with self.cmd.downloads.targets.claim(target):
+                        pass
+        release = threading.Event()
+        job = self.cmd.downloads.submit(title, lambda _: release.wait())
+        self.assertIs(self.cmd.downloads.submit(title, lambda _: None), job)
+        release.set()
+        self.cmd.downloads.wait()
+        self.assertIsNot(self.cmd.downloads.submit(title, lambda _: None), job)
+
+    def test_queued_alerts(self):
+        with self.cmd.terminal_lock:
+            alerting = threading.Thread(target=self.cmd.alert, args=('Download finished',))
+            alerting.start()
+            alerting.join()
+        self.cmd.stdout = io.StringIO()
+        self.cmd.postcmd(False, '')
+        self.assertEqual(self.cmd.stdout.getvalue(), 'Download finished\n')
+
+    def test_providers(self):
+        conn_check = self.cmd.active_conn._conn_check
+        conn_check.servant.announce(FileService(), 'file_service')
+        conn_check.servant.announce(Authenticator(), 'authenticator')
+        conn_check.availability.announceFiles(['tile_1', 'tile_2'], 'file_service')
+        conn_check.availability.announceFiles(['tile_1'], 'unknown_service')
+        self.assertEqual(len(self.cmd.active_conn.providers.candidates('tile_1')), 1)
+        self.cmd.session.selected_title = iceflix.commands.PartiaMedia('tile_1')
+        self.cmd.session.is_anon = False
+        self.cmd.do_selected('download')
+        self.assertTrue(os.path.isfile('valid_tile'))
+        self.cmd.active_conn.providers.forget_service('file_service')
+        self.assertFalse(self.cmd.active_conn.providers.candidates('tile_1'))
+
+    def test_directory(self):
+        catalog = Catalog()
+        self.cmd.active_conn._conn_check.servant.announce(catalog, 'catalog')
+        self.assertIs(self.cmd.active_conn.get_catalog(), catalog)
+        authenticator = self.cmd.active_conn.get_authenticator()
+        self.assertIs(authenticator, self.main.authenticator)
+        self.main.authenticator = Authenticator()
+        self.assertIs(self.cmd.active_conn.get_authenticator(), authenticator)
+        self.cmd.active_conn._main_changed(self.main)
+        self.assertIs(self.cmd.active_conn.get_authenticator(), self.main.authenticator)
+
+    def test_direct_connection(self):
+        with Ice.initialize() as comm, tempfile.TemporaryDirectory() as directory:
+            adapter = comm.createObjectAdapterWithEndpoints('Main', 'tcp -h 127.0.0.1')
+            adapter.activate()
+            proxy = adapter.addWithUUID(self.main)
+            conn = self.cmd.active_conn
+            conn.known_mains = iceflix.mains.KnownMains(os.path.join(directory, 'mains.json'))
+            self.cmd.do_reconnect(f'-p "{proxy}"')
+            self.assertEqual(conn.main, proxy)
+            self.assertEqual(conn.remote, '127.0.0.1')
+            self.assertEqual(
+                iceflix.mains.KnownMains(conn.known_mains.path).proxies, [str(proxy)])
+            self.cmd.do_disconnect('')
+            self.assertIsNone(conn.main)
+            self.cmd.do_reconnect('')
+            self.assertEqual(conn.main, proxy)
+            self.cmd.do_reconnect('-p "not a proxy"')
+            self.cmd.do_reconnect(f'-p "{adapter.addWithUUID(Catalog())}"')
+            self.assertEqual(conn.main, proxy)
+
+    def test_topic_manager_down(self):
+        with Ice.initialize() as comm, tempfile.TemporaryDirectory() as directory:
+            adapter = comm.createObjectAdapterWithEndpoints('Main', 'tcp -h 127.0.0.1')
+            adapter.activate()
+            proxy = adapter.addWithUUID(self.main)
+            conn = self.cmd.active_conn
+            conn.known_mains = iceflix.mains.KnownMains(os.path.join(directory, 'mains.json'))
+            conn.known_mains.remember(proxy)
+            conn.disconnect_topic_manager()
+            with socket.socket() as closed:
+                closed.bind(('127.0.0.1', 0))
+                port = closed.getsockname()[1]
+            conn.communicator.getProperties().setProperty(
+                'IceStorm.TopicManager', f'IceStorm/TopicManager:tcp -h 127.0.0.1 -p {port}')
+            self.assertIs(iceflix.commands.Commands.stablish_connection_main(conn), conn)
+            self.assertEqual(conn.main, proxy)
+
+    def test_catalog_replica(self):
+        conn = self.cmd.active_conn
+        conn.replica.staleness = 60
+        conn.replica.settle = 0
+        self.cmd.session.user, self.cmd.session.is_anon = 'user', False
+        conn._conn_check.catalog_updates.addTags('tile_1', 'user', ['local_tag'], 'catalog')
+        conn.replica.answered = conn.replica.synced = time.monotonic()
+        self.cmd.do_catalog('get tags local_tag')
+        self.assertNotIn('tile_1', self.cmd.session.cached_titles)
+        conn.replica.subscribe()
+        conn.replica.requested = True
+        conn.replica.answered = conn.replica.synced = time.monotonic()
+        self.cmd.do_catalog('get tags local_tag')
+        self.assertIn('tile_1', self.cmd.session.cached_titles)
+        conn.disconnect_topic_manager()
+        self.assertFalse(conn.replica.fresh)
+
+    def test_local_search(self):
+        self.cmd.do_catalog('get name valid_tile')
+        self.cmd.session.cached_titles['tile_1'].fetch(self.cmd.active_conn)
+        self.cmd.session.cached_titles.pop('tile_2')
+        self.cmd.do_catalog('get name valid --local')
+        verifier = iceflix.commands.Commands.verify_search(self.cmd.active_conn, ['tile_1'],
+            lambda: ['tile_1', 'tile_2'], lambda _id: iceflix.commands.PartiaMedia(_id))
+        verifier.join()
+        self.assertIn('tile_2', self.cmd.session.cached_titles)
+
+    def test_show_titles(self):
+        self.cmd.session.cached_titles.update({f'tile_{number}': iceflix.commands.PartiaMedia(
+            f'tile_{number}', f'Title {999 - number:03}') for number in range(1000)})
+        self.cmd.stdout = io.StringIO()
+        self.cmd.do_catalog('show --sort name --offset 10 --limit 5 --json')
+        lines = self.cmd.stdout.getvalue().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines],
+            [f'tile_{number}' for number in range(989, 984, -1)])
+        self.cmd.stdout = io.StringIO()
+        self.cmd.do_catalog('show --sort id')
+        lines = self.cmd.stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), 1000)
+        self.assertTrue(lines[0].startswith('tile_0.'))
+        self.cmd.stdout = io.StringIO()
+        self.cmd.do_catalog('show --offset 1000')
+        self.assertEqual(self.cmd.stdout.getvalue(), '')
+        self.cmd.onecmd_plus_hooks('catalog show --limit -1')
+        self.assertEqual(self.cmd.stdout.getvalue(), '')
+
+    def test_enrich_failover(self):
+        conn = self.cmd.active_conn
+        conn.policy.backoff = 0
+        self.cmd.session.is_anon = False
+        dead = DeadCatalog()
+        conn.directory.announce(iceflix.directory.ServiceKind.CATALOG, 'dead', dead)
+        self.cmd.stdout = io.StringIO()
+        iceflix.commands.Commands.enrich_titles(conn, ['tile_1', 'tile_2'],
+            iceflix.commands.PartiaMedia)
+        self.assertEqual(len(self.cmd.stdout.getvalue().splitlines()), 2)
+        self.assertIsNotNone(self.cmd.session.cached_titles['tile_1'].provider)
+        self.assertNotIn(dead, conn.directory.candidates(iceflix.directory.ServiceKind.CATALOG))
+        self.main.catalog = dead
+        conn.directory.handed.clear()
+        self.cmd.session.cached_titles = {}
+        self.cmd.stdout = io.StringIO()
+        iceflix.commands.Commands.enrich_titles(conn, ['tile_1', 'tile_2'],
+            iceflix.commands.PartiaMedia)
+        self.assertEqual(len(self.cmd.stdout.getvalue().splitlines()), 2)
+        self.assertIsNone(self.cmd.session.cached_titles['tile_1'].provider)
+        self.assertLessEqual(dead.calls, 1 + conn.policy.attempts)
+
+    def test_missing_media(self):
+        conn = self.cmd.active_conn
+        self.cmd.session.is_anon = False
+        self.cmd.session.cached_titles['tile_9'] = iceflix.commands.PartiaMedia('tile_9', 'gone')
+        for _ in range(2):
+            with self.assertRaises(IceFlix.WrongMediaId):
+                iceflix.commands.PartiaMedia('tile_9').fetch(conn)
+        self.assertEqual(conn.missing.hits, 1)
+        self.assertNotIn('tile_9', self.cmd.session.cached_titles)
+        conn._conn_check.availability.announceFiles(['tile_9'], 'file_service')
+        self.assertFalse(conn.missing.missing('tile_9'))
+
+    def test_media_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = iceflix.media_cache.MediaCache(directory, 1 << 20)
+            self.cmd.active_conn.media_cache = cache
+            self.cmd.active_conn._conn_check.catalog_updates.listeners.append(cache)
+            self.cmd.session.selected_title = iceflix.commands.PartiaMedia('tile_1')
+            self.cmd.session.is_anon = False
+            self.cmd.do_selected('download')
+            self.assertIn('tile_1', cache.entries)
+            os.remove('valid_tile')
+            self.cmd.do_selected('download')
+            self.assertTrue(os.path.isfile('valid_tile'))
+            self.cmd.active_conn._conn_check.catalog_updates.addTags('tile_1', 'user', ['tag'], 'catalog')
+            self.assertNotIn('tile_1', cache.entries)
+
+    def test_bulk_upload(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('a.txt', 'b.txt', os.path.join('season', 'c.txt')):
+                os.makedirs(os.path.dirname(os.path.join(directory, name)), exist_ok=True)
+                with open(os.path.join(directory, name), 'wb') as file:
+                    file.write(os.urandom(3000))
+            journal_path = os.path.join(directory, 'journal', 'uploads.json')
+            self.cmd.active_conn.communicator.getProperties().setProperty('UploadJournal', journal_path)
+            self.cmd.session.make_admin('admin')
+            self.cmd.do_upload(f'--recursive -j 2 {directory}')
+            journal = iceflix.uploads.UploadJournal(journal_path)
+            self.assertEqual(len(journal.entries), 3)
+            self.assertIn('tile_3', self.cmd.session.cached_titles)
+            uploader = iceflix.uploads.BulkUploader(None, None, 'admin', journal=journal)
+            result = uploader.upload(os.path.join(directory, 'a.txt'))
+            self.assertTrue(result.skipped)
+            self.assertEqual(result.media_id, 'tile_3')
+            self.cmd.do_upload(os.path.join(directory, '*.txt'))
+            self.assertEqual(
+                iceflix.uploads.expand_sources([os.path.join(directory, '*.txt')]),
+                [os.path.join(directory, 'a.txt'), os.path.join(directory, 'b.txt')])
+            self.assertIn('skipped', iceflix.uploads.format_results([result], directory))
+
     def tearDown(self) -> None:
         self.cmd.shutdown()
 
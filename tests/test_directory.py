@@ -0,0 +1,36 @@
+from tests import Authenticator, Catalog
+from iceflix.directory import ServiceDirectory, ServiceKind
+
+import time
+
+import unittest
+
+
+class TestServiceDirectory(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = ServiceDirectory(expiry=0.1)
+
+    def test_announced_first(self):
+        announced, handed = Catalog(), Catalog()
+        self.directory.hand_out(ServiceKind.CATALOG, handed)
+        self.assertIs(self.directory.get(ServiceKind.CATALOG), handed)
+        self.directory.announce(ServiceKind.CATALOG, 'catalog', announced)
+        self.assertIs(self.directory.get(ServiceKind.CATALOG), announced)
+        self.assertIsNone(self.directory.get(ServiceKind.AUTHENTICATOR))
+
+    def test_liveness(self):
+        self.directory.announce(ServiceKind.AUTHENTICATOR, 'auth', Authenticator())
+        time.sleep(0.2)
+        self.assertIsNone(self.directory.get(ServiceKind.AUTHENTICATOR))
+
+    def test_invalidation(self):
+        handed, announced = Catalog(), Authenticator()
+        self.directory.hand_out(ServiceKind.CATALOG, handed)
+        self.directory.main_changed()
+        self.assertIsNone(self.directory.get(ServiceKind.CATALOG))
+        self.directory.hand_out(ServiceKind.CATALOG, handed)
+        self.directory.announce(ServiceKind.AUTHENTICATOR, 'auth', announced)
+        self.directory.failed(handed)
+        self.directory.failed(announced)
+        self.assertIsNone(self.directory.get(ServiceKind.CATALOG))
+        self.assertIsNone(self.directory.get(ServiceKind.AUTHENTICATOR))
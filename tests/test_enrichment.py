@@ -0,0 +1,64 @@
+from tests import Catalog
+import iceflix.enrichment
+
+import os
+import time
+import threading
+
+import unittest
+import Ice
+
+Ice.loadSlice(os.path.join(os.path.dirname(__file__), "../iceflix/iceflix.ice"))
+import IceFlix
+
+
+class CountingCatalog(Catalog):
+    def __init__(self) -> None:
+        super().__init__()
+        self.in_flight = 0
+        self.most = 0
+        self.lock = threading.Lock()
+
+    def getTile(self, mediaId, userToken, current=None):
+        with self.lock:
+            self.in_flight += 1
+            self.most = max(self.most, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        media = super().getTile(mediaId, userToken, current)
+        return IceFlix.Media(media.mediaId, None, media.info)
+
+class TestTileEnricher(unittest.TestCase):
+    def setUp(self) -> None:
+        init_data = Ice.InitializationData()
+        init_data.properties = Ice.createProperties()
+        init_data.properties.setProperty('Ice.Default.CollocationOptimized', '0')
+        init_data.properties.setProperty('Ice.ThreadPool.Server.Size', '8')
+        self.comm = Ice.initialize(init_data)
+        self.adapter = self.comm.createObjectAdapterWithEndpoints('Services', 'tcp -h 127.0.0.1')
+        self.adapter.activate()
+        self.servant = CountingCatalog()
+        self.catalog = IceFlix.MediaCatalogPrx.uncheckedCast(self.adapter.addWithUUID(self.servant))
+
+    def tearDown(self) -> None:
+        self.comm.destroy()
+
+    def test_concurrency(self):
+        enricher = iceflix.enrichment.TileEnricher(concurrency=4)
+        media_ids = ['tile_1', 'tile_2', 'tile_3'] * 10
+        results = list(enricher.fetch(self.catalog, media_ids, 'token'))
+        self.assertEqual(sorted(media_id for media_id, _, _ in results), sorted(media_ids))
+        for media_id, media, error in results:
+            if media_id == 'tile_3':
+                self.assertIsInstance(error, IceFlix.WrongMediaId)
+            else:
+                self.assertEqual(media.mediaId, media_id)
+        self.assertGreater(self.servant.most, 1)
+        self.assertLessEqual(self.servant.most, 4)
+
+    def test_servant(self):
+        enricher = iceflix.enrichment.TileEnricher()
+        results = list(enricher.fetch(Catalog(), ['tile_1', 'tile_3'], 'token'))
+        self.assertEqual(results[0][1].info.name, 'valid_tile')
+        self.assertIsInstance(results[1][2], IceFlix.WrongMediaId)
@@ -0,0 +1,66 @@
+from tests import Catalog
+import iceflix.hedging
+
+import os
+import time
+
+import unittest
+import Ice
+
+Ice.loadSlice(os.path.join(os.path.dirname(__file__), "../iceflix/iceflix.ice"))
+import IceFlix
+
+
+class SlowCatalog(Catalog):
+    def getTilesByName(self, name, exact, current=None):
+        time.sleep(0.5)
+        return ['slow_tile']
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_percentile(self):
+        tracker = iceflix.hedging.LatencyTracker(samples=20)
+        tracker.record('getTile', 1.0)
+        self.assertIsNone(tracker.percentile('getTile', 95))
+        for latency in range(100):
+            tracker.record('getTile', latency / 100)
+        self.assertEqual(tracker.percentile('getTile', 50), 0.9)
+        self.assertEqual(tracker.percentile('getTile', 100), 0.99)
+
+class TestHedger(unittest.TestCase):
+    def setUp(self) -> None:
+        init_data = Ice.InitializationData()
+        init_data.properties = Ice.createProperties()
+        init_data.properties.setProperty('Ice.Default.CollocationOptimized', '0')
+        init_data.properties.setProperty('Ice.ThreadPool.Server.Size', '4')
+        self.comm = Ice.initialize(init_data)
+        self.adapter = self.comm.createObjectAdapterWithEndpoints('Services', 'tcp -h 127.0.0.1')
+        self.adapter.activate()
+        self.slow = IceFlix.MediaCatalogPrx.uncheckedCast(self.adapter.addWithUUID(SlowCatalog()))
+        self.fast = IceFlix.MediaCatalogPrx.uncheckedCast(self.adapter.addWithUUID(Catalog()))
+
+    def tearDown(self) -> None:
+        self.comm.destroy()
+
+    def test_backup_wins(self):
+        hedger = iceflix.hedging.Hedger(enabled=True)
+        titles = hedger.call(self.slow, [self.fast], 'getTilesByName', ('valid_tile', True))
+        self.assertEqual(titles, ['tile_1'])
+        self.assertEqual((hedger.hedged, hedger.won), (1, 1))
+
+    def test_primary_in_time(self):
+        hedger = iceflix.hedging.Hedger(enabled=True)
+        titles = hedger.call(self.fast, [self.slow], 'getTilesByName', ('valid_tile', True))
+        self.assertEqual(titles, ['tile_1'])
+        self.assertEqual((hedger.hedged, hedger.won), (0, 0))
+
+    def test_disabled_deadline(self):
+        hedger = iceflix.hedging.Hedger(deadline=0.1)
+        with self.assertRaises(Ice.InvocationTimeoutException):
+            hedger.call(self.slow, [self.fast], 'getTilesByName', ('valid_tile', True))
+        self.assertEqual(hedger.hedged, 0)
+
+    def test_user_error_not_hedged(self):
+        hedger = iceflix.hedging.Hedger(enabled=True)
+        with self.assertRaises(IceFlix.WrongMediaId):
+            hedger.call(self.fast, [self.slow], 'getTile', ('not_a_tile', 'token'))
+        self.assertEqual(hedger.hedged, 0)
@@ -0,0 +1,75 @@
+from tests import Main
+import iceflix.mains
+
+import time
+
+import unittest
+import Ice
+
+
+class RefusedMain(Main):
+    def ice_ping(self, current=None):
+        raise Ice.ConnectionRefusedException()
+
+class SlowMain(Main):
+    def ice_ping(self, current=None):
+        time.sleep(0.05)
+
+class TestMainPool(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pool = iceflix.mains.MainPool(interval=0.05)
+
+    def test_best_is_healthiest(self):
+        slow, fast, refused = SlowMain(), Main(), RefusedMain()
+        for main in (slow, fast, refused):
+            self.pool.announce(main)
+        self.assertIs(self.pool.best, fast)
+        self.assertFalse(self.pool.entries[refused].healthy)
+        self.pool.forget(fast)
+        self.assertIs(self.pool.best, slow)
+
+    def test_failures_decay(self):
+        health = iceflix.mains.MainHealth(Main())
+        health.failed()
+        health.failed()
+        self.assertFalse(health.healthy)
+        health.succeeded(0.01)
+        self.assertTrue(health.healthy)
+        self.assertIn('ms', str(health))
+
+    def test_expiry(self):
+        main = Main()
+        self.pool.expiry = 0.1
+        self.pool.announce(main)
+        self.assertIs(self.pool.best, main)
+        self.pool.start()
+        time.sleep(0.3)
+        self.assertIsNone(self.pool.best)
+        self.assertFalse(self.pool.entries)
+
+    def test_events(self):
+        changes = []
+        self.pool.listeners.append(changes.append)
+        self.pool.expiry = 0.1
+        self.pool.start()
+        main = Main()
+        self.pool.announce(main)
+        self.pool.announce(main)
+        time.sleep(0.3)
+        self.assertEqual(changes, [main, None])
+
+    def test_expiry_heap(self):
+        heap = iceflix.mains.ExpiryHeap()
+        for second in range(100):
+            heap.touch('refreshed', second)
+        heap.touch('stale', 50)
+        heap.touch('dropped', 10)
+        heap.discard('dropped')
+        self.assertEqual(len(heap), 2)
+        self.assertEqual(heap.next_deadline(), 50)
+        self.assertEqual(heap.pop_expired(98), ['stale'])
+        self.assertEqual(heap.pop_expired(99), ['refreshed'])
+        self.assertIsNone(heap.next_deadline())
+
+    def tearDown(self) -> None:
+        self.pool.stop()
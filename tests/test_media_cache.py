@@ -0,0 +1,107 @@
+import iceflix.media_cache
+
+import os
+import random
+import tempfile
+
+import unittest
+
+
+class TestMediaCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.directory.name, 'cache')
+        self.cache = iceflix.media_cache.MediaCache(self.cache_dir, 8192)
+
+    def media(self, name, size=4096):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as file:
+            file.write(random.randbytes(size))
+        return path
+
+    def test_restore(self):
+        path = self.media('tile_1')
+        self.cache.store('tile_1', path)
+        target = os.path.join(self.directory.name, 'restored')
+        self.assertIsNotNone(self.cache.restore('tile_1', target))
+        with open(path, 'rb') as original, open(target, 'rb') as restored:
+            self.assertEqual(original.read(), restored.read())
+        self.assertIsNone(self.cache.restore('tile_2', target))
+
+    def test_index_persisted(self):
+        self.cache.store('tile_1', self.media('tile_1'))
+        cache = iceflix.media_cache.MediaCache(self.cache_dir, 8192)
+        self.assertIn('tile_1', cache.entries)
+        self.assertEqual(cache.size, 4096)
+
+    def test_lru_eviction(self):
+        self.cache.store('tile_1', self.media('tile_1'))
+        self.cache.store('tile_2', self.media('tile_2'))
+        self.cache.lookup('tile_1')
+        self.cache.store('tile_3', self.media('tile_3'))
+        self.assertEqual(list(self.cache.entries), ['tile_1', 'tile_3'])
+        self.assertIsNone(self.cache.store('tile_4', self.media('tile_4', 16384)))
+
+    def test_shared_content(self):
+        path = self.media('tile_1')
+        self.cache.store('tile_1', path)
+        self.cache.store('tile_2', path)
+        self.assertEqual(self.cache.size, 4096)
+        self.cache.renameTile('tile_1', 'new_name')
+        self.assertNotIn('tile_1', self.cache.entries)
+        self.assertIsNotNone(self.cache.lookup('tile_2'))
+
+    def test_owned_copies(self):
+        path = self.media('tile_1')
+        entry = self.cache.store('tile_1', path)
+        with open(path, 'r+b') as file:
+            file.write(b'edited')
+        target = os.path.join(self.directory.name, 'restored')
+        self.assertIsNotNone(self.cache.restore('tile_1', target))
+        self.assertEqual(iceflix.media_cache.copy_file(target, target + '.copy'), entry.digest)
+        with open(target, 'r+b') as file:
+            file.write(b'edited')
+        self.assertIsNotNone(self.cache.restore('tile_1', path))
+
+    def test_linked(self):
+        path = self.media('tile_1')
+        digest = iceflix.media_cache.copy_file(path, path + '.copy')
+        entry = self.cache.store('tile_1', path, digest)
+        self.assertTrue(os.path.samefile(path, self.cache._blob_path(entry.digest)))
+        target = os.path.join(self.directory.name, 'restored')
+        self.assertIsNotNone(self.cache.restore('tile_1', target))
+        self.assertFalse(os.path.samefile(target, path))
+        with open(path, 'r+b') as file:
+            file.write(b'edited')
+        self.assertIsNone(self.cache.restore('tile_1', target))
+        self.assertNotIn('tile_1', self.cache.entries)
+        self.assertTrue(os.path.isfile(path))
+
+    def test_corrupted_copy(self):
+        entry = self.cache.store('tile_1', self.media('tile_1'))
+        with open(self.cache._blob_path(entry.digest), 'r+b') as file:
+            file.write(b'corrupted')
+        target = self.media('target')
+        self.assertIsNone(self.cache.restore('tile_1', target))
+        self.assertEqual(os.path.getsize(target), 4096)
+        self.assertNotIn('tile_1', self.cache.entries)
+
+    def test_hits_saved_on_close(self):
+        self.cache.store('tile_1', self.media('tile_1'))
+        self.cache.store('tile_2', self.media('tile_2'))
+        index = os.path.join(self.cache_dir, iceflix.media_cache.INDEX_FILE)
+        modified = os.stat(index).st_mtime_ns
+        self.cache.lookup('tile_1')
+        self.assertEqual(os.stat(index).st_mtime_ns, modified)
+        self.cache.close()
+        cache = iceflix.media_cache.MediaCache(self.cache_dir, 8192)
+        self.assertEqual(list(cache.entries), ['tile_2', 'tile_1'])
+
+    def test_disabled(self):
+        cache = iceflix.media_cache.MediaCache(self.cache_dir, 0)
+        self.assertIsNone(cache.store('tile_1', self.media('tile_1')))
+        self.assertIsNone(cache.restore('tile_1', self.media('tile_2')))
+        cache.invalidate('tile_1')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
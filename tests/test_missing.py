@@ -0,0 +1,35 @@
+import iceflix.missing
+
+import time
+
+import unittest
+
+
+class TestMissingMedia(unittest.TestCase):
+    def setUp(self) -> None:
+        self.missing = iceflix.missing.MissingMedia(ttl=60)
+
+    def test_missing(self):
+        self.assertFalse(self.missing.missing('tile_1'))
+        self.missing.add('tile_1')
+        self.assertTrue(self.missing.missing('tile_1'))
+        self.assertEqual((len(self.missing), self.missing.hits), (1, 1))
+
+    def test_ttl(self):
+        missing = iceflix.missing.MissingMedia(ttl=0.05)
+        missing.add('tile_1')
+        time.sleep(0.1)
+        self.assertFalse(missing.missing('tile_1'))
+        self.assertEqual(len(missing), 0)
+
+    def test_disabled(self):
+        missing = iceflix.missing.MissingMedia(ttl=0)
+        missing.add('tile_1')
+        self.assertFalse(missing.missing('tile_1'))
+
+    def test_events(self):
+        self.missing.add('tile_1')
+        self.missing.add('tile_2')
+        self.missing.renameTile('tile_1', 'name')
+        self.missing.announce_files(['tile_2', 'tile_3'], 'file_service')
+        self.assertEqual(len(self.missing), 0)
@@ -0,0 +1,98 @@
+from tests import Catalog
+import iceflix.policy
+
+import os
+import threading
+import time
+import unittest
+import Ice
+
+Ice.loadSlice(os.path.join(os.path.dirname(__file__), "../iceflix/iceflix.ice"))
+import IceFlix
+
+
+class FailingCatalog(Catalog):
+    def __init__(self, error) -> None:
+        super().__init__()
+        self.error = error
+        self.calls = 0
+
+    def getTilesByName(self, name, exact, current=None):
+        self.calls += 1
+        raise self.error
+
+class TestCallPolicy(unittest.TestCase):
+    def setUp(self) -> None:
+        self.policy = iceflix.policy.CallPolicy(attempts=3, backoff=0.001, failures=2, reset=60)
+
+    def call(self, *catalogs, **kwargs):
+        return self.policy.call('catalog', lambda: list(catalogs),
+            lambda catalog: catalog.getTilesByName('valid_tile', True), **kwargs)
+
+    def test_failover(self):
+        dead, alive = FailingCatalog(Ice.ConnectionRefusedException()), Catalog()
+        failed = []
+        self.assertEqual(self.call(dead, alive, on_failure=failed.append), ['tile_1'])
+        self.assertEqual(failed, [dead])
+        self.assertEqual(self.policy.metrics.counts['failover'], 1)
+
+    def test_circuit_breaker(self):
+        dead, alive = FailingCatalog(Ice.ConnectTimeoutException()), Catalog()
+        with self.assertRaises(Ice.ConnectTimeoutException):
+            self.call(dead)
+        self.assertEqual(dead.calls, 2)
+        self.assertEqual(self.policy.breaker(dead).state, 'open')
+        self.assertEqual(self.call(dead, alive), ['tile_1'])
+        self.assertEqual(dead.calls, 2)
+        with self.assertRaises(iceflix.policy.CircuitOpenError):
+            self.call(dead)
+
+    def test_backoff(self):
+        busy = FailingCatalog(IceFlix.TemporaryUnavailable())
+        retries = []
+        with self.assertRaises(IceFlix.TemporaryUnavailable):
+            self.call(busy, on_retry=lambda attempt, delay, _: retries.append(attempt))
+        self.assertEqual(retries, [1, 2])
+        self.assertEqual(busy.calls, 3)
+        self.assertEqual(self.policy.breaker(busy).state, 'closed')
+        self.assertEqual(self.policy.metrics.counts['give-up'], 1)
+
+    def test_not_idempotent(self):
+        lost = FailingCatalog(Ice.ConnectionLostException())
+        with self.assertRaises(Ice.ConnectionLostException):
+            self.call(lost, Catalog(), idempotent=False)
+        self.assertEqual(lost.calls, 1)
+        refused = FailingCatalog(Ice.ConnectionRefusedException())
+        self.assertEqual(self.call(refused, Catalog(), idempotent=False), ['tile_1'])
+
+    def test_half_open_trial(self):
+        breaker = iceflix.policy.CircuitBreaker(failures=1, reset=0.05)
+        breaker.failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.05)
+        self.assertTrue(breaker.available())
+        allowed = []
+        threads = [threading.Thread(target=lambda: allowed.append(breaker.allow()))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(allowed.count(True), 1)
+        self.assertFalse(breaker.available())
+        breaker.failure()
+        self.assertEqual(breaker.state, 'open')
+        time.sleep(0.05)
+        self.assertTrue(breaker.allow())
+        breaker.success()
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_user_error_closes(self):
+        policy = iceflix.policy.CallPolicy(attempts=1, failures=1, reset=0)
+        dead = FailingCatalog(Ice.ConnectionRefusedException())
+        with self.assertRaises(Ice.ConnectionRefusedException):
+            policy.call('catalog', lambda: [dead], lambda catalog: catalog.getTilesByName('', True))
+        dead.error = IceFlix.WrongMediaId()
+        with self.assertRaises(IceFlix.WrongMediaId):
+            policy.call('catalog', lambda: [dead], lambda catalog: catalog.getTilesByName('', True))
+        self.assertEqual(policy.breaker(dead).state, 'closed')
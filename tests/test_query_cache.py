@@ -0,0 +1,78 @@
+import iceflix.query_cache
+
+import time
+import threading
+
+import unittest
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = iceflix.query_cache.QueryCache(size=2, ttl=60)
+        self.calls = 0
+
+    def search(self, result):
+        def search():
+            self.calls += 1
+            return result
+        return search
+
+    def test_memoized(self):
+        query = iceflix.query_cache.name_query('tile', False)
+        self.assertEqual(self.cache.get(query, self.search(['tile_1'])), ['tile_1'])
+        self.assertEqual(self.cache.get(query, self.search(['tile_2'])), ['tile_1'])
+        self.assertEqual((self.calls, self.cache.hits), (1, 1))
+        self.assertEqual(self.cache.get(
+            iceflix.query_cache.name_query('Tile', False), self.search(['tile_2'])), ['tile_2'])
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.cache.get(
+            iceflix.query_cache.name_query('tile', True), self.search([])), [])
+        self.assertEqual(self.calls, 3)
+
+    def test_ttl_and_lru(self):
+        cache = iceflix.query_cache.QueryCache(size=2, ttl=0)
+        query = iceflix.query_cache.name_query('tile', False)
+        cache.get(query, self.search([]))
+        cache.get(query, self.search([]))
+        self.assertEqual(self.calls, 2)
+        for name in ('a', 'b', 'c'):
+            self.cache.get(iceflix.query_cache.name_query(name, True), self.search([]))
+        self.assertEqual(list(self.cache.entries),
+            [('name', 'b', True), ('name', 'c', True)])
+
+    def test_invalidated(self):
+        by_name = iceflix.query_cache.name_query('Tile', False)
+        by_tags = iceflix.query_cache.tags_query('user', ['tag_2', 'tag_1'], True)
+        self.cache.get(by_name, self.search(['tile_1']))
+        self.cache.get(by_tags, self.search(['tile_1']))
+        self.cache.addTags('tile_2', 'another_user', ['tag_1'])
+        self.cache.renameTile('tile_2', 'A dog')
+        self.assertEqual(len(self.cache.entries), 2)
+        self.cache.addTags('tile_2', 'user', ['tag_1'])
+        self.assertNotIn(by_tags, self.cache.entries)
+        self.cache.renameTile('tile_2', 'A new tile')
+        self.assertNotIn(by_name, self.cache.entries)
+        self.cache.get(by_name, self.search(['tile_1']))
+        self.cache.forget_media('tile_1')
+        self.assertFalse(self.cache.entries)
+
+    def test_in_flight_shared(self):
+        started, release = threading.Event(), threading.Event()
+        def slow():
+            self.calls += 1
+            started.set()
+            release.wait()
+            return ['tile_1']
+        query = iceflix.query_cache.name_query('tile', True)
+        results = []
+        first = threading.Thread(target=lambda: results.append(self.cache.get(query, slow)))
+        first.start()
+        started.wait()
+        second = threading.Thread(target=lambda: results.append(self.cache.get(query, slow)))
+        second.start()
+        time.sleep(0.05)
+        release.set()
+        first.join()
+        second.join()
+        self.assertEqual(results, [['tile_1'], ['tile_1']])
+        self.assertEqual(self.calls, 1)
@@ -0,0 +1,93 @@
+from tests import Catalog
+import iceflix.commands
+import iceflix.replica
+import iceflix.title_store
+import iceflix.updates
+
+import time
+
+import unittest
+
+
+class ReplayingCatalog(Catalog):
+    def __init__(self, updates) -> None:
+        super().__init__()
+        self.updates = updates
+
+    def getAllDeltas(self, current=None):
+        self.updates.renameTile('tile_1', 'A tile', 'catalog')
+        self.updates.renameTile('tile_2', 'Another tile', 'catalog')
+        self.updates.addTags('tile_1', 'user', ['tag_1', 'tag_2'], 'catalog')
+        self.updates.addTags('tile_2', 'user', ['tag_2'], 'catalog')
+        self.updates.addTags('tile_2', 'another_user', ['tag_3'], 'catalog')
+
+class Recorder(iceflix.updates.CatalogListener):
+    def __init__(self) -> None:
+        self.changed = []
+
+    def media_changed(self, media_id : str):
+        self.changed.append(media_id)
+
+class TestCatalogReplica(unittest.TestCase):
+    def setUp(self) -> None:
+        self.titles = iceflix.title_store.TitleStore(iceflix.commands.PartiaMedia)
+        self.titles.claim('user')
+        self.replica = iceflix.replica.CatalogReplica(self.titles, staleness=0.2, settle=0)
+        self.recorder = Recorder()
+        self.updates = iceflix.updates.CatalogUpdatesServant()
+        self.updates.history = self.replica
+        self.updates.listeners.append(self.recorder)
+
+    def test_replay(self):
+        self.assertFalse(self.replica.needs_replay)
+        self.replica.subscribe()
+        self.assertTrue(self.replica.needs_replay)
+        self.assertFalse(self.replica.fresh)
+        self.replica.sync(ReplayingCatalog(self.updates))
+        self.assertFalse(self.replica.needs_replay)
+        self.assertTrue(self.replica.fresh)
+        self.assertEqual(self.replica.by_tags('user', ['tag_2'], False), ['tile_1', 'tile_2'])
+        self.assertEqual(self.replica.by_tags('user', ['tag_1', 'tag_2'], True), ['tile_1'])
+        self.assertEqual(self.replica.by_tags('another_user', ['tag_2'], False), [])
+        self.assertEqual(self.recorder.changed, [])
+        time.sleep(0.2)
+        self.assertFalse(self.replica.fresh)
+        self.replica.confirm()
+        self.assertTrue(self.replica.fresh)
+        self.replica.unsubscribe()
+        self.assertFalse(self.replica.fresh)
+
+    def test_settle(self):
+        replica = iceflix.replica.CatalogReplica(staleness=60, settle=0.1)
+        replica.subscribe()
+        replica.sync(ReplayingCatalog(iceflix.updates.CatalogUpdatesServant()))
+        replica.apply('renameTile', 'tile_3', 'Late replayed delta')
+        self.assertFalse(replica.fresh)
+        time.sleep(0.1)
+        self.assertTrue(replica.fresh)
+
+    def test_known_deltas(self):
+        self.updates.renameTile('tile_1', 'A tile', 'catalog')
+        self.updates.renameTile('tile_1', 'A tile', 'catalog')
+        self.updates.addTags('tile_1', 'user', ['tag_1'], 'catalog')
+        self.updates.addTags('tile_1', 'user', ['tag_1'], 'catalog')
+        self.updates.removeTags('tile_1', 'user', ['tag_1'], 'catalog')
+        self.updates.removeTags('tile_1', 'user', ['tag_1'], 'catalog')
+        self.assertEqual(self.recorder.changed, ['tile_1'] * 3)
+
+    def test_titles_updated(self):
+        self.titles['tile_1'] = iceflix.commands.PartiaMedia('tile_1', 'Old name', ['tag_1'])
+        self.updates.renameTile('tile_1', 'New name', 'catalog')
+        self.updates.addTags('tile_1', 'user', ['tag_2'], 'catalog')
+        self.updates.addTags('tile_1', 'another_user', ['tag_3'], 'catalog')
+        self.updates.removeTags('tile_1', 'user', ['tag_1'], 'catalog')
+        title = self.titles['tile_1']
+        self.assertEqual((title.name, title.tags), ('New name', ['tag_2']))
+        self.assertNotIn('tile_2', self.titles)
+
+    def test_disabled(self):
+        replica = iceflix.replica.CatalogReplica()
+        replica.subscribe()
+        self.assertFalse(replica.needs_replay)
+        replica.sync(ReplayingCatalog(self.updates))
+        self.assertFalse(replica.fresh)
@@ -0,0 +1,62 @@
+from tests import Main, Authenticator
+import iceflix.service_types
+
+import unittest
+import Ice
+
+
+class CountingMain(Main):
+    calls = 0
+
+    def ice_id(self, current=None):
+        CountingMain.calls += 1
+        return super().ice_id(current)
+
+class TestServiceTypeCache(unittest.TestCase):
+    def setUp(self) -> None:
+        init_data = Ice.InitializationData()
+        init_data.properties = Ice.createProperties()
+        init_data.properties.setProperty('Ice.Default.CollocationOptimized', '0')
+        self.comm = Ice.initialize(init_data)
+        self.adapter = self.comm.createObjectAdapterWithEndpoints('Services', 'tcp -h 127.0.0.1')
+        self.adapter.activate()
+        self.cache = iceflix.service_types.ServiceTypeCache()
+        CountingMain.calls = 0
+
+    def test_resolved_once(self):
+        proxy = self.adapter.addWithUUID(CountingMain())
+        for _ in range(3):
+            resolved = self.cache.resolve(proxy, 'main')
+        self.assertEqual(resolved.type_id, '::IceFlix::Main')
+        self.assertEqual(CountingMain.calls, 1)
+        self.cache.invalidate('main')
+        self.cache.resolve(proxy, 'main')
+        self.assertEqual(CountingMain.calls, 2)
+
+    def test_proxy_changed(self):
+        proxy = self.adapter.addWithUUID(CountingMain())
+        self.cache.resolve(proxy, 'main')
+        self.cache.resolve(proxy.ice_timeout(1000), 'main')
+        self.assertEqual(CountingMain.calls, 2)
+
+    def test_replaced(self):
+        first = self.adapter.addWithUUID(CountingMain())
+        self.cache.resolve(first, 'main')
+        self.cache.resolve(self.adapter.addWithUUID(CountingMain()), 'main')
+        self.assertEqual(len(self.cache.services), 1)
+        self.cache.resolve(first, 'main')
+        self.assertEqual(CountingMain.calls, 3)
+
+    def test_bounded(self):
+        self.cache = iceflix.service_types.ServiceTypeCache(max_services=2)
+        proxy = self.adapter.addWithUUID(CountingMain())
+        for service_id in ('main1', 'main2', 'main3'):
+            self.cache.resolve(proxy, service_id)
+        self.assertEqual(list(self.cache.services), ['main2', 'main3'])
+
+    def test_servant(self):
+        resolved = self.cache.resolve(Authenticator(), 'auth')
+        self.assertEqual(resolved.type_id, '::IceFlix::Authenticator')
+
+    def tearDown(self) -> None:
+        self.comm.destroy()
@@ -0,0 +1,52 @@
+import iceflix.title_index
+
+import time
+import random
+import string
+
+import unittest
+
+
+class TestTitleIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = iceflix.title_index.TitleIndex()
+        self.index.add('tile_1', 'The Big Tile', ['tag_1', 'tag_2'])
+        self.index.add('tile_2', 'Small tile', ['tag_2'])
+        self.index.add('tile_3', 'Big', ['tag_3'])
+
+    def test_name(self):
+        self.assertEqual(self.index.by_name('Big', True), ['tile_3'])
+        self.assertEqual(self.index.by_name('big', False), ['tile_1', 'tile_3'])
+        self.assertEqual(self.index.by_name('TILE', False), ['tile_1', 'tile_2'])
+        self.assertEqual(self.index.by_name('l', False), ['tile_1', 'tile_2'])
+        self.assertEqual(self.index.by_name('huge', False), [])
+
+    def test_tags(self):
+        self.assertEqual(self.index.by_tags(['tag_2'], True), ['tile_1', 'tile_2'])
+        self.assertEqual(self.index.by_tags(['tag_1', 'tag_2'], True), ['tile_1'])
+        self.assertEqual(self.index.by_tags(['tag_1', 'tag_3'], False), ['tile_1', 'tile_3'])
+        self.assertEqual(self.index.by_tags(['tag_4'], False), [])
+
+    def test_update(self):
+        self.index.add('tile_1', 'Renamed', ['tag_3'])
+        self.assertEqual(self.index.by_name('big', False), ['tile_3'])
+        self.assertEqual(self.index.by_tags(['tag_3'], True), ['tile_1', 'tile_3'])
+        self.index.remove('tile_3')
+        self.assertEqual(self.index.by_tags(['tag_3'], True), ['tile_1'])
+        self.assertNotIn('big', self.index.by_gram)
+        self.assertEqual(len(self.index), 2)
+
+    def test_scale(self):
+        index = iceflix.title_index.TitleIndex()
+        words = [''.join(random.choices(string.ascii_lowercase, k=8)) for _ in range(1000)]
+        for number in range(50000):
+            index.add(f'tile_{number}', f'{random.choice(words)} {random.choice(words)}',
+                [f'tag_{number % 100}', f'tag_{number % 7}'])
+        start = time.perf_counter()
+        found = index.by_name(words[0], False)
+        tagged = index.by_tags(['tag_1', 'tag_3'], True)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertTrue(all(words[0] in index.names[_id] for _id in found))
+        self.assertTrue(all(set(index.tags[_id]) == {'tag_1', 'tag_3'} for _id in tagged))
+        self.assertEqual(len(tagged), len([number for number in range(50000)
+            if {number % 100, number % 7} == {1, 3}]))
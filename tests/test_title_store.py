@@ -0,0 +1,124 @@
+import iceflix.commands
+import iceflix.title_store
+
+import os
+import tempfile
+
+import unittest
+
+
+class TestTitleStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'titles.db')
+        self.store = self.open()
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.directory.cleanup()
+
+    def open(self, ttl=60):
+        return iceflix.title_store.TitleStore(iceflix.commands.PartiaMedia, self.path, ttl)
+
+    def test_survives_restart(self):
+        self.store.update({
+            'tile_1': iceflix.commands.PartiaMedia('tile_1', 'a_tile', ['tag_1'], provider='files'),
+            'tile_2': iceflix.commands.PartiaMedia('tile_2', tags=['tag_2'])})
+        self.store.close()
+        store = self.open()
+        title = store['tile_1']
+        self.assertEqual((title.name, title.tags, title.provider), ('a_tile', ['tag_1'], 'files'))
+        self.assertEqual(store['tile_1'], title)
+        self.assertNotIn('tile_3', store)
+        self.assertEqual(sorted(store), ['tile_1', 'tile_2'])
+        store.pop('tile_2')
+        store.close()
+        self.assertEqual(list(self.open()), ['tile_1'])
+
+    def test_stale(self):
+        self.store['tile_1'] = iceflix.commands.PartiaMedia('tile_1', 'a_tile')
+        self.store.close()
+        store = self.open(ttl=-1)
+        self.assertNotIn('tile_1', store)
+        self.assertFalse(store)
+        store.close()
+
+    def test_expired_in_search(self):
+        store = iceflix.title_store.TitleStore(iceflix.commands.PartiaMedia, ttl=60)
+        store.update({'tile_1': iceflix.commands.PartiaMedia('tile_1', 'A tile', ['tag_1']),
+            'tile_2': iceflix.commands.PartiaMedia('tile_2', 'Another tile', ['tag_1'])})
+        store.titles['tile_1'].fetched -= 120
+        self.assertEqual(sorted(store.search_tags(['tag_1'], True)), ['tile_1', 'tile_2'])
+        store._expiries.touch('tile_1', store.titles['tile_1'].fetched + store.ttl)
+        self.assertEqual(store.search_tags(['tag_1'], True), ['tile_2'])
+        self.assertEqual(store.search_name('tile', False), ['tile_2'])
+        self.assertEqual(list(store), ['tile_2'])
+
+    def test_in_memory(self):
+        store = iceflix.title_store.TitleStore(iceflix.commands.PartiaMedia)
+        store['tile_1'] = iceflix.commands.PartiaMedia('tile_1')
+        self.assertEqual(len(store), 1)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_claim(self):
+        self.store.claim('user')
+        self.store['tile_1'] = iceflix.commands.PartiaMedia('tile_1', tags=['tag_1'])
+        self.store.close()
+        store = self.open()
+        store.claim('user')
+        self.assertIn('tile_1', store)
+        store.claim('another_user')
+        self.assertFalse(store)
+        store.close()
+        store = self.open()
+        self.assertNotIn('tile_1', store)
+        self.assertEqual(store.owner, 'another_user')
+        store.close()
+
+    def test_search(self):
+        self.store['tile_1'] = iceflix.commands.PartiaMedia('tile_1', 'A tile', ['tag_1'])
+        self.store.close()
+        store = self.open()
+        self.assertEqual(store.search_name('tile', False), ['tile_1'])
+        store['tile_1'] = iceflix.commands.PartiaMedia('tile_1', 'Renamed', ['tag_2'])
+        self.assertEqual(store.search_name('tile', False), [])
+        self.assertEqual(store.search_tags(['tag_2'], True), ['tile_1'])
+        del store['tile_1']
+        self.assertEqual(store.search_tags(['tag_2'], True), [])
+        store.close()
+
+    def test_iter_titles(self):
+        built = []
+        def record(*args, **kwargs):
+            built.append(args[0])
+            return iceflix.commands.PartiaMedia(*args, **kwargs)
+        store = iceflix.title_store.TitleStore(record)
+        store.update({f'tile_{number}': iceflix.commands.PartiaMedia(
+            f'tile_{number}', f'Title {99 - number:02}') for number in range(100)})
+        titles = store.iter_titles(10, 3, 'name')
+        self.assertEqual(built, [])
+        self.assertEqual([title.id for title in titles], ['tile_89', 'tile_88', 'tile_87'])
+        self.assertEqual(len(built), 3)
+        self.assertEqual([title.id for title in store.iter_titles(98, sort='id')],
+            ['tile_98', 'tile_99'])
+
+    def test_budget(self):
+        store = iceflix.title_store.TitleStore(iceflix.commands.PartiaMedia, self.path, budget=4096)
+        for number in range(20):
+            store[f'tile_{number}'] = iceflix.commands.PartiaMedia(
+                f'tile_{number}', f'Title {number}', ['tag_1', 'tag_2'])
+        self.assertLessEqual(store.size, 4096)
+        self.assertLess(len(store), 20)
+        self.assertNotIn('tile_0', store.titles)
+        self.assertEqual(store.search_name('Title 0', True), [])
+        self.assertEqual(store['tile_0'].name, 'Title 0')
+        self.assertIn('tile_0', store.titles)
+        self.assertEqual(len(store.tags.tags), 2)
+        store.close()
+
+    def test_index_shares_tags(self):
+        store = iceflix.title_store.TitleStore(iceflix.commands.PartiaMedia)
+        store['tile_1'] = iceflix.commands.PartiaMedia('tile_1', 'A tile', ['tag_1', 'tag_2'])
+        self.assertIs(store.index.tags['tile_1'], store.titles['tile_1'].tags)
+        self.assertEqual(store.search_tags(['tag_1', 'unknown'], False), ['tile_1'])
+        self.assertEqual(store.search_tags(['tag_1', 'unknown'], True), [])
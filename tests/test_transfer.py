@@ -0,0 +1,284 @@
+from tests import FileHandler, FileService
+import iceflix.file_uploader
+import iceflix.servants
+import iceflix.transfer
+
+import hashlib
+import io
+import os
+import random
+import tempfile
+import threading
+
+import unittest
+import Ice
+
+Ice.loadSlice(os.path.join(os.path.dirname(__file__), "../iceflix/iceflix.ice"))
+import IceFlix
+
+
+class BufferHandler(IceFlix.FileHandler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.buffer = random.randbytes(65536)
+        self.closed = threading.Event()
+
+    def receive(self, size, userToken, current=None):
+        if userToken == 'expired':
+            raise IceFlix.Unauthorized()
+        raw, self.buffer = self.buffer[:size], self.buffer[size:]
+        return raw
+
+    def close(self, userToken, current=None):
+        self.closed.set()
+
+class GatedHandler(BufferHandler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.release = threading.Event()
+
+    def receive(self, size, userToken, current=None):
+        self.release.wait(5)
+        return super().receive(size, userToken, current)
+
+class ProxyFileService(IceFlix.FileService):
+    def __init__(self, adapter, handler) -> None:
+        super().__init__()
+        self.adapter = adapter
+        self.handler = handler
+
+    def openFile(self, mediaId, userToken, current=None):
+        return IceFlix.FileHandlerPrx.uncheckedCast(self.adapter.addWithUUID(self.handler))
+
+class TestDownloader(unittest.TestCase):
+    def setUp(self) -> None:
+        init_data = Ice.InitializationData()
+        init_data.properties = Ice.createProperties()
+        init_data.properties.setProperty('Ice.ThreadPool.Server.SizeMax', '4')
+        init_data.properties.setProperty('Ice.ThreadPool.Server.Serialize', '1')
+        init_data.properties.setProperty('Ice.Default.CollocationOptimized', '0')
+        self.comm = Ice.initialize(init_data)
+        self.adapter = self.comm.createObjectAdapterWithEndpoints('Transfer', 'tcp -h 127.0.0.1')
+        self.adapter.activate()
+        self.token = 'valid'
+
+    def refresh(self):
+        self.token = 'valid'
+
+    def provider(self, handler):
+        return ProxyFileService(self.adapter, handler)
+
+    def provider_proxy(self, handler):
+        adapter = self.comm.createObjectAdapterWithEndpoints('', 'tcp -h 127.0.0.1')
+        adapter.activate()
+        return IceFlix.FileServicePrx.uncheckedCast(
+            adapter.addWithUUID(ProxyFileService(adapter, handler)))
+
+    def test_race(self):
+        slow, fast = GatedHandler(), BufferHandler()
+        expected = fast.buffer
+        downloader = iceflix.transfer.Downloader(
+            None, 'tile_1', lambda: self.token, self.refresh, window=4)
+        probe = downloader.race([self.provider_proxy(slow), self.provider_proxy(fast)])
+        self.assertIsNone(probe.error)
+        self.assertFalse(slow.closed.is_set())
+        slow.release.set()
+        file = io.BytesIO()
+        downloader.run(file)
+        self.assertEqual(file.getvalue(), expected)
+        self.assertTrue(slow.closed.wait(5))
+        self.assertFalse(fast.closed.is_set())
+
+    def test_race_failure(self):
+        self.token = 'expired'
+        downloader = iceflix.transfer.Downloader(
+            None, 'tile_1', lambda: self.token, self.refresh)
+        handlers = [BufferHandler(), BufferHandler()]
+        with self.assertRaises(IceFlix.Unauthorized):
+            downloader.race([self.provider_proxy(handler) for handler in handlers])
+        self.assertTrue(all(handler.closed.wait(5) for handler in handlers))
+        with self.assertRaises(IceFlix.WrongMediaId):
+            downloader.race([])
+
+    def test_pipelined(self):
+        handler = BufferHandler()
+        expected = handler.buffer
+        downloader = iceflix.transfer.Downloader(
+            self.provider(handler), 'tile_1', lambda: self.token, self.refresh, window=4)
+        file = io.BytesIO()
+        stats = downloader.run(file)
+        self.assertEqual(file.getvalue(), expected)
+        self.assertEqual(stats.bytes, len(expected))
+        self.assertTrue(stats.mode.startswith('pipelined'))
+        self.assertGreater(stats.throughput, 0)
+        downloader.close()
+
+    def test_serial_by_default(self):
+        downloader = iceflix.transfer.Downloader(
+            self.provider(BufferHandler()), 'tile_1', lambda: self.token, self.refresh)
+        downloader.open()
+        self.assertFalse(downloader.pipelined)
+        self.assertEqual(downloader.run(io.BytesIO()).mode, 'serial')
+
+    def test_pipelined_refresh(self):
+        handler = BufferHandler()
+        expected = handler.buffer
+        self.token = 'expired'
+        downloader = iceflix.transfer.Downloader(
+            self.provider(handler), 'tile_1', lambda: self.token, self.refresh, window=4)
+        file = io.BytesIO()
+        downloader.run(file)
+        self.assertEqual(file.getvalue(), expected)
+
+    def test_serial_fallback(self):
+        handler = FileHandler()
+        expected = handler.buffer
+        downloader = iceflix.transfer.Downloader(
+            FileService(), 'tile_1', lambda: self.token, self.refresh, window=4)
+        downloader.handler = handler
+        file = io.BytesIO()
+        stats = downloader.run(file)
+        self.assertEqual(file.getvalue(), expected)
+        self.assertEqual(stats.mode, 'serial')
+
+    def test_format_size(self):
+        self.assertEqual(iceflix.transfer.format_size(512), '512.00 B')
+        self.assertEqual(iceflix.transfer.format_size(2048), '2.00 KiB')
+        self.assertEqual(iceflix.transfer.format_size(1024 ** 4), '1.00 TiB')
+
+    def tearDown(self) -> None:
+        self.comm.destroy()
+
+class TestChunkSizer(unittest.TestCase):
+    def test_grows_while_flat(self):
+        sizer = iceflix.transfer.ChunkSizer(1024, 1024, 8192, samples=1)
+        for _ in range(5):
+            sizer.record(sizer.size, 0.01)
+        self.assertEqual(sizer.size, 8192)
+
+    def test_backs_off(self):
+        sizer = iceflix.transfer.ChunkSizer(1024, 1024, 8192, samples=1)
+        sizer.record(1024, 0.01)
+        sizer.record(2048, 0.1)
+        self.assertEqual(sizer.size, 1024)
+        sizer.record(4096, 0.01)
+        self.assertEqual(sizer.size, 1024)
+
+    def test_oversized(self):
+        sizer = iceflix.transfer.ChunkSizer(8192, 1024, 65536)
+        sizer.oversized()
+        self.assertEqual(sizer.maximum, 4096)
+        self.assertEqual(sizer.size, 4096)
+
+    def test_message_size_max(self):
+        properties = Ice.createProperties()
+        properties.setProperty('Ice.MessageSizeMax', '64')
+        sizer = iceflix.transfer.ChunkSizer.from_properties(properties)
+        self.assertEqual(sizer.size, iceflix.transfer.CHUNK_SIZE)
+        self.assertLess(sizer.maximum, 64 * 1024)
+
+class TestDiskWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'media')
+
+    def test_coalesced_writes(self):
+        chunks = [random.randbytes(1024) for _ in range(32)]
+        with iceflix.transfer.DiskWriter(self.path, queue_size=2, coalesce=4096) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        with open(self.path, 'rb') as file:
+            self.assertEqual(file.read(), b''.join(chunks))
+        self.assertEqual(writer.stats.bytes, 32 * 1024)
+        self.assertLessEqual(writer.stats.writes, 32)
+
+    def test_digest(self):
+        chunks = [random.randbytes(1024) for _ in range(8)]
+        with iceflix.transfer.DiskWriter(self.path, algorithm='blake2b') as writer:
+            writer.write(b'discarded')
+            writer.seek(0)
+            writer.truncate()
+            for chunk in chunks:
+                writer.write(chunk)
+            self.assertIsNone(writer.digest)
+        self.assertEqual(writer.digest, hashlib.blake2b(b''.join(chunks)).hexdigest())
+        manifest = iceflix.transfer.write_manifest(self.path, writer.algorithm, writer.digest)
+        with open(manifest, 'r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), f'{writer.digest}  media\n')
+
+    def test_stream_hasher(self):
+        hasher = iceflix.transfer.StreamHasher()
+        hasher.update(b'iceflix')
+        hasher.update(memoryview(b' client'))
+        self.assertEqual(hasher.hexdigest(), hashlib.sha256(b'iceflix client').hexdigest())
+        self.assertEqual(hasher.hexdigest(), hashlib.sha256(b'iceflix client').hexdigest())
+
+    def test_preallocate(self):
+        with iceflix.transfer.DiskWriter(self.path, preallocate=65536) as writer:
+            writer.write(b'data')
+            self.assertEqual(os.path.getsize(self.path), 65536)
+        self.assertEqual(os.path.getsize(self.path), 4)
+
+    def test_restart(self):
+        with iceflix.transfer.DiskWriter(self.path) as writer:
+            writer.write(b'discarded')
+            writer.seek(0)
+            writer.truncate()
+            writer.write(b'kept')
+        with open(self.path, 'rb') as file:
+            self.assertEqual(file.read(), b'kept')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+class TestFileUploader(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'media')
+        self.content = random.randbytes(100000)
+        with open(self.path, 'wb') as file:
+            file.write(self.content)
+        init_data = Ice.InitializationData()
+        init_data.properties = Ice.createProperties()
+        init_data.properties.setProperty('Ice.Default.CollocationOptimized', '0')
+        self.comm = Ice.initialize(init_data)
+
+    def upload(self, uploader, size=4096):
+        host = iceflix.servants.ServantHost(self.comm)
+        app = iceflix.file_uploader.FileUploaderApp(self.path, host)
+        app.servant.source.close()
+        app.servant = uploader
+        app.run(None)
+        app_identity = app.proxy.ice_getIdentity()
+        self.assertIs(host.adapter.find(app_identity), uploader)
+        received = b''
+        while raw := app.cast.receive(size):
+            received += raw
+        app.cast.close()
+        app.destroy()
+        self.assertIsNone(host.adapter.find(app_identity))
+        return received
+
+    def test_mapped(self):
+        uploader = iceflix.file_uploader.FileUploader(self.path, max_chunk=3000, algorithm='sha256')
+        self.assertIsInstance(uploader.source, iceflix.file_uploader.MappedSource)
+        self.assertEqual(self.upload(uploader), self.content)
+        self.assertEqual(uploader.digest, hashlib.sha256(self.content).hexdigest())
+
+    def test_read_ahead(self):
+        uploader = iceflix.file_uploader.FileUploader(self.path, algorithm='sha256')
+        uploader.source.close()
+        uploader.source = iceflix.file_uploader.ReadAheadSource(uploader.file_pointer, 1000)
+        self.assertEqual(self.upload(uploader, 1500), self.content)
+        self.assertEqual(uploader.digest, hashlib.sha256(self.content).hexdigest())
+
+    def test_empty(self):
+        with open(self.path, 'wb'):
+            pass
+        uploader = iceflix.file_uploader.FileUploader(self.path)
+        self.assertIsInstance(uploader.source, iceflix.file_uploader.ReadAheadSource)
+        self.assertEqual(self.upload(uploader), b'')
+
+    def tearDown(self) -> None:
+        self.comm.destroy()
+        self.directory.cleanup()